@@ -0,0 +1,136 @@
+"""Load benchmark: throughput of the production server by worker count.
+
+Starts gunicorn (src/gunicorn.conf.py) against a throw-away SQLite database for each worker
+count and drives it with concurrent client processes, printing one JSON line per run:
+
+    python benchmarks/load.py --workers 1 2 4 --clients 16 --duration 10
+
+The mix is mostly public survey reads with a share of submissions (--write-ratio).
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(database_url):
+    """Create the schema, the admin user and one active survey; return the survey id"""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    script = (
+        "import json\n"
+        "from src.main import create_app, init_database, seed_admin\n"
+        "from src.models.user import db, Survey, SurveyStatistics\n"
+        "app = create_app()\n"
+        "with app.app_context():\n"
+        "    init_database()\n"
+        "    seed_admin()\n"
+        "    questions = [{'id': 1, 'type': 'radio', 'text': 'Q1', 'options': ['a', 'b']},\n"
+        "                 {'id': 2, 'type': 'rating', 'text': 'Q2'}]\n"
+        "    survey = Survey(title='Load', questions_json=json.dumps(questions), is_active=True)\n"
+        "    survey.statistics = SurveyStatistics(responses_count=0)\n"
+        "    db.session.add(survey)\n"
+        "    db.session.commit()\n"
+        "    print(survey.id)\n"
+    )
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env)
+    return int(output.decode().strip().splitlines()[-1])
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Server did not start')
+
+def client(args):
+    """Issue requests on one keep-alive connection until the deadline, return (ok, errors, latencies)"""
+    port, survey_id, deadline, write_ratio, seed_value = args
+    rng = random.Random(seed_value)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    ok = errors = 0
+    latencies = []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                body = json.dumps({'responses': {'1': rng.choice('ab'), '2': str(rng.randint(1, 5))}})
+                conn.request('POST', f'/api/surveys/{survey_id}/responses', body,
+                             {'Content-Type': 'application/json'})
+            else:
+                conn.request('GET', f'/api/surveys/{survey_id}/public')
+            response = conn.getresponse()
+            response.read()
+            if response.status < 400:
+                ok += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        latencies.append(time.perf_counter() - start)
+    return ok, errors, latencies
+
+def run(workers, threads, clients, duration, write_ratio, port):
+    tmpdir = tempfile.mkdtemp(prefix='asf-load-')
+    database_url = f"sqlite:///{os.path.join(tmpdir, 'load.db')}"
+    survey_id = seed(database_url)
+
+    env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY=str(workers),
+               WEB_THREADS=str(threads), PORT=str(port), HOST='127.0.0.1')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'src/gunicorn.conf.py', 'src.wsgi:app'],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        deadline = time.time() + duration
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(port, survey_id, deadline, write_ratio, i) for i in range(clients)])
+    finally:
+        server.terminate()
+        server.wait()
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(l for r in results for l in r[2])
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+    return {
+        'workers': workers,
+        'threads': threads,
+        'clients': clients,
+        'duration_s': duration,
+        'requests': ok,
+        'errors': errors,
+        'throughput_rps': round(ok / duration, 1),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        result = run(workers, args.threads, args.clients, args.duration, args.write_ratio, args.port)
+        print(json.dumps(result), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Endpoint benchmark through the Flask test client.
+
+Seeds a throw-away SQLite database at the requested scale, then times the hot endpoints and
+prints a JSON report (p50/p95/mean latency, SQL queries per request, response bytes and
+peak Python memory per endpoint). survey_analytics_cold clears the analytics frame cache before
+each request, so it times loading a survey's answers from scratch:
+
+    python -m benchmarks.run --users 200 --questions 2000 --responses 20000 --output bench.json
+    python -m benchmarks.run ... --compare bench.json     # show the change against a previous run
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def measure(client, counter, method, url, iterations, body=None, before=None):
+    """Time `iterations` requests, then one extra traced request for peak memory.
+
+    `before()` runs ahead of every request, untimed (e.g. to clear a cache).
+    """
+    def prepare():
+        if before is not None:
+            before()
+
+    def call():
+        if method == 'POST':
+            return client.post(url, json=body)
+        return client.get(url)
+
+    prepare()
+    call()  # Warm up caches and lazy imports
+    latencies = []
+    queries = []
+    size = 0
+    for _ in range(iterations):
+        prepare()
+        counter[0] = 0
+        start = time.perf_counter()
+        response = call()
+        latencies.append(time.perf_counter() - start)
+        queries.append(counter[0])
+        size = len(response.get_data())
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}')
+
+    prepare()
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'response_bytes': size,
+        'peak_memory_kib': round(peak / 1024, 1)
+    }
+
+def compare(report, baseline):
+    """Print the relative change of each metric against a previous report"""
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for metric in ('p50_ms', 'p95_ms', 'queries_per_request', 'peak_memory_kib'):
+            before, after = previous.get(metric), result.get(metric)
+            if before:
+                changes.append(f'{metric} {(after - before) / before * 100:+.1f}%')
+        print(f'{name}: ' + ', '.join(changes), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot API endpoints')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--comments', type=int, default=5, help='Comments per forum question')
+    parser.add_argument('--surveys', type=int, default=2)
+    parser.add_argument('--survey-questions', type=int, default=10)
+    parser.add_argument('--responses', type=int, default=1000, help='Responses per survey')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='asf-bench-')
+    from sqlalchemy import event
+    from src.main import create_app, init_database, seed_admin
+    from src.models.user import Question, Survey, db
+    from src.services.analytics import frames
+    from src.services.survey_schema import compile_survey
+    from benchmarks.seed import make_answer, seed
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"})
+    started = time.perf_counter()
+    with app.app_context():
+        init_database()
+        seed_admin()
+        survey_ids = seed(users=args.users, questions=args.questions, comments=args.comments,
+                          surveys=args.surveys, survey_questions=args.survey_questions,
+                          responses=args.responses)
+        engine = db.engine
+    seed_seconds = time.perf_counter() - started
+
+    counter = [0]
+    def count_query(*args):
+        counter[0] += 1
+    event.listen(engine, 'before_cursor_execute', count_query)
+
+    client = app.test_client()
+    client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    survey_id = survey_ids[0]
+    with app.app_context():
+        question_id = db.session.query(Question.id).filter_by(is_active=True).first()[0]
+        questions = compile_survey(db.session.get(Survey, survey_id)).questions
+    rng = random.Random(0)
+    submission = {'responses': {str(q['id']): make_answer(rng, q) for q in questions}}
+
+    endpoints = [
+        ('questions', 'GET', '/api/questions', None),
+        ('question_detail', 'GET', f'/api/questions/{question_id}', None),
+        ('surveys_active', 'GET', '/api/surveys/active', None),
+        ('survey_statistics', 'GET', f'/api/admin/surveys/{survey_id}/statistics', None),
+        ('survey_responses', 'GET', f'/api/admin/surveys/{survey_id}/responses', None),
+        ('survey_submit', 'POST', f'/api/surveys/{survey_id}/submit', submission),
+    ]
+    results = {}
+    for name, method, url, body in endpoints:
+        results[name] = measure(client, counter, method, url, args.iterations, body)
+        print(f'{name}: {results[name]}', file=sys.stderr)
+    # Analytics: served from the cached columnar frame, and loaded from scratch (cold)
+    analytics_url = f'/api/admin/surveys/{survey_id}/analytics'
+    results['survey_analytics'] = measure(client, counter, 'GET', analytics_url, args.iterations)
+    results['survey_analytics_cold'] = measure(client, counter, 'GET', analytics_url,
+                                               max(3, args.iterations // 10), before=frames.invalidate)
+    for name in ('survey_analytics', 'survey_analytics_cold'):
+        print(f'{name}: {results[name]}', file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'scale': {k: getattr(args, k) for k in ('users', 'questions', 'comments', 'surveys',
+                                                'survey_questions', 'responses')},
+        'iterations': args.iterations,
+        'seed_seconds': round(seed_seconds, 2),
+        'results': results
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main()
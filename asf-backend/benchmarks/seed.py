@@ -0,0 +1,104 @@
+"""Synthetic data generator using the real models.
+
+Rows are inserted in bulk; users share one precomputed password hash ('password') so that
+seeding large scales is not dominated by hashing. Survey aggregates and normalized answers
+are built afterwards, exactly like for migrated data.
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from src.models.user import Comment, Question, Survey, SurveyResponse, User, db
+from src.services.survey_answers import backfill_answers
+from src.services.survey_stats import rebuild_all_statistics
+
+QUESTION_TYPES = ('radio', 'checkbox', 'select', 'rating', 'text')
+COMPANIES = ('ASF Consulting', 'Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli')
+WORDS = ('audit', 'tax', 'payroll', 'invoice', 'budget', 'report', 'compliance', 'strategy',
+         'risk', 'growth', 'cash', 'forecast', 'market', 'client', 'contract', 'review')
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def _insert(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(db.insert(model), rows[start:start + batch_size])
+
+def make_questions(rng, count):
+    questions = []
+    for i in range(count):
+        question_type = QUESTION_TYPES[i % len(QUESTION_TYPES)]
+        question = {'id': i + 1, 'type': question_type, 'text': f'Question {i + 1}', 'required': i % 2 == 0}
+        if question_type in ('radio', 'checkbox', 'select'):
+            question['options'] = [f'Option {o}' for o in range(1, 6)]
+        questions.append(question)
+    return questions
+
+def make_answer(rng, question):
+    question_type = question['type']
+    if rng.random() < 0.1 and not question['required']:
+        return ''
+    if question_type in ('radio', 'select'):
+        return rng.choice(question['options'])
+    if question_type == 'checkbox':
+        return rng.sample(question['options'], rng.randint(1, 3))
+    if question_type == 'rating':
+        return str(rng.randint(1, 5))
+    return _sentence(rng, 8)
+
+def seed(users=100, questions=500, comments=5, surveys=2, survey_questions=10, responses=1000, seed_value=42):
+    """Fill the (empty) database of the current app context.
+
+    `comments` is the number of comments per forum question and `responses` the number of
+    responses per survey. Returns the ids of the created surveys.
+    """
+    rng = random.Random(seed_value)
+    start = datetime(2024, 1, 1)
+    password_hash = generate_password_hash('password')
+
+    first_user_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    _insert(User, [{
+        'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash,
+        'company': rng.choice(COMPANIES), 'is_admin': False, 'is_active': True,
+        'created_at': start + timedelta(minutes=i)
+    } for i in range(users)])
+    user_ids = list(range(first_user_id, first_user_id + users))
+
+    first_question_id = (db.session.query(db.func.max(Question.id)).scalar() or 0) + 1
+    _insert(Question, [{
+        'title': _sentence(rng, 6), 'content': _sentence(rng, 40), 'user_id': rng.choice(user_ids),
+        'is_active': rng.random() > 0.05, 'created_at': start + timedelta(minutes=i),
+        'updated_at': start + timedelta(minutes=i)
+    } for i in range(questions)])
+
+    comment_rows = []
+    for question_id in range(first_question_id, first_question_id + questions):
+        for c in range(comments):
+            created_at = start + timedelta(minutes=question_id, seconds=c)
+            comment_rows.append({
+                'content': _sentence(rng, 20), 'user_id': rng.choice(user_ids), 'question_id': question_id,
+                'is_active': rng.random() > 0.05, 'created_at': created_at, 'updated_at': created_at
+            })
+    _insert(Comment, comment_rows)
+
+    survey_ids = []
+    for s in range(surveys):
+        survey_questions_list = make_questions(rng, survey_questions)
+        survey = Survey(title=f'Survey {s + 1}', description=_sentence(rng),
+                        questions_json=json.dumps(survey_questions_list), is_active=(s == 0))
+        db.session.add(survey)
+        db.session.flush()
+        survey_ids.append(survey.id)
+        _insert(SurveyResponse, [{
+            'survey_id': survey.id,
+            'user_id': rng.choice(user_ids) if rng.random() < 0.5 else None,
+            'responses_json': json.dumps({str(q['id']): make_answer(rng, q) for q in survey_questions_list}),
+            'submitted_at': start + timedelta(seconds=r),
+            'ip_address': f'10.0.{r // 256 % 256}.{r % 256}'
+        } for r in range(responses)])
+    db.session.commit()
+
+    backfill_answers(db.session.connection())
+    db.session.commit()
+    rebuild_all_statistics()
+    return survey_ids
@@ -0,0 +1,60 @@
+"""Startup benchmark: cold start of one worker process.
+
+Runs a fresh interpreter several times against a throw-away SQLite database and measures
+importing the app module, create_app() and the first request, printing one JSON line:
+
+    python benchmarks/startup.py --runs 10
+
+A worker should be ready to serve in the tens of milliseconds once the interpreter is up.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import json, time\n"
+    "started = time.perf_counter()\n"
+    "from src.main import create_app\n"
+    "imported = time.perf_counter()\n"
+    "app = create_app()\n"
+    "created = time.perf_counter()\n"
+    "response = app.test_client().get('/api/health')\n"
+    "assert response.status_code == 200\n"
+    "served = time.perf_counter()\n"
+    "print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,\n"
+    "                  'first_request_ms': (served - created) * 1000, 'total_ms': (served - started) * 1000}))\n"
+)
+
+def measure(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Exit with an error when the median total exceeds this')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='asf-startup-')
+    database_url = f"sqlite:///{os.path.join(tmpdir, 'startup.db')}"
+    runs = [measure(database_url) for _ in range(args.runs)]
+
+    result = {'runs': args.runs}
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = sorted(run[key] for run in runs)
+        result[key] = {'median': round(statistics.median(values), 1), 'max': round(values[-1], 1)}
+    print(json.dumps(result), flush=True)
+
+    if args.budget_ms is not None and result['total_ms']['median'] > args.budget_ms:
+        sys.exit(f"Median startup {result['total_ms']['median']} ms exceeds the {args.budget_ms} ms budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+# gunicorn -c src/gunicorn.conf.py src.wsgi:app
+import os
+import subprocess
+import sys
+
+# Set TRUSTED_PROXY_COUNT when a reverse proxy is in front of this address (see wsgi.py); with
+# the default 0, X-Forwarded-For is ignored
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('WEB_THREADS', 4))
+# Threads are not held by live statistics streams: those are served by gunicorn_stream.conf.py
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# Each worker opens its own database connections: the app must not be imported before forking
+preload_app = False
+accesslog = '-'
+
+def on_starting(server):
+    # Create and migrate the schema and the default admin, and precompress the frontend,
+    # once before any worker starts
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for command in ('init-db', 'seed-admin', 'compress-static'):
+        subprocess.check_call([sys.executable, '-m', 'flask', '--app', 'src.main', command], cwd=backend_dir)
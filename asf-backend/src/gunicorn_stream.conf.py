@@ -0,0 +1,26 @@
+# gunicorn -c src/gunicorn_stream.conf.py src.wsgi:app
+#
+# Live statistics streams (SSE), next to the main server of gunicorn.conf.py: the reverse proxy
+# sends /api/admin/surveys/<id>/statistics/stream here, with buffering off, e.g. with nginx
+#
+#     location ~ ^/api/admin/surveys/\d+/statistics/stream$ {
+#         proxy_pass http://127.0.0.1:5001;
+#         proxy_buffering off;
+#         proxy_read_timeout 1h;
+#     }
+#
+# gevent workers hold each open stream on a greenlet, so a few hundred admins watching statistics
+# cost no thread of the main server. The main server's gthread workers refuse streams and tell the
+# client to poll instead (see services/live_stats.py).
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('STREAM_PORT', 5001)}"
+workers = int(os.environ.get('STREAM_WORKERS', 1))
+worker_class = 'gevent'
+# Streams per worker are capped by SURVEY_STREAM_MAX_CLIENTS; leave room for their reconnections
+worker_connections = int(os.environ.get('SURVEY_STREAM_MAX_CLIENTS', 500)) + 100
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+preload_app = False
+accesslog = '-'
+# The schema is migrated by the main server; background jobs run there too
+raw_env = ['BACKGROUND_TASKS=0']
@@ -1,75 +1,239 @@
+import hmac
 import os
 import sys
+import time
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+import click
+from flask import Flask, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db, User
-from src.routes.user import user_bp
+from src.services.compression import compression
+from src.services.engine import engine_options, install_sqlite_pragmas
+from src.services.ingest import ingestor
+from src.services.jobs import jobs
+from src.services.json_provider import init_json
+from src.services.live_stats import live_stats
+from src.services.metrics import metrics
+from src.services.migrations import upgrade
+from src.services.passwords import hasher, login_throttle
+from src.services.search import forum_search
+from src.services.static_files import static_files
+from src.routes.user import admin_cache, admin_required, user_bp
 from src.routes.forum import forum_bp
-from src.routes.survey import survey_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asf-consulting-portal-secret-key-2024'
-app.config['SESSION_COOKIE_SECURE'] = False  # Pour le développement
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-
-# Enable CORS for all routes with specific origins
-CORS(app, 
-     supports_credentials=True,
-     origins=['https://3000-iabice1ds1af29tmx3buf-1d794291.manusvm.computer', 'http://localhost:3000', 'http://169.254.0.21:3000'],
-     allow_headers=['Content-Type', 'Authorization'],
-     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(forum_bp, url_prefix='/api')
-app.register_blueprint(survey_bp, url_prefix='/api')
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-with app.app_context():
+from src.routes.survey import survey_bp, survey_cache
+from src.routes.jobs import jobs_bp
+
+def create_app(config=None):
+    """Build the application without touching the database.
+
+    Schema creation and the default admin account are explicit steps:
+        flask --app src.main init-db
+        flask --app src.main seed-admin
+    `config` overrides the settings read from the environment (e.g. a test database).
+    """
+    started = time.perf_counter()
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asf-consulting-portal-secret-key-2024')
+    app.config['SESSION_COOKIE_SECURE'] = False  # Pour le développement
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Survey submissions: 'sync' commits per request, 'batched' acknowledges and group-commits in the background
+    app.config['SURVEY_INGEST_MODE'] = os.environ.get('SURVEY_INGEST_MODE', 'sync')
+    app.config['SURVEY_INGEST_BATCH_SIZE'] = int(os.environ.get('SURVEY_INGEST_BATCH_SIZE', 200))
+    app.config['SURVEY_INGEST_FLUSH_MS'] = int(os.environ.get('SURVEY_INGEST_FLUSH_MS', 50))
+
+    # Password hashing runs on a bounded pool; PASSWORD_HASH_METHOD sets the algorithm and cost
+    # (e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'), older hashes are upgraded at login
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+    app.config['LOGIN_MAX_FAILURES_PER_USER'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_USER', 5))
+    app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 50))
+
+    # Number of reverse proxies in front of the app (nginx, load balancer) whose X-Forwarded-For
+    # entry is trusted to give the client address. 0 (the default) when clients connect directly:
+    # the header would then be set by the client itself, and login throttling keys on that address
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+    # Per-endpoint metrics; METRICS_SLOW_REQUEST_MS logs slower requests with their SQL.
+    # /api/metrics is served to admins, and to scrapers sending METRICS_TOKEN as a bearer token
+    app.config['METRICS_SLOW_REQUEST_MS'] = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 0)) or None
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    # Live statistics streams (SSE): only served by the gevent workers of gunicorn_stream.conf.py,
+    # other workers and clients above the cap are told to poll every ..._FALLBACK_POLL_SECONDS
+    app.config['SURVEY_STREAM_POLL_MS'] = int(os.environ.get('SURVEY_STREAM_POLL_MS', 1000))
+    app.config['SURVEY_STREAM_MAX_CLIENTS'] = int(os.environ.get('SURVEY_STREAM_MAX_CLIENTS', 500))
+    app.config['SURVEY_STREAM_FALLBACK_POLL_SECONDS'] = int(os.environ.get('SURVEY_STREAM_FALLBACK_POLL_SECONDS', 30))
+
+    # Background jobs are resumed by the first request; not in the stream server, where heavy
+    # work would stall the event loop
+    app.config['JOB_DISPATCH'] = os.environ.get('BACKGROUND_TASKS', '1') != '0'
+
+    # Deleting users/surveys: bulk deletes of PURGE_BATCH_SIZE rows PURGE_PAUSE_MS apart, run as
+    # a background job above PURGE_INLINE_LIMIT rows
+    app.config['PURGE_BATCH_SIZE'] = int(os.environ.get('PURGE_BATCH_SIZE', 2000))
+    app.config['PURGE_INLINE_LIMIT'] = int(os.environ.get('PURGE_INLINE_LIMIT', 10000))
+    app.config['PURGE_PAUSE_MS'] = int(os.environ.get('PURGE_PAUSE_MS', 10))
+
+    # Background jobs for heavy admin operations: at most JOB_WORKERS run at once across all
+    # workers; statistics of surveys above SURVEY_REBUILD_INLINE_LIMIT responses are rebuilt as a job
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_RETENTION_HOURS'] = int(os.environ.get('JOB_RETENTION_HOURS', 24))
+    app.config['SURVEY_REBUILD_INLINE_LIMIT'] = int(os.environ.get('SURVEY_REBUILD_INLINE_LIMIT', 5000))
+
+    # API payloads: JSON_PROVIDER 'orjson' or 'default'; responses from COMPRESS_MIN_SIZE bytes
+    # are gzip/brotli compressed; API_OMIT_REDUNDANT_FIELDS drops duplicates like questions_json
+    app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'orjson')
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['API_OMIT_REDUNDANT_FIELDS'] = os.environ.get('API_OMIT_REDUNDANT_FIELDS', '1') == '1'
+
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    if app.config['TRUSTED_PROXY_COUNT']:
+        # request.remote_addr becomes the client address reported by the trusted proxies
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+
+    # Enable CORS for all routes with specific origins
+    CORS(app, 
+         supports_credentials=True,
+         origins=['https://3000-iabice1ds1af29tmx3buf-1d794291.manusvm.computer', 'http://localhost:3000', 'http://169.254.0.21:3000'],
+         allow_headers=['Content-Type', 'Authorization'],
+         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+
+    init_json(app)
+
+    # Register blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(forum_bp, url_prefix='/api')
+    app.register_blueprint(survey_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+
+    # The engine is created here but connects on first use
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine)
+        forum_search.init_app(app, db.engine)
+        metrics.init_app(app, engine=db.engine)
+
+    compression.init_app(app)
+    ingestor.init_app(app)
+    hasher.init_app(app)
+    login_throttle.init_app(app)
+    live_stats.init_app(app)
+    jobs.init_app(app)
+    static_files.init_app(app)
+
+    metrics.register_gauge('survey_ingest_pending', 'Acknowledged submissions not committed yet', ingestor.pending)
+    metrics.register_gauge('survey_ingest_dead_letters', 'Submissions set aside because they could not be written',
+                           lambda: ingestor.dead_letters)
+    metrics.register_gauge('cache_hit_rate', 'Hit rate of the in-process caches', lambda: {
+        'admin_auth': admin_cache.stats()['hit_rate'],
+        'public_surveys': survey_cache.backend.stats()['hit_rate']
+    })
+    metrics.register_gauge('survey_stream_clients', 'Open live statistics streams', live_stats.clients)
+    metrics.register_gauge('jobs_running', 'Background jobs running in this process', jobs.running)
+    metrics.register_gauge('http_compressed_bytes', 'Body bytes before and after compression', lambda: {
+        'uncompressed': compression.stats()['uncompressed_bytes'],
+        'compressed': compression.stats()['compressed_bytes']
+    })
+
+    register_commands(app)
+    register_routes(app)
+    app.config['STARTUP_MS'] = round((time.perf_counter() - started) * 1000, 1)
+    return app
+
+def init_database():
+    """Create missing tables and apply pending migrations"""
     db.create_all()
-    
-    # Create default admin user if it doesn't exist
-    admin_user = User.query.filter_by(username='admin').first()
+    return upgrade()
+
+def seed_admin(username='admin', password='admin123', email='admin@asfconsulting.tn'):
+    """Create the default admin user if it doesn't exist; return it"""
+    admin_user = User.query.filter_by(username=username).first()
     if not admin_user:
         admin_user = User(
-            username='admin',
-            email='admin@asfconsulting.tn',
+            username=username,
+            email=email,
             company='ASF Consulting',
             is_admin=True
         )
-        admin_user.set_password('admin123')
+        admin_user.password_hash = hasher.hash(password)
         db.session.add(admin_user)
         db.session.commit()
-        #print("Default admin user created: admin/admin123")
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    return admin_user
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables and apply pending schema migrations (also `flask migrate`)"""
+        applied = init_database()
+        print(f"Applied migrations: {applied}" if applied else "Database is up to date")
+
+    @app.cli.command('seed-admin')
+    @click.option('--username', default='admin')
+    @click.option('--password', default='admin123')
+    @click.option('--email', default='admin@asfconsulting.tn')
+    def seed_admin_command(username, password, email):
+        """Create the default admin account if it doesn't exist"""
+        seed_admin(username, password, email)
+        print(f"Admin user: {username}")
+
+    @app.cli.command('run-jobs')
+    def run_jobs_command():
+        """Run the queued background jobs (e.g. interrupted purges) in the foreground"""
+        for job in jobs.run_pending():
+            print(f"Job {job.id} ({job.kind}): {job.status}")
+
+    @app.cli.command('compress-static')
+    def compress_static_command():
+        """Write .gz/.br variants of the built frontend, served to clients that accept them"""
+        print(f"Compressed variants written: {static_files.compress()}")
+
+    # Same command: migrations fill tables added since the database was created (e.g. survey_answer)
+    app.cli.add_command(init_db_command, 'migrate')
+
+def register_routes(app):
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        # Matched against the manifest built at startup; client-side routes get index.html
+        response = static_files.response(path)
+        if response is None:
             return "index.html not found", 404
+        return response
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return {'status': 'healthy', 'message': 'ASF Consulting Portal API is running'}
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return {'status': 'healthy', 'message': 'ASF Consulting Portal API is running'}
+
+    admin_metrics = admin_required(metrics.response)
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_endpoint():
+        # Scrapers authenticate with the METRICS_TOKEN bearer token, people as admins
+        token = app.config['METRICS_TOKEN']
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            return metrics.response()
+        return admin_metrics()
 
 if __name__ == '__main__':
+    # Development server: create the schema and the default admin on the fly
+    app = create_app()
+    with app.app_context():
+        init_database()
+        seed_admin()
+    # Threaded, but streams are few in development
+    app.config['SURVEY_STREAM_ASYNC_ONLY'] = False
     app.run(host='localhost', port=5000, debug=True)
-
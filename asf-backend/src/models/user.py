@@ -1,6 +1,7 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
@@ -11,7 +12,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     company = db.Column(db.String(200), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
 
     # Relations
@@ -19,11 +20,13 @@ class User(db.Model):
     comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan')
     survey_responses = db.relationship('SurveyResponse', backref='user', lazy=True, cascade='all, delete-orphan')
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+    # Case-insensitive prefix search and sorting in the user directory
+    __table_args__ = (
+        db.Index('ix_user_username_lower', db.func.lower(username)),
+        db.Index('ix_user_email_lower', db.func.lower(email)),
+        db.Index('ix_user_company_lower', db.func.lower(company)),
+        db.Index('ix_user_created', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -43,7 +46,7 @@ class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -51,10 +54,19 @@ class Question(db.Model):
     # Relations
     comments = db.relationship('Comment', backref='question', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_question_active_created', 'is_active', 'created_at', 'id'),
+        db.Index('ix_question_created', 'created_at', 'id'),
+        db.Index('ix_question_user', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<Question {self.title}>'
 
-    def to_dict(self):
+    def to_dict(self, comments_count=None):
+        # List routes pass comments_count from an aggregate query to avoid loading the comments
+        if comments_count is None:
+            comments_count = Comment.query.filter_by(question_id=self.id).count()
         return {
             'id': self.id,
             'title': self.title,
@@ -64,18 +76,24 @@ class Question(db.Model):
             'is_active': self.is_active,
             'user_id': self.user_id,
             'author': self.author.to_dict() if self.author else None,
-            'comments_count': len(self.comments)
+            'comments_count': comments_count
         }
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_comment_question_active_created', 'question_id', 'is_active', 'created_at', 'id'),
+        db.Index('ix_comment_created', 'created_at', 'id'),
+        db.Index('ix_comment_user', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<Comment {self.id}>'
 
@@ -103,19 +121,21 @@ class Survey(db.Model):
     # Relations
     responses = db.relationship('SurveyResponse', backref='survey', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_survey_active', 'is_active'),
+    )
+
     def __repr__(self):
         return f'<Survey {self.title}>'
 
-    def to_dict(self):
-        import json
-        questions = []
-        if self.questions_json:
-            try:
-                questions = json.loads(self.questions_json)
-            except:
-                questions = []
+    def to_dict(self, responses_count=None):
+        from src.services.survey_schema import compile_survey
+        if responses_count is None:
+            responses_count = SurveyResponse.query.filter_by(survey_id=self.id).count()
+        # Parsed once per survey version
+        questions = compile_survey(self).questions
         
-        return {
+        data = {
             'id': self.id,
             'title': self.title,
             'description': self.description,
@@ -124,16 +144,30 @@ class Survey(db.Model):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'responses_count': len(self.responses)
+            'responses_count': responses_count
         }
+        # questions_json repeats `questions` as a string; kept only for older clients
+        if has_app_context() and current_app.config.get('API_OMIT_REDUNDANT_FIELDS'):
+            del data['questions_json']
+        return data
 
 class SurveyResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Nullable for anonymous responses
     responses_json = db.Column(db.Text, nullable=False)  # JSON string containing user responses
-    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     ip_address = db.Column(db.String(45), nullable=True)  # For tracking anonymous responses
+    submission_id = db.Column(db.String(32), nullable=True)  # Acknowledgement id of batched submissions
+
+    # Relations
+    answers = db.relationship('SurveyAnswer', backref='response', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_survey_response_survey_submitted', 'survey_id', 'submitted_at', 'id'),
+        db.Index('ix_survey_response_user', 'user_id'),
+        db.Index('ix_survey_response_submission', 'submission_id', unique=True),
+    )
 
     def __repr__(self):
         return f'<SurveyResponse {self.id}>'
@@ -149,3 +183,126 @@ class SurveyResponse(db.Model):
             'user': self.user.to_dict() if self.user else None
         }
 
+
+class SurveyAnswer(db.Model):
+    """One answer of a response, normalized from responses_json (one row per selected option)"""
+    id = db.Column(db.Integer, primary_key=True)
+    response_id = db.Column(db.Integer, db.ForeignKey('survey_response.id'), nullable=False)
+    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), nullable=False)
+    question_id = db.Column(db.String(64), nullable=False)  # Question ID as string, like the response keys
+    option_value = db.Column(db.String(255), nullable=True)  # Choice questions (and ratings)
+    numeric_value = db.Column(db.Float, nullable=True)  # Ratings and other numeric answers
+    text_value = db.Column(db.Text, nullable=True)  # Free text answers
+
+    __table_args__ = (
+        # Covers the analytics load, which groups a survey's answers by value (see analytics.py)
+        db.Index('ix_survey_answer_value', 'survey_id', 'question_id', 'option_value', 'numeric_value', 'response_id'),
+        db.Index('ix_survey_answer_numeric', 'survey_id', 'question_id', 'numeric_value'),
+        db.Index('ix_survey_answer_response', 'response_id'),
+    )
+
+    def __repr__(self):
+        return f'<SurveyAnswer {self.response_id}:{self.question_id}>'
+
+    def to_dict(self):
+        return {
+            'response_id': self.response_id,
+            'question_id': self.question_id,
+            'option_value': self.option_value,
+            'numeric_value': self.numeric_value,
+            'text_value': self.text_value
+        }
+
+class SurveyStatistics(db.Model):
+    """Survey-level counters maintained alongside each submitted response"""
+    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), primary_key=True)
+    responses_count = db.Column(db.Integer, default=0, nullable=False)
+    # Bumped by every full rebuild (after responses are deleted): invalidates derived caches
+    generation = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relations
+    survey = db.relationship('Survey', backref=db.backref('statistics', uselist=False, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<SurveyStatistics {self.survey_id}>'
+
+class SurveyQuestionStatistics(db.Model):
+    """Per-question answer counters for a survey (option counts / rating histogram)"""
+    survey_id = db.Column(db.Integer, db.ForeignKey('survey.id'), primary_key=True)
+    question_id = db.Column(db.String(64), primary_key=True)  # Question ID as string, like the response keys
+    answered_count = db.Column(db.Integer, default=0, nullable=False)
+    value_counts_json = db.Column(db.Text, nullable=False, default='{}')  # JSON object {value: count}
+
+    # Relations
+    survey = db.relationship('Survey', backref=db.backref('question_statistics', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<SurveyQuestionStatistics {self.survey_id}:{self.question_id}>'
+
+class SchemaMigration(db.Model):
+    """Versioned schema changes applied to an existing database (see src/services/migrations.py)"""
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}>'
+
+class Job(db.Model):
+    """Admin operation run in the background by the job runner (see src/services/jobs.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Registered task name, e.g. 'export-responses'
+    params_json = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, succeeded, failed, cancelled
+    total = db.Column(db.Integer, nullable=True)  # Units of work, when known
+    done = db.Column(db.Integer, default=0, nullable=False)
+    message = db.Column(db.String(200), nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    result_json = db.Column(db.Text, nullable=True)
+    result_path = db.Column(db.String(500), nullable=True)  # File produced by the job (exports)
+    result_name = db.Column(db.String(200), nullable=True)
+    result_mimetype = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, nullable=True)  # User id; no foreign key so users can be purged
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Heartbeat while running
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status', 'status', 'id'),
+        db.Index('ix_job_finished', 'finished_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind}>'
+
+    def to_dict(self):
+        progress = round(min(self.done / self.total, 1), 4) if self.total else None
+        elapsed = None
+        eta = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+            if self.status == 'running' and self.total and self.done:
+                # Linear extrapolation of the rate so far
+                eta = round(elapsed * (self.total - self.done) / self.done, 1)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': json.loads(self.params_json or '{}'),
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'progress': progress,
+            'message': self.message,
+            'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+            'eta_seconds': eta,
+            'cancel_requested': self.cancel_requested,
+            'has_result': self.status == 'succeeded' and (self.result_json is not None or self.result_path is not None),
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,22 +1,101 @@
 from flask import Blueprint, jsonify, request, session
+from sqlalchemy import func, null
+from sqlalchemy.orm import selectinload
 from src.models.user import Question, Comment, User, db
-from src.routes.user import login_required, admin_required
+from src.routes.user import USER_FIELDS, USER_SUMMARY, login_required, admin_required
+from src.services.fieldsets import Computed, Fieldset, Relation
+from src.services.pagination import clamp_per_page, encode_cursor, keyset_paginate, wants_total
+from src.services.search import forum_search
+import click
 
 forum_bp = Blueprint('forum', __name__)
 
+QUESTION_FIELDS = Fieldset(
+    Question,
+    default=('id', 'title', 'content', 'created_at', 'updated_at', 'is_active', 'user_id', 'author', 'comments_count'),
+    computed={'comments_count': Computed(None, ())},
+    relations={'author': Relation(Question.author, USER_FIELDS, USER_SUMMARY)})
+
+COMMENT_FIELDS = Fieldset(
+    Comment,
+    default=('id', 'content', 'created_at', 'updated_at', 'is_active', 'user_id', 'question_id', 'author'),
+    relations={'author': Relation(Comment.author, USER_FIELDS, USER_SUMMARY)})
+
+def questions_with_counts(selection):
+    """Query (Question, comments_count) rows loading only the selected fields, in a single SELECT"""
+    if 'comments_count' in selection.fields:
+        comments_count = db.select(func.count(Comment.id))\
+                           .where(Comment.question_id == Question.id)\
+                           .correlate(Question)\
+                           .scalar_subquery()
+    else:
+        comments_count = null()
+    return db.session.query(Question, comments_count.label('comments_count'))\
+                     .options(*QUESTION_FIELDS.options(selection, always=(Question.created_at,)))
+
+def comments_page(question_id, args):
+    """One page of a thread's active comments, oldest first, as a response dict.
+
+    `cursor` continues from a previous page; `after=<comment id>` returns only the replies
+    posted after that comment. Authors are loaded with one batched query for the whole page.
+    Raises ValueError for an invalid cursor or comment id.
+    """
+    per_page = args.get('comments_per_page', type=int) or args.get('per_page', 50, type=int)
+    cursor = args.get('cursor', '')
+    if args.get('after'):
+        after = db.session.query(Comment.created_at, Comment.id)\
+                          .filter_by(id=args.get('after', type=int), question_id=question_id).first()
+        if after is None:
+            raise ValueError('Unknown comment')
+        cursor = encode_cursor(after.created_at, after.id)
+    
+    selection = COMMENT_FIELDS.parse({})
+    query = Comment.query.options(*COMMENT_FIELDS.options(selection, always=(Comment.created_at,),
+                                                          relation_loader=selectinload))\
+                         .filter_by(question_id=question_id, is_active=True)
+    comments = keyset_paginate(query, Comment.created_at, Comment.id, cursor, per_page, descending=False)
+    return {
+        'comments': [COMMENT_FIELDS.serialize(comment, selection) for comment in comments.items],
+        'comments_next_cursor': comments.next_cursor
+    }
+
+def questions_cursor_page(query, selection, per_page):
+    """Keyset-paginated response for a questions_with_counts() query, newest first"""
+    try:
+        questions = keyset_paginate(query, Question.created_at, Question.id, request.args['cursor'],
+                                    per_page, entity=lambda row: row[0])
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    result = {
+        'questions': [QUESTION_FIELDS.serialize(q, selection, comments_count=count)
+                      for q, count in questions.items],
+        'next_cursor': questions.next_cursor
+    }
+    if wants_total(request.args):
+        result['total'] = query.order_by(None).count()
+    return jsonify(result)
+
 # Questions routes
 @forum_bp.route('/questions', methods=['GET'])
 @login_required
 def get_questions():
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 10, type=int))
+    try:
+        selection = QUESTION_FIELDS.parse(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = questions_with_counts(selection).filter(Question.is_active == True)
+    
+    if 'cursor' in request.args:
+        return questions_cursor_page(query, selection, per_page)
     
-    questions = Question.query.filter_by(is_active=True)\
-                            .order_by(Question.created_at.desc())\
-                            .paginate(page=page, per_page=per_page, error_out=False)
+    questions = query.order_by(Question.created_at.desc())\
+                     .paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'questions': [q.to_dict() for q in questions.items],
+        'questions': [QUESTION_FIELDS.serialize(q, selection, comments_count=count)
+                      for q, count in questions.items],
         'total': questions.total,
         'pages': questions.pages,
         'current_page': page
@@ -44,14 +123,23 @@ def create_question():
 @forum_bp.route('/questions/<int:question_id>', methods=['GET'])
 @login_required
 def get_question(question_id):
-    question = Question.query.filter_by(id=question_id, is_active=True).first_or_404()
-    
-    # Get comments for this question
-    comments = Comment.query.filter_by(question_id=question_id, is_active=True)\
-                          .order_by(Comment.created_at.asc()).all()
+    """A question with the first page of its thread.
+
+    comments_per_page= sets the page size (default 50); the rest of the thread comes from
+    GET /questions/<id>/comments with the returned comments_next_cursor.
+    """
+    try:
+        selection = QUESTION_FIELDS.parse(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    question, comments_count = questions_with_counts(selection)\
+        .filter(Question.id == question_id, Question.is_active == True).first_or_404()
     
-    question_dict = question.to_dict()
-    question_dict['comments'] = [comment.to_dict() for comment in comments]
+    question_dict = QUESTION_FIELDS.serialize(question, selection, comments_count=comments_count)
+    try:
+        question_dict.update(comments_page(question_id, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify(question_dict)
 
@@ -85,6 +173,18 @@ def delete_question(question_id):
     return '', 204
 
 # Comments routes
+@forum_bp.route('/questions/<int:question_id>/comments', methods=['GET'])
+@login_required
+def get_comments(question_id):
+    """Page through a thread oldest first: ?cursor=<comments_next_cursor>, or poll for new
+    replies with ?after=<id of the last comment seen>"""
+    if not db.session.query(Question.id).filter_by(id=question_id, is_active=True).first():
+        return jsonify({'error': 'Question not found'}), 404
+    try:
+        return jsonify(comments_page(question_id, request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @forum_bp.route('/questions/<int:question_id>/comments', methods=['POST'])
 @login_required
 def create_comment(question_id):
@@ -139,13 +239,22 @@ def delete_comment(comment_id):
 @admin_required
 def admin_get_questions():
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int))
+    try:
+        selection = QUESTION_FIELDS.parse(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = questions_with_counts(selection)
+    
+    if 'cursor' in request.args:
+        return questions_cursor_page(query, selection, per_page)
     
-    questions = Question.query.order_by(Question.created_at.desc())\
-                            .paginate(page=page, per_page=per_page, error_out=False)
+    questions = query.order_by(Question.created_at.desc())\
+                     .paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'questions': [q.to_dict() for q in questions.items],
+        'questions': [QUESTION_FIELDS.serialize(q, selection, comments_count=count)
+                      for q, count in questions.items],
         'total': questions.total,
         'pages': questions.pages,
         'current_page': page
@@ -163,13 +272,32 @@ def admin_toggle_question(question_id):
 @admin_required
 def admin_get_comments():
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int))
+    try:
+        selection = COMMENT_FIELDS.parse(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = Comment.query.options(*COMMENT_FIELDS.options(selection, always=(Comment.created_at,)))
+    
+    if 'cursor' in request.args:
+        try:
+            comments = keyset_paginate(query, Comment.created_at, Comment.id,
+                                       request.args['cursor'], per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        result = {
+            'comments': [COMMENT_FIELDS.serialize(c, selection) for c in comments.items],
+            'next_cursor': comments.next_cursor
+        }
+        if wants_total(request.args):
+            result['total'] = Comment.query.count()
+        return jsonify(result)
     
-    comments = Comment.query.order_by(Comment.created_at.desc())\
-                          .paginate(page=page, per_page=per_page, error_out=False)
+    comments = query.order_by(Comment.created_at.desc())\
+                    .paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
-        'comments': [c.to_dict() for c in comments.items],
+        'comments': [COMMENT_FIELDS.serialize(c, selection) for c in comments.items],
         'total': comments.total,
         'pages': comments.pages,
         'current_page': page
@@ -183,3 +311,30 @@ def admin_toggle_comment(comment_id):
     db.session.commit()
     return jsonify(comment.to_dict())
 
+
+# Search
+@forum_bp.route('/search', methods=['GET'])
+@login_required
+def search_forum():
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int))
+    
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    
+    results, total = forum_search.search(query, page, per_page)
+    
+    return jsonify({
+        'results': results,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'current_page': page
+    })
+
+@forum_bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the forum full-text search index from the active questions and comments"""
+    with db.engine.begin() as connection:
+        indexed = forum_search.index.rebuild(connection)
+    click.echo(f'Indexed {indexed} post(s) with {forum_search.index.name}')
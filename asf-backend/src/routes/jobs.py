@@ -0,0 +1,74 @@
+from flask import Blueprint, jsonify, request, send_file, session, url_for
+from src.models.user import Job
+from src.routes.user import admin_required, jobs_busy
+from src.services.jobs import JobQueueFull, jobs
+import json
+import os
+
+jobs_bp = Blueprint('jobs', __name__)
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+@jobs_bp.route('/admin/jobs', methods=['POST'])
+@admin_required
+def start_job():
+    """Queue a background job: {"kind": "export-responses", "params": {"survey_id": 1}}"""
+    data = request.json or {}
+    try:
+        job = jobs.start(data.get('kind'), data.get('params'), session['user_id'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobQueueFull:
+        return jobs_busy()
+
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = url_for('jobs.get_job', job_id=job.id)
+    return response, 202
+
+@jobs_bp.route('/admin/jobs', methods=['GET'])
+@admin_required
+def get_jobs():
+    """Recent jobs, newest first, optionally filtered by status and kind"""
+    query = Job.query
+    status = request.args.get('status')
+    if status:
+        if status not in JOB_STATUSES:
+            return jsonify({'error': f"Unknown status, use one of: {', '.join(JOB_STATUSES)}"}), 400
+        query = query.filter(Job.status == status)
+    if request.args.get('kind'):
+        query = query.filter(Job.kind == request.args['kind'])
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    return jsonify({
+        'jobs': [job.to_dict() for job in query.order_by(Job.id.desc()).limit(limit)],
+        'kinds': sorted(jobs.tasks)
+    })
+
+@jobs_bp.route('/admin/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    """Status, progress and ETA of a job"""
+    return jsonify(Job.query.get_or_404(job_id).to_dict())
+
+@jobs_bp.route('/admin/jobs/<int:job_id>/result', methods=['GET'])
+@admin_required
+def get_job_result(job_id):
+    """Result of a succeeded job: its file as a download, or its JSON result"""
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'succeeded':
+        return jsonify({'error': 'The job has no result', 'job': job.to_dict()}), 409
+    if job.result_path:
+        if not os.path.exists(job.result_path):
+            return jsonify({'error': 'The result file is no longer available'}), 410
+        return send_file(job.result_path, mimetype=job.result_mimetype, as_attachment=True,
+                         download_name=job.result_name)
+    return jsonify({'result': json.loads(job.result_json) if job.result_json else None})
+
+@jobs_bp.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop"""
+    job = Job.query.get_or_404(job_id)
+    if job.status not in ('queued', 'running'):
+        return jsonify({'error': f'The job is already {job.status}', 'job': job.to_dict()}), 409
+    job = jobs.cancel(job)
+    return jsonify(job.to_dict()), 202
@@ -1,66 +1,150 @@
-from flask import Blueprint, jsonify, request, session
-from src.models.user import Survey, SurveyResponse, db
-from src.routes.user import login_required, admin_required
+from flask import Blueprint, Response, current_app, jsonify, request, session, stream_with_context
+from sqlalchemy import func, null
+from src.models.user import Job, Survey, SurveyAnswer, SurveyResponse, SurveyStatistics, db
+from src.routes.user import USER_FIELDS, USER_SUMMARY, client_ip, jobs_busy, login_required, admin_required, purge_response
+from src.services.survey_stats import build_statistics, rebuild_survey_statistics, rebuild_all_statistics, record_response
+from src.services.cache import MemoryCache, ResponseCache
+from src.services.fieldsets import Computed, Fieldset, Relation
+from src.services.ingest import ingestor
+from src.services.jobs import JobQueueFull, jobs
+from src.services.live_stats import StreamLimitReached, live_stats
+from src.services.pagination import clamp_per_page, keyset_paginate
+from src.services.purge import delete_target
+from src.services.survey_answers import backfill_answers, build_answers
+from src.services.survey_schema import SubmissionError, compile_survey
+from src.services.survey_export import EXPORT_FORMATS, generate_csv, generate_ndjson
+from datetime import datetime
+import click
 import json
 
 survey_bp = Blueprint('survey', __name__)
 
+# Public survey payloads, invalidated whenever a survey is created, changed or (de)activated
+survey_cache = ResponseCache(MemoryCache(maxsize=256, ttl=60))
+
+# Admin listings default to a compact form: question counts instead of the question definitions
+SURVEY_FIELDS = Fieldset(
+    Survey,
+    default=('id', 'title', 'description', 'is_active', 'created_at', 'updated_at', 'responses_count', 'questions_count'),
+    computed={
+        'responses_count': Computed(None, ()),
+        'questions': Computed(lambda survey: compile_survey(survey).questions, ('questions_json', 'updated_at')),
+        'questions_count': Computed(lambda survey: len(compile_survey(survey).questions), ('questions_json', 'updated_at'))
+    })
+
+RESPONSE_FIELDS = Fieldset(
+    SurveyResponse,
+    default=('id', 'survey_id', 'user_id', 'responses_json', 'submitted_at', 'ip_address'),
+    relations={'user': Relation(SurveyResponse.user, USER_FIELDS, USER_SUMMARY)},
+    hidden=('submission_id',))
+
+def surveys_with_counts(selection=None):
+    """Query (Survey, responses_count) rows in a single SELECT, optionally loading only `selection`"""
+    responses_count = db.select(func.count(SurveyResponse.id))\
+                        .where(SurveyResponse.survey_id == Survey.id)\
+                        .correlate(Survey)\
+                        .scalar_subquery()
+    if selection is None:
+        return db.session.query(Survey, responses_count.label('responses_count'))
+    if 'responses_count' not in selection.fields:
+        responses_count = null()
+    return db.session.query(Survey, responses_count.label('responses_count'))\
+                     .options(*SURVEY_FIELDS.options(selection, always=(Survey.created_at,)))
+
 # Public survey routes
 @survey_bp.route('/surveys/active', methods=['GET'])
 def get_active_surveys():
     """Get all currently active surveys for public access"""
-    surveys = Survey.query.filter_by(is_active=True).all()
-    if not surveys:
+    def build():
+        surveys = surveys_with_counts().filter(Survey.is_active == True).all()
+        if not surveys:
+            return None, None
+        return ([survey.to_dict(responses_count=count) for survey, count in surveys],
+                max((survey.updated_at for survey, count in surveys if survey.updated_at), default=None))
+    
+    response = survey_cache.json_response('surveys:active', build)
+    if response is None:
         return jsonify({'error': 'No active surveys found'}), 404
-    
-    return jsonify([survey.to_dict() for survey in surveys])
+    return response
 
 @survey_bp.route('/surveys/active/first', methods=['GET'])
 def get_first_active_survey():
     """Get the first currently active survey for public access (backward compatibility)"""
-    survey = Survey.query.filter_by(is_active=True).first()
-    if not survey:
+    def build():
+        survey = Survey.query.filter_by(is_active=True).first()
+        if not survey:
+            return None, None
+        return survey.to_dict(), survey.updated_at
+    
+    response = survey_cache.json_response('surveys:active:first', build)
+    if response is None:
         return jsonify({'error': 'No active survey found'}), 404
-    
-    return jsonify(survey.to_dict())
+    return response
 
-@survey_bp.route('/surveys/<int:survey_id>/submit', methods=['POST'])
-def submit_survey_response(survey_id):
-    """Submit a response to a survey (public endpoint)"""
+def save_survey_response(survey_id):
+    """Validate and store a submitted response, shared by both submit endpoints"""
     survey = Survey.query.filter_by(id=survey_id, is_active=True).first_or_404()
     
     data = request.json
     if not data.get('responses'):
         return jsonify({'error': 'Responses are required'}), 400
     
+    # Check the answers against the questions and store them in canonical form
+    try:
+        responses = compile_survey(survey).validate(data['responses'])
+    except SubmissionError as e:
+        return jsonify({'error': 'Invalid responses', 'details': e.errors}), 400
+    
     # Check if user is logged in
     user_id = session.get('user_id')
     
-    # Get client IP address
-    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
+    # Client IP address (from X-Forwarded-For only when set by a trusted proxy)
+    ip_address = client_ip()
+    
+    # Acknowledged once spilled to disk, written by the background group commit; written below
+    # when it could not be spilled
+    submission_id = ingestor.submit(survey_id, user_id, responses, ip_address) if ingestor.enabled else None
+    if submission_id is not None:
+        return jsonify({
+            'message': 'Survey response accepted',
+            'submission_id': submission_id,
+            'response_id': None
+        }), 202
     
     response = SurveyResponse(
         survey_id=survey_id,
         user_id=user_id,
-        responses_json=json.dumps(data['responses']),
-        ip_address=ip_address
+        responses_json=json.dumps(responses),
+        ip_address=ip_address,
+        answers=build_answers(survey, responses)
     )
     
     db.session.add(response)
+    record_response(survey, responses)
     db.session.commit()
+    live_stats.notify(survey_id)
     
     return jsonify({
         'message': 'Survey response submitted successfully',
         'response_id': response.id
     }), 201
 
+@survey_bp.route('/surveys/<int:survey_id>/submit', methods=['POST'])
+def submit_survey_response(survey_id):
+    """Submit a response to a survey (public endpoint)"""
+    return save_survey_response(survey_id)
+
 # Admin survey management routes
 @survey_bp.route('/admin/surveys', methods=['GET'])
 @admin_required
 def get_surveys():
     """Get all surveys for admin"""
-    surveys = Survey.query.order_by(Survey.created_at.desc()).all()
-    return jsonify([survey.to_dict() for survey in surveys])
+    try:
+        selection = SURVEY_FIELDS.parse(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    surveys = surveys_with_counts(selection).order_by(Survey.created_at.desc()).all()
+    return jsonify([SURVEY_FIELDS.serialize(survey, selection, responses_count=count) for survey, count in surveys])
 
 @survey_bp.route('/admin/surveys', methods=['POST'])
 @admin_required
@@ -81,9 +165,11 @@ def create_survey():
         questions_json=json.dumps(data['questions']),
         is_active=data.get('is_active', False)
     )
+    survey.statistics = SurveyStatistics(responses_count=0)
     
     db.session.add(survey)
     db.session.commit()
+    survey_cache.invalidate()
     
     return jsonify(survey.to_dict()), 201
 
@@ -109,20 +195,46 @@ def update_survey(survey_id):
     survey.description = data.get('description', survey.description)
     survey.is_active = data.get('is_active', survey.is_active)
     
+    rebuild = False
     if data.get('questions'):
-        survey.questions_json = json.dumps(data['questions'])
+        questions_json = json.dumps(data['questions'])
+        if questions_json != survey.questions_json:
+            survey.questions_json = questions_json
+            # Question ids or types may have changed, recount the stored responses
+            rebuild = True
+
+    statistics_job = None
+    if rebuild:
+        stats = db.session.get(SurveyStatistics, survey_id)
+        if stats is not None and stats.responses_count > current_app.config['SURVEY_REBUILD_INLINE_LIMIT']:
+            # The edit is committed together with its rebuild job, or not at all
+            try:
+                statistics_job = jobs.start('rebuild-stats', {'survey_id': survey_id}, session.get('user_id'))
+            except JobQueueFull:
+                db.session.rollback()
+                survey_cache.invalidate()
+                return jobs_busy()
+        else:
+            rebuild_survey_statistics(survey)
     
     db.session.commit()
-    return jsonify(survey.to_dict())
+    survey_cache.invalidate()
+    result = survey.to_dict()
+    if statistics_job is not None:
+        result['statistics_job'] = statistics_job.to_dict()
+    return jsonify(result)
 
 @survey_bp.route('/admin/surveys/<int:survey_id>', methods=['DELETE'])
 @admin_required
 def delete_survey(survey_id):
-    """Delete a survey"""
-    survey = Survey.query.get_or_404(survey_id)
-    db.session.delete(survey)
-    db.session.commit()
-    return '', 204
+    """Delete a survey with its responses; large surveys are purged by a job (202)"""
+    Survey.query.get_or_404(survey_id)
+    try:
+        job = delete_target('survey', survey_id, session['user_id'])
+    except JobQueueFull:
+        return jobs_busy()
+    survey_cache.invalidate()
+    return purge_response(job)
 
 @survey_bp.route('/admin/surveys/<int:survey_id>/activate', methods=['PUT'])
 @admin_required
@@ -136,6 +248,7 @@ def activate_survey(survey_id):
     survey.is_active = True
     
     db.session.commit()
+    survey_cache.invalidate()
     return jsonify(survey.to_dict())
 
 @survey_bp.route('/admin/surveys/<int:survey_id>/deactivate', methods=['PUT'])
@@ -146,183 +259,303 @@ def deactivate_survey(survey_id):
     survey.is_active = False
     
     db.session.commit()
+    survey_cache.invalidate()
     return jsonify(survey.to_dict())
 
 # Survey responses and statistics
 @survey_bp.route('/admin/surveys/<int:survey_id>/responses', methods=['GET'])
 @admin_required
 def get_survey_responses(survey_id):
-    """Get all responses for a survey"""
+    """Get all responses for a survey.
+
+    Rows default to the response columns; expand=user embeds respondents and expand=survey
+    adds the survey itself.
+    """
     survey = Survey.query.get_or_404(survey_id)
+    try:
+        selection = RESPONSE_FIELDS.parse(request.args, extra_expand=('survey',))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int))
+    query = SurveyResponse.query.options(*RESPONSE_FIELDS.options(selection, always=(SurveyResponse.submitted_at,)))\
+                                .filter_by(survey_id=survey_id)
+    
+    # Respondents who picked an option: ?question_id=<id>&option=<value>
+    question_id = request.args.get('question_id')
+    option = request.args.get('option')
+    filtered = question_id is not None and option is not None
+    if filtered:
+        query = query.filter(SurveyResponse.answers.any(
+            (SurveyAnswer.question_id == question_id) & (SurveyAnswer.option_value == option)))
+    
+    if 'cursor' in request.args:
+        try:
+            responses = keyset_paginate(query, SurveyResponse.submitted_at, SurveyResponse.id,
+                                        request.args['cursor'], per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        # The aggregated response counter replaces a COUNT(*) over the responses
+        stats = None if filtered else db.session.get(SurveyStatistics, survey_id)
+        total = stats.responses_count if stats else query.order_by(None).count()
+        result = {
+            'responses': [RESPONSE_FIELDS.serialize(response, selection) for response in responses.items],
+            'next_cursor': responses.next_cursor,
+            'total': total
+        }
+        if 'survey' in selection.expand:
+            result['survey'] = survey.to_dict(responses_count=None if filtered else total)
+        return jsonify(result)
     
-    responses = SurveyResponse.query.filter_by(survey_id=survey_id)\
-                                  .order_by(SurveyResponse.submitted_at.desc())\
-                                  .paginate(page=page, per_page=per_page, error_out=False)
+    responses = query.order_by(SurveyResponse.submitted_at.desc())\
+                     .paginate(page=page, per_page=per_page, error_out=False)
     
-    return jsonify({
-        'survey': survey.to_dict(),
-        'responses': [response.to_dict() for response in responses.items],
+    result = {
+        'responses': [RESPONSE_FIELDS.serialize(response, selection) for response in responses.items],
         'total': responses.total,
         'pages': responses.pages,
         'current_page': page
+    }
+    if 'survey' in selection.expand:
+        result['survey'] = survey.to_dict(responses_count=None if filtered else responses.total)
+    return jsonify(result)
+
+@survey_bp.route('/admin/surveys/<int:survey_id>/export', methods=['GET'])
+@admin_required
+def export_survey_responses(survey_id):
+    """Stream all responses for a survey as CSV or NDJSON, one column per question"""
+    survey = Survey.query.get_or_404(survey_id)
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    if export_format == 'csv':
+        body = generate_csv(survey)
+        mimetype = 'text/csv'
+    else:
+        body = generate_ndjson(survey)
+        mimetype = 'application/x-ndjson'
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=survey_{survey_id}_responses.{export_format}'
     })
 
+def rebuild_statistics_job(survey_id):
+    """The queued or running rebuild-stats job of a survey, started if there is none; raises JobQueueFull"""
+    for job in Job.query.filter(Job.kind == 'rebuild-stats', Job.status.in_(('queued', 'running'))):
+        if json.loads(job.params_json).get('survey_id') in (survey_id, None):
+            return job
+    return jobs.start('rebuild-stats', {'survey_id': survey_id}, session.get('user_id'))
+
 @survey_bp.route('/admin/surveys/<int:survey_id>/statistics', methods=['GET'])
 @admin_required
 def get_survey_statistics(survey_id):
-    """Get detailed statistics for a survey including completion percentage"""
+    """Get detailed statistics for a survey including completion percentage.
+
+    A survey without aggregates has them rebuilt inline up to SURVEY_REBUILD_INLINE_LIMIT
+    responses; above, by a job: 202 with an empty payload and the job to poll.
+    """
+    survey = Survey.query.get_or_404(survey_id)
+    text_limit = request.args.get('text_limit', 100, type=int)
+
+    statistics_job = None
+    if db.session.get(SurveyStatistics, survey_id) is None:
+        limit = current_app.config['SURVEY_REBUILD_INLINE_LIMIT']
+        # Counted up to the limit only
+        responses = db.session.query(SurveyResponse.id).filter(SurveyResponse.survey_id == survey_id)\
+                                                       .limit(limit + 1).count()
+        if responses > limit:
+            try:
+                statistics_job = rebuild_statistics_job(survey_id)
+            except JobQueueFull:
+                return jobs_busy()
+        else:
+            rebuild_survey_statistics(survey)
+            db.session.commit()
+
+    statistics = build_statistics(survey, text_limit=max(0, min(text_limit, 1000)))
+    if statistics_job is not None:
+        return jsonify({'survey': survey.to_dict(), **statistics, 'statistics_job': statistics_job.to_dict()}), 202
+    return jsonify({'survey': survey.to_dict(), **statistics})
+
+@survey_bp.route('/admin/surveys/<int:survey_id>/statistics/stream', methods=['GET'])
+@admin_required
+def stream_survey_statistics(survey_id):
+    """Server-Sent Events with increments of the statistics as responses arrive (see live_stats)"""
+    Survey.query.get_or_404(survey_id)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    # A thread-based worker would give up one of its threads for the whole connection
+    if not live_stats.available():
+        return Response(live_stats.fallback('unavailable'), mimetype='text/event-stream', headers=headers)
+    try:
+        subscription = live_stats.subscribe(survey_id)
+    except StreamLimitReached:
+        return Response(live_stats.fallback('busy'), mimetype='text/event-stream', headers=headers)
+
+    # Not wrapped in stream_with_context: the stream must not keep the request context
+    # (and its database session) for its whole lifetime
+    return Response(live_stats.stream(subscription), mimetype='text/event-stream', headers=headers)
+
+@survey_bp.route('/admin/surveys/<int:survey_id>/analytics', methods=['GET'])
+@admin_required
+def get_survey_analytics(survey_id):
+    """Vectorized statistics and cross-tabulations over a segment of the responses.
+
+    Query parameters: questions=<id>,<id> (default: all), crosstab=<row id>,<column id>,
+    company=<name>, from=<ISO date>, to=<ISO date> (exclusive), percentiles=25,50,75
+    """
+    # Imported here so that NumPy is only loaded by workers that serve analytics
+    from src.services.analytics import AnalyticsError, frames as analytics_frames, np as analytics_np
+    if analytics_np is None:
+        return jsonify({'error': 'Analytics require NumPy to be installed'}), 501
     survey = Survey.query.get_or_404(survey_id)
-    responses = SurveyResponse.query.filter_by(survey_id=survey_id).all()
-    
-    # Parse survey questions
-    questions = json.loads(survey.questions_json)
-    total_questions = len(questions)
-    required_questions = sum(1 for q in questions if q.get('required', False))
-    optional_questions = total_questions - required_questions
-    
-    if not responses:
-        return jsonify({
-            'survey': survey.to_dict(),
-            'total_responses': 0,
-            'total_questions': total_questions,
-            'required_questions': required_questions,
-            'optional_questions': optional_questions,
-            'completion_percentage': 0,
-            'statistics': {}
-        })
-    
-    statistics = {}
-    total_answered_questions = 0
-    total_possible_answers = len(responses) * total_questions
-    
-    # Calculate statistics for each question
-    for i, question in enumerate(questions):
-        question_key = f"question_{i}"
-        question_stats = {
-            'question': question,
-            'responses': [],
-            'answered_count': 0,
-            'response_rate': 0
-        }
-        
-        # Collect all responses for this question
-        for response in responses:
-            response_data = json.loads(response.responses_json)
-            # Use question ID as string for matching (responses store IDs as strings)
-            question_id = str(question.get('id'))
-            if question_id in response_data:
-                response_value = response_data[question_id]
-                # Check if the response is not empty
-                if response_value and response_value != '' and response_value != []:
-                    question_stats['responses'].append(response_value)
-                    question_stats['answered_count'] += 1
-                    total_answered_questions += 1
-            # Also check with integer key for backward compatibility
-            elif question.get('id') in response_data:
-                response_value = response_data[question.get('id')]
-                # Check if the response is not empty
-                if response_value and response_value != '' and response_value != []:
-                    question_stats['responses'].append(response_value)
-                    question_stats['answered_count'] += 1
-                    total_answered_questions += 1
-            # Debug: print what we're looking for vs what we have
-            print(f"DEBUG: Looking for question ID {question_id} or {question.get('id')} in response keys: {list(response_data.keys())}")
-            print(f"DEBUG: Response data: {response_data}")
-        
-        # Calculate response rate for this question
-        question_stats['response_rate'] = (question_stats['answered_count'] / len(responses)) * 100 if responses else 0
-        
-        # Calculate statistics based on question type
-        if question.get('type') == 'multiple_choice' or question.get('type') == 'radio':
-            # Count occurrences of each option
-            option_counts = {}
-            for response_value in question_stats['responses']:
-                option_counts[response_value] = option_counts.get(response_value, 0) + 1
-            question_stats['option_counts'] = option_counts
-        
-        elif question.get('type') == 'checkbox':
-            # Count occurrences of each selected option
-            option_counts = {}
-            for response_value in question_stats['responses']:
-                if isinstance(response_value, list):
-                    for option in response_value:
-                        option_counts[option] = option_counts.get(option, 0) + 1
-            question_stats['option_counts'] = option_counts
-        
-        elif question.get('type') == 'select':
-            # Count occurrences of each selected option
-            option_counts = {}
-            for response_value in question_stats['responses']:
-                option_counts[response_value] = option_counts.get(response_value, 0) + 1
-            question_stats['option_counts'] = option_counts
-        
-        elif question.get('type') == 'rating':
-            # Calculate average rating
-            ratings = [int(r) for r in question_stats['responses'] if str(r).isdigit()]
-            if ratings:
-                question_stats['average_rating'] = sum(ratings) / len(ratings)
-                question_stats['rating_counts'] = {}
-                for rating in ratings:
-                    question_stats['rating_counts'][str(rating)] = question_stats['rating_counts'].get(str(rating), 0) + 1
-        
-        elif question.get('type') == 'text':
-            # For text questions, just count non-empty responses
-            question_stats['text_responses'] = [r for r in question_stats['responses'] if r.strip()]
-        
-        statistics[question_key] = question_stats
-    
-    # Calculate overall completion percentage
-    completion_percentage = (total_answered_questions / total_possible_answers) * 100 if total_possible_answers > 0 else 0
     
-    return jsonify({
-        'survey': survey.to_dict(),
-        'total_responses': len(responses),
-        'total_questions': total_questions,
-        'required_questions': required_questions,
-        'optional_questions': optional_questions,
-        'completion_percentage': round(completion_percentage, 2),
-        'total_answered_questions': total_answered_questions,
-        'total_possible_answers': total_possible_answers,
-        'statistics': statistics
-    })
+    try:
+        date_from = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        percentiles = [float(p) for p in request.args.get('percentiles', '25,50,75,90').split(',') if p]
+    except ValueError:
+        return jsonify({'error': 'Invalid date or percentile'}), 400
+    if any(p < 0 or p > 100 for p in percentiles):
+        return jsonify({'error': 'Percentiles must be between 0 and 100'}), 400
+    
+    frame = analytics_frames.get(survey)
+    mask = frame.segment(company=request.args.get('company'), date_from=date_from, date_to=date_to)
+    question_ids = [q for q in request.args.get('questions', '').split(',') if q] or list(frame.questions)
+    unknown = [q for q in question_ids if q not in frame.questions]
+    if unknown:
+        return jsonify({'error': f"Unknown question(s): {', '.join(unknown)}"}), 400
+    
+    result = {
+        'survey_id': survey_id,
+        'segment': {
+            'company': request.args.get('company'),
+            'from': request.args.get('from'),
+            'to': request.args.get('to')
+        },
+        'total_responses': int(mask.sum()),
+        'questions': {q: frame.question_statistics(q, mask, percentiles) for q in question_ids}
+    }
+    
+    if request.args.get('crosstab'):
+        pair = request.args['crosstab'].split(',')
+        if len(pair) != 2 or any(q not in frame.questions for q in pair):
+            return jsonify({'error': 'crosstab needs two question ids: <row>,<column>'}), 400
+        try:
+            result['crosstab'] = frame.crosstab(pair[0], pair[1], mask)
+        except AnalyticsError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    return jsonify(result)
+
+@survey_bp.cli.command('rebuild-stats')
+@click.option('--survey-id', type=int, default=None, help='Only rebuild this survey')
+def rebuild_stats_command(survey_id):
+    """Rebuild the pre-aggregated survey statistics from stored responses"""
+    if survey_id is not None:
+        survey = db.session.get(Survey, survey_id)
+        if survey is None:
+            raise click.ClickException(f'Survey {survey_id} not found')
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+        click.echo(f'Rebuilt statistics for survey {survey_id}')
+    else:
+        click.echo(f'Rebuilt statistics for {rebuild_all_statistics()} survey(s)')
+
+@survey_bp.cli.command('backfill-answers')
+@click.option('--batch-size', type=int, default=1000, help='Responses processed per batch')
+def backfill_answers_command(batch_size):
+    """Create the normalized SurveyAnswer rows of responses that have none"""
+    with db.engine.begin() as connection:
+        processed = backfill_answers(connection, batch_size=batch_size)
+    click.echo(f'Backfilled answers of {processed} response(s)')
+
+# Background jobs (started with POST /api/admin/jobs, see src/routes/jobs.py)
+
+def _survey_id_param(params, required=False):
+    survey_id = params.get('survey_id')
+    if survey_id is None:
+        if required:
+            raise ValueError('survey_id is required')
+        return None
+    if not isinstance(survey_id, int) or db.session.get(Survey, survey_id) is None:
+        raise ValueError(f'Survey {survey_id} not found')
+    return survey_id
+
+def _rebuild_stats_params(params):
+    return {'survey_id': _survey_id_param(params)}
+
+@jobs.task('rebuild-stats', validate=_rebuild_stats_params)
+def rebuild_stats_job(job, survey_id=None):
+    """Rebuild the statistics of one survey, or of all of them one transaction per survey"""
+    if survey_id is not None:
+        survey_ids = [survey_id]
+    else:
+        survey_ids = db.session.execute(db.select(Survey.id).order_by(Survey.id)).scalars().all()
+    for done, current_id in enumerate(survey_ids):
+        job.progress(done, len(survey_ids), f'Survey {current_id}')
+        survey = db.session.get(Survey, current_id)
+        if survey is not None:
+            rebuild_survey_statistics(survey)
+            db.session.commit()
+    return {'surveys': len(survey_ids)}
 
+def _backfill_answers_params(params):
+    batch_size = params.get('batch_size', 1000)
+    if not isinstance(batch_size, int) or not 1 <= batch_size <= 10000:
+        raise ValueError('batch_size must be an integer between 1 and 10000')
+    return {'batch_size': batch_size}
+
+@jobs.task('backfill-answers', validate=_backfill_answers_params)
+def backfill_answers_job(job, batch_size=1000):
+    """Create missing normalized answers, committing after each batch"""
+    total = db.session.query(func.count(SurveyResponse.id)).filter(~SurveyResponse.answers.any()).scalar()
+    job.progress(0, total)
+    with db.engine.connect() as connection:
+        def on_batch(processed):
+            connection.commit()
+            job.progress(processed)
+        processed = backfill_answers(connection, batch_size=batch_size, on_batch=on_batch)
+    return {'responses': processed}
+
+def _export_params(params):
+    export_format = params.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}")
+    return {'survey_id': _survey_id_param(params, required=True), 'format': export_format}
+
+@jobs.task('export-responses', validate=_export_params)
+def export_responses_job(job, survey_id, format='csv'):
+    """Write the responses of a survey to a file, downloaded from the job's result"""
+    survey = db.session.get(Survey, survey_id)
+    if survey is None:
+        raise ValueError(f'Survey {survey_id} not found')
+    total = db.session.query(func.count(SurveyResponse.id)).filter(SurveyResponse.survey_id == survey_id).scalar()
+    job.progress(0, total)
+
+    if format == 'csv':
+        body, mimetype, rows = generate_csv(survey), 'text/csv', -1  # The first chunk is the header
+    else:
+        body, mimetype, rows = generate_ndjson(survey), 'application/x-ndjson', 0
+    with job.open_result(f'survey_{survey_id}_responses.{format}', mimetype) as f:
+        for chunk in body:
+            f.write(chunk)
+            rows += 1
+            if rows and rows % 1000 == 0:
+                job.progress(rows)
+    return {'rows': max(rows, 0)}
 
 @survey_bp.route('/surveys/<int:survey_id>/public', methods=['GET'])
 def get_public_survey(survey_id):
     """Get a survey for public access"""
-    survey = Survey.query.filter_by(id=survey_id, is_active=True).first_or_404()
-    return jsonify(survey.to_dict())
+    def build():
+        survey = Survey.query.filter_by(id=survey_id, is_active=True).first_or_404()
+        return survey.to_dict(), survey.updated_at
+    
+    return survey_cache.json_response(f'surveys:{survey_id}:public', build)
 
 @survey_bp.route('/surveys/<int:survey_id>/responses', methods=['POST'])
 def submit_survey_response_alt(survey_id):
     """Submit a response to a survey (alternative endpoint)"""
-    survey = Survey.query.filter_by(id=survey_id, is_active=True).first_or_404()
-    
-    data = request.json
-    if not data.get('responses'):
-        return jsonify({'error': 'Responses are required'}), 400
-    
-    # Check if user is logged in
-    user_id = session.get('user_id')
-    
-    # Get client IP address
-    ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
-    
-    response = SurveyResponse(
-        survey_id=survey_id,
-        user_id=user_id,
-        responses_json=json.dumps(data['responses']),
-        ip_address=ip_address
-    )
-    
-    db.session.add(response)
-    db.session.commit()
-    
-    return jsonify({
-        'message': 'Survey response submitted successfully',
-        'response_id': response.id
-    }), 201
-
+    return save_survey_response(survey_id)
@@ -1,9 +1,89 @@
-from flask import Blueprint, jsonify, request, session
-from src.models.user import User, db
+from flask import Blueprint, jsonify, request, session, url_for
+from sqlalchemy import and_, func, literal, or_, union_all
+from src.models.user import Comment, Question, SurveyResponse, User, db
+from src.services.cache import MemoryCache
+from src.services.fieldsets import Computed, Fieldset
+from src.services.pagination import clamp_per_page
+from src.services.jobs import JobQueueFull
+from src.services.passwords import HasherBusy, hasher, login_throttle
+from src.services.purge import delete_target
 from functools import wraps
+import sys
 
 user_bp = Blueprint('user', __name__)
 
+# user_id -> whether the user is an active admin. Invalidated on user changes in this process;
+# the TTL bounds how long a revoked admin keeps access through another worker.
+admin_cache = MemoryCache(maxsize=1024, ttl=30)
+
+# ?fields= for user listings; other resources embed a user as its summary (id, username)
+USER_FIELDS = Fieldset(User, default=('id', 'username', 'email', 'company', 'is_admin', 'created_at', 'is_active', 'activity'),
+                       computed={'activity': Computed(None, ())},
+                       hidden=('password_hash',))
+USER_SUMMARY = ('id', 'username')
+
+# ?sort= keys of the user directory; text columns sort case-insensitively on their lower() index
+USER_SORTS = {
+    'username': func.lower(User.username),
+    'email': func.lower(User.email),
+    'company': func.lower(User.company),
+    'created_at': User.created_at,
+    'id': User.id
+}
+
+def prefix_filter(term):
+    """Case-insensitive prefix match on username, email or company, as index range scans.
+
+    Case folding is Unicode-aware on both sides: Python's lower() here, and in SQLite the
+    lower() installed by engine.py.
+    """
+    low = term.lower()
+    # The first string after every one starting with `low`: its last character that can be
+    # incremented, incremented (trailing U+10FFFF have no successor). None: no upper bound
+    stem = low.rstrip(chr(sys.maxunicode))
+    high = stem[:-1] + chr(ord(stem[-1]) + 1) if stem else None
+    return or_(*[and_(func.lower(column) >= low, func.lower(column) < high) if high is not None
+                 else func.lower(column) >= low
+                 for column in (User.username, User.email, User.company)])
+
+def parse_flag(value):
+    """True/False for a boolean query parameter, None when absent; raises ValueError otherwise"""
+    if value is None:
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(value)
+
+def activity_counts(user_ids):
+    """{user_id: {'questions', 'comments', 'survey_responses'}} for the given users, in one query"""
+    if not user_ids:
+        return {}
+    activity = union_all(
+        db.select(Question.user_id.label('user_id'), literal(1).label('kind')).where(Question.user_id.in_(user_ids)),
+        db.select(Comment.user_id, literal(2)).where(Comment.user_id.in_(user_ids)),
+        db.select(SurveyResponse.user_id, literal(3)).where(SurveyResponse.user_id.in_(user_ids))
+    ).subquery()
+    rows = db.session.execute(
+        db.select(activity.c.user_id,
+                  func.sum(db.case((activity.c.kind == 1, 1), else_=0)),
+                  func.sum(db.case((activity.c.kind == 2, 1), else_=0)),
+                  func.sum(db.case((activity.c.kind == 3, 1), else_=0)))
+          .group_by(activity.c.user_id))
+    counts = {user_id: {'questions': 0, 'comments': 0, 'survey_responses': 0} for user_id in user_ids}
+    for user_id, questions, comments, responses in rows:
+        counts[user_id] = {'questions': questions, 'comments': comments, 'survey_responses': responses}
+    return counts
+
+def is_active_admin(user_id):
+    allowed = admin_cache.get(user_id)
+    if allowed is None:
+        user = db.session.get(User, user_id)
+        allowed = bool(user and user.is_admin and user.is_active)
+        admin_cache.set(user_id, allowed)
+    return allowed
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -17,12 +97,33 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        if not is_active_admin(session['user_id']):
             return jsonify({'error': 'Admin access required'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
+def client_ip():
+    """Address of the client; behind TRUSTED_PROXY_COUNT proxies (ProxyFix) it comes from X-Forwarded-For"""
+    return request.remote_addr
+
+def jobs_busy():
+    response = jsonify({'error': 'Too many jobs waiting, please retry later'})
+    response.headers['Retry-After'] = '30'
+    return response, 503
+
+def purge_response(job):
+    """204 when the deletion ran inline, else 202 with the purge job to poll"""
+    if job is None:
+        return '', 204
+    response = jsonify({'job': job.to_dict()})
+    response.headers['Location'] = url_for('jobs.get_job', job_id=job.id)
+    return response, 202
+
+def server_busy():
+    response = jsonify({'error': 'Server busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @user_bp.route('/register', methods=['POST'])
 def register():
     data = request.json
@@ -44,7 +145,10 @@ def register():
         email=data['email'],
         company=data.get('company', '')
     )
-    user.set_password(data['password'])
+    try:
+        user.password_hash = hasher.hash(data['password'])
+    except HasherBusy:
+        return server_busy()
     
     db.session.add(user)
     db.session.commit()
@@ -61,9 +165,35 @@ def login():
     if not data.get('username') or not data.get('password'):
         return jsonify({'error': 'Username and password are required'}), 400
     
+    # Refuse before hashing anything once a client keeps failing (for this username or overall)
+    ip_address = client_ip()
+    retry_after = login_throttle.retry_after(data['username'], ip_address)
+    if retry_after:
+        response = jsonify({'error': 'Too many failed login attempts'})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    
     user = User.query.filter_by(username=data['username']).first()
     
-    if user and user.check_password(data['password']) and user.is_active:
+    try:
+        valid = user is not None and hasher.verify(user.password_hash, data['password'])
+    except HasherBusy:
+        return server_busy()
+    
+    if valid and hasher.needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hasher.hash(data['password'])
+            db.session.commit()
+        except HasherBusy:
+            # The login doesn't depend on it: the hash is upgraded on a later login
+            pass
+    
+    if valid:
+        login_throttle.succeeded(data['username'], ip_address)
+    else:
+        login_throttle.failed(data['username'], ip_address)
+    
+    if valid and user.is_active:
         session['user_id'] = user.id
         session['is_admin'] = user.is_admin
         return jsonify({
@@ -88,8 +218,46 @@ def get_current_user():
 @user_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    """Paginated user directory.
+
+    Query parameters: q=<prefix of username, email or company>, is_admin=, is_active=,
+    sort=<username|email|company|created_at|id> (prefix '-' for descending), page=, per_page=,
+    fields= (the default includes per-user activity counts)
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = clamp_per_page(request.args.get('per_page', 20, type=int))
+    sort = request.args.get('sort', 'username')
+    descending = sort.startswith('-')
+    if sort.lstrip('-') not in USER_SORTS:
+        return jsonify({'error': f"Invalid sort, expected one of {', '.join(USER_SORTS)}"}), 400
+    try:
+        selection = USER_FIELDS.parse(request.args)
+        is_admin = parse_flag(request.args.get('is_admin'))
+        is_active = parse_flag(request.args.get('is_active'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    
+    query = User.query.options(*USER_FIELDS.options(selection))
+    term = request.args.get('q', '').strip()
+    if term:
+        query = query.filter(prefix_filter(term))
+    if is_admin is not None:
+        query = query.filter(User.is_admin == is_admin)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    
+    order = USER_SORTS[sort.lstrip('-')]
+    users = query.order_by(order.desc() if descending else order.asc(),
+                           User.id.desc() if descending else User.id.asc())\
+                 .paginate(page=page, per_page=per_page, error_out=False)
+    
+    activity = activity_counts([user.id for user in users.items]) if 'activity' in selection.fields else {}
+    return jsonify({
+        'users': [USER_FIELDS.serialize(user, selection, activity=activity.get(user.id)) for user in users.items],
+        'total': users.total,
+        'pages': users.pages,
+        'current_page': page
+    })
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 @admin_required
@@ -110,15 +278,20 @@ def update_user(user_id):
     user.is_admin = data.get('is_admin', user.is_admin)
     
     db.session.commit()
+    admin_cache.delete(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
-    db.session.delete(user)
-    db.session.commit()
-    return '', 204
+    """Delete a user with their posts and responses; large accounts are purged by a job (202)"""
+    User.query.get_or_404(user_id)
+    try:
+        job = delete_target('user', user_id, session['user_id'])
+    except JobQueueFull:
+        return jobs_busy()
+    admin_cache.delete(user_id)
+    return purge_response(job)
 
 @user_bp.route('/profile', methods=['PUT'])
 @login_required
@@ -130,8 +303,20 @@ def update_profile():
     user.company = data.get('company', user.company)
     
     if data.get('password'):
-        user.set_password(data['password'])
+        try:
+            user.password_hash = hasher.hash(data['password'])
+        except HasherBusy:
+            return server_busy()
     
     db.session.commit()
     return jsonify(user.to_dict())
 
+
+@user_bp.route('/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    from src.routes.survey import survey_cache
+    return jsonify({
+        'admin_auth': admin_cache.stats(),
+        'public_surveys': survey_cache.backend.stats()
+    })
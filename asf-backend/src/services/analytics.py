@@ -0,0 +1,313 @@
+"""Columnar survey analytics.
+
+A survey's answers are loaded once from the normalized SurveyAnswer rows into NumPy arrays
+(one column per question) and kept in a small LRU cache; later requests only load the
+responses added since. Answers are read grouped by value, one row per distinct answer with the
+ids of the responses that gave it, so a load does no per-answer work in Python. Counts, rating
+statistics and cross-tabulations are then vectorized over the whole column, optionally
+restricted to a segment (respondent company, submission date range).
+
+A cached frame is rebuilt when the questions change (survey.updated_at) or when the survey's
+statistics generation moves: every response deletion ends with a rebuild of the statistics,
+which bumps it. It is also rebuilt when it holds fewer responses than the statistics count:
+ids are not committed in order (on Postgres a lower id can commit after a higher one), so a
+response can land behind the id the frame has already loaded. Frames are never modified once
+returned: new responses are appended to a copy.
+
+Column encodings:
+  radio/select/multiple_choice  int32 codes into the option labels, -1 when unanswered
+  checkbox                      boolean matrix (responses x options)
+  rating                        float64 values, NaN when unanswered
+  text and others               boolean "answered" flags
+"""
+import copy
+import threading
+from collections import OrderedDict
+from sqlalchemy import cast, func, select
+from src.models.user import SurveyAnswer, SurveyResponse, SurveyStatistics, User, db
+from src.services.survey_schema import compile_survey
+
+try:
+    import numpy as np
+except ImportError:  # Analytics endpoints answer 501 without NumPy
+    np = None
+
+SINGLE_CHOICE_TYPES = ('radio', 'select', 'multiple_choice')
+DEFAULT_PERCENTILES = (25, 50, 75, 90)
+
+class AnalyticsError(ValueError):
+    """Invalid analytics request (unknown question, unsupported cross-tab...)"""
+
+class _Categories:
+    """Growable mapping of labels to integer codes"""
+
+    def __init__(self, labels=()):
+        self.labels = list(labels)
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def copy(self):
+        return _Categories(self.labels)
+
+class SurveyFrame:
+    """Columnar representation of the responses of one survey"""
+
+    def __init__(self, survey, generation=None):
+        self.survey_id = survey.id
+        self.version = survey.updated_at
+        self.generation = generation
+        self.questions = {item.key: item.question for item in compile_survey(survey).items}
+        self.response_ids = np.empty(0, dtype=np.int64)
+        self.submitted_at = np.empty(0, dtype='datetime64[s]')
+        self.companies = _Categories()
+        self.company_codes = np.empty(0, dtype=np.int32)
+        self.options = {}
+        self.columns = {}
+        for question_id, question in self.questions.items():
+            question_type = question.get('type')
+            options = _Categories(str(o) for o in question.get('options') or [])
+            if question_type in SINGLE_CHOICE_TYPES:
+                self.options[question_id] = options
+                self.columns[question_id] = np.empty(0, dtype=np.int32)
+            elif question_type == 'checkbox':
+                self.options[question_id] = options
+                self.columns[question_id] = np.zeros((0, len(options.labels)), dtype=bool)
+            elif question_type == 'rating':
+                self.columns[question_id] = np.empty(0, dtype=np.float64)
+            else:
+                self.columns[question_id] = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.response_ids)
+
+    @property
+    def last_response_id(self):
+        return int(self.response_ids[-1]) if len(self.response_ids) else 0
+
+    def copy(self):
+        """Copy to append to while readers use this frame (arrays are replaced, never written to)"""
+        frame = copy.copy(self)
+        frame.companies = self.companies.copy()
+        frame.options = {question_id: options.copy() for question_id, options in self.options.items()}
+        frame.columns = dict(self.columns)
+        return frame
+
+    def load(self):
+        """Append the responses submitted since the last load"""
+        last_id = self.last_response_id
+        # On the session's connection: plain rows, without the ORM's per-row processing
+        connection = db.session.connection()
+        # Timestamps as text, parsed by NumPy much faster than as datetime objects
+        responses = connection.execute(
+            select(SurveyResponse.id, cast(SurveyResponse.submitted_at, db.String), User.company)
+            .outerjoin(User, User.id == SurveyResponse.user_id)
+            .where(SurveyResponse.survey_id == self.survey_id, SurveyResponse.id > last_id)
+            .order_by(SurveyResponse.id)).all()
+        if not responses:
+            return 0
+        response_ids, submitted_at, companies = zip(*responses)
+        ids = np.array(response_ids, dtype=np.int64)
+
+        # Bounded by the last response read: answers of later responses are loaded with them
+        answers = self._fetch_answers(connection, last_id, int(ids[-1]))
+
+        self.response_ids = np.concatenate([self.response_ids, ids])
+        self.submitted_at = np.concatenate([self.submitted_at,
+                                            np.array(submitted_at, dtype='datetime64[us]').astype('datetime64[s]')])
+        self.company_codes = np.concatenate([self.company_codes, np.fromiter(
+            map(self.companies.code, (company or '' for company in companies)), dtype=np.int32, count=len(ids))])
+        for question_id, groups in answers.items():
+            self.columns[question_id] = self._append(question_id, ids, groups)
+        return len(ids)
+
+    def _fetch_answers(self, connection, first_id, last_id):
+        """Answers of the responses in (first_id, last_id], grouped by value in the database:
+        {question_id: [(option_value, numeric_value, array of response ids)]}.
+
+        One row per distinct answer rather than per answer; ix_survey_answer_value covers the
+        query in group order, so no answer row is read from the table.
+        """
+        response_ids = func.aggregate_strings(cast(SurveyAnswer.response_id, db.String), ',')
+        rows = connection.execute(
+            select(SurveyAnswer.question_id, SurveyAnswer.option_value, SurveyAnswer.numeric_value, response_ids)
+            .where(SurveyAnswer.survey_id == self.survey_id,
+                   SurveyAnswer.response_id > first_id, SurveyAnswer.response_id <= last_id)
+            .group_by(SurveyAnswer.question_id, SurveyAnswer.option_value, SurveyAnswer.numeric_value))
+        answers = {question_id: [] for question_id in self.columns}
+        for question_id, option_value, numeric_value, ids in rows:
+            groups = answers.get(question_id)
+            if groups is not None:
+                groups.append((option_value, numeric_value, np.fromstring(ids, dtype=np.int64, sep=',')))
+        return answers
+
+    def _append(self, question_id, ids, groups):
+        """Column of a question extended with the rows of the new responses `ids`"""
+        question_type = self.questions[question_id].get('type')
+        column = self.columns[question_id]
+        count = len(ids)
+        sizes = [len(answer_ids) for _, _, answer_ids in groups]
+        answer_ids = np.concatenate([answer_ids for _, _, answer_ids in groups]) if groups else np.empty(0, np.int64)
+        # Row of each answer among the new responses. Answers of a response committed after the
+        # responses were read have no row yet: left for the rebuild that the missing response causes
+        rows = np.searchsorted(ids, answer_ids)
+        known = rows < count
+        known[known] = ids[rows[known]] == answer_ids[known]
+        rows = rows[known]
+
+        if question_type in SINGLE_CHOICE_TYPES or question_type == 'checkbox':
+            options = self.options[question_id]
+            codes = np.repeat(np.array([options.code(value) for value, _, _ in groups], dtype=np.intp),
+                              sizes)[known]
+            if question_type == 'checkbox':
+                # New options may have appeared: widen the existing matrix
+                width = len(options.labels)
+                if column.shape[1] < width:
+                    column = np.hstack([column, np.zeros((column.shape[0], width - column.shape[1]), dtype=bool)])
+                block = np.zeros((count, width), dtype=bool)
+                block[rows, codes] = True
+                return np.vstack([column, block])
+            block = np.full(count, -1, dtype=np.int32)
+            block[rows] = codes
+            return np.concatenate([column, block])
+        if question_type == 'rating':
+            block = np.full(count, np.nan, dtype=np.float64)
+            # Non-numeric ratings are stored without a numeric value (None becomes NaN): like unanswered
+            block[rows] = np.repeat(np.array([value for _, value, _ in groups], dtype=np.float64), sizes)[known]
+            return np.concatenate([column, block])
+        block = np.zeros(count, dtype=bool)
+        block[rows] = True
+        return np.concatenate([column, block])
+
+    def segment(self, company=None, date_from=None, date_to=None):
+        """Boolean mask of the responses in a segment"""
+        mask = np.ones(len(self), dtype=bool)
+        if company is not None:
+            code = self.companies.codes.get(company)
+            mask &= (self.company_codes == code) if code is not None else False
+        if date_from is not None:
+            mask &= self.submitted_at >= np.datetime64(date_from, 's')
+        if date_to is not None:
+            mask &= self.submitted_at < np.datetime64(date_to, 's')
+        return mask
+
+    def question_statistics(self, question_id, mask, percentiles=DEFAULT_PERCENTILES):
+        question = self.questions[question_id]
+        question_type = question.get('type')
+        column = self.columns[question_id][mask]
+        result = {'question': question, 'type': question_type}
+
+        if question_type in SINGLE_CHOICE_TYPES:
+            answered = column[column >= 0]
+            counts = np.bincount(answered, minlength=len(self.options[question_id].labels))
+            result['answered_count'] = int(len(answered))
+            result['option_counts'] = dict(zip(self.options[question_id].labels, counts.tolist()))
+        elif question_type == 'checkbox':
+            result['answered_count'] = int(column.any(axis=1).sum())
+            result['option_counts'] = dict(zip(self.options[question_id].labels, column.sum(axis=0).tolist()))
+        elif question_type == 'rating':
+            ratings = column[~np.isnan(column)]
+            result['answered_count'] = int(len(ratings))
+            if len(ratings):
+                values, counts = np.unique(ratings, return_counts=True)
+                result.update({
+                    'mean': float(ratings.mean()),
+                    'median': float(np.median(ratings)),
+                    'stddev': float(ratings.std()),
+                    'min': float(ratings.min()),
+                    'max': float(ratings.max()),
+                    'percentiles': {_label(p): float(v) for p, v in zip(percentiles, np.percentile(ratings, percentiles))},
+                    'rating_counts': {_label(v): int(c) for v, c in zip(values, counts)}
+                })
+        else:
+            result['answered_count'] = int(column.sum())
+
+        total = int(mask.sum())
+        result['response_rate'] = result['answered_count'] / total * 100 if total else 0
+        return result
+
+    def _indicators(self, question_id, mask):
+        """(labels, responses x categories indicator matrix) of a categorical question"""
+        question_type = self.questions[question_id].get('type')
+        column = self.columns[question_id][mask]
+        if question_type in SINGLE_CHOICE_TYPES:
+            labels = self.options[question_id].labels
+            matrix = np.zeros((len(column), len(labels)), dtype=np.int32)
+            answered = np.nonzero(column >= 0)[0]
+            matrix[answered, column[answered]] = 1
+            return labels, matrix
+        if question_type == 'checkbox':
+            return self.options[question_id].labels, column.astype(np.int32)
+        if question_type == 'rating':
+            values = np.unique(column[~np.isnan(column)])
+            matrix = (column[:, None] == values[None, :]).astype(np.int32)
+            return [_label(v) for v in values], matrix
+        raise AnalyticsError(f'Question {question_id} is not categorical and cannot be cross-tabulated')
+
+    def crosstab(self, row_question_id, column_question_id, mask):
+        """Number of responses for every pair of answers of two questions"""
+        row_labels, rows = self._indicators(row_question_id, mask)
+        column_labels, columns = self._indicators(column_question_id, mask)
+        counts = rows.T @ columns
+        return {
+            'row_question_id': row_question_id,
+            'column_question_id': column_question_id,
+            'rows': row_labels,
+            'columns': column_labels,
+            'counts': counts.tolist()
+        }
+
+def _label(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+class FrameCache:
+    """LRU of survey frames, refreshed incrementally with new responses"""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._frames = OrderedDict()
+        self._loading = {}  # {survey_id: Lock}, serializes the loads of one survey
+        self._lock = threading.Lock()
+
+    def get(self, survey):
+        stats = db.session.get(SurveyStatistics, survey.id)
+        generation = stats.generation if stats is not None else None
+        with self._lock:
+            loading = self._loading.setdefault(survey.id, threading.Lock())
+        # Loads of other surveys go on meanwhile, requests for this one wait and reuse its frame
+        with loading:
+            with self._lock:
+                frame = self._frames.get(survey.id)
+            if frame is None or frame.version != survey.updated_at or frame.generation != generation:
+                frame = SurveyFrame(survey, generation)
+                frame.load()
+            else:
+                extended = frame.copy()
+                if extended.load():
+                    frame = extended
+                # Responses counted before the load are all committed: one missing from the frame
+                # committed behind its last id and will never be appended
+                if stats is not None and len(frame) < stats.responses_count:
+                    frame = SurveyFrame(survey, generation)
+                    frame.load()
+            with self._lock:
+                self._frames[survey.id] = frame
+                self._frames.move_to_end(survey.id)
+                while len(self._frames) > self.maxsize:
+                    evicted, _ = self._frames.popitem(last=False)
+                    self._loading.pop(evicted, None)
+            return frame
+
+    def invalidate(self, survey_id=None):
+        with self._lock:
+            if survey_id is None:
+                self._frames.clear()
+            else:
+                self._frames.pop(survey_id, None)
+
+frames = FrameCache()
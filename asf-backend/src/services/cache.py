@@ -0,0 +1,131 @@
+"""Small caching layer for API payloads.
+
+MemoryCache is an in-process LRU with a TTL. Entries are only invalidated in the process that
+made the change, so with several workers the TTL bounds how stale another worker can be.
+A payload built while an invalidation happened may predate the change: it is served once but
+not stored.
+A shared store (e.g. Redis) can be plugged in by implementing CacheBackend.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections import namedtuple
+from flask import Response, current_app, request
+
+CachedPayload = namedtuple('CachedPayload', ['body', 'etag', 'last_modified'])
+
+class CacheBackend:
+    """Interface of a cache backend"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+class ResponseCache:
+    """Caches serialized JSON payloads and serves them with ETag / Last-Modified validators"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._generation = 0  # Bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when no key is given"""
+        with self._lock:
+            self._generation += 1
+        if key is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(key)
+
+    def json_response(self, key, build):
+        """Return a conditional JSON response for `key`.
+
+        `build()` returns (payload, last_modified) and is only called on a cache miss.
+        Returns None when `build()` returns a None payload (nothing to serve, not cached).
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            generation = self._generation
+            payload, last_modified = build()
+            if payload is None:
+                return None
+            body = current_app.json.dumps(payload).encode()
+            entry = CachedPayload(body, hashlib.sha1(body).hexdigest(), last_modified)
+            with self._lock:
+                if generation == self._generation:
+                    self.backend.set(key, entry)
+
+        response = Response(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        if entry.last_modified:
+            response.last_modified = entry.last_modified
+        # Clients may keep the payload but must revalidate it (cheap 304)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
@@ -0,0 +1,85 @@
+"""Negotiated response compression.
+
+Buffered text/JSON responses of at least COMPRESS_MIN_SIZE bytes are compressed with brotli
+(when the package is installed) or gzip, whichever the client accepts. Streamed responses
+(exports, event streams) are left alone. The ETag becomes weak so that conditional requests
+still match whatever encoding the client received. Each compressed response reports its
+uncompressed size in X-Uncompressed-Length and the time spent in Server-Timing.
+"""
+import gzip
+import threading
+import time
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/')
+
+class Compression:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        app.extensions['compression'] = self
+        self.app = app
+        app.after_request(self._after_request)
+
+    @property
+    def encodings(self):
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.app.config['COMPRESS_BROTLI_QUALITY'])
+        return gzip.compress(data, compresslevel=self.app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+    def _after_request(self, response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        started = time.perf_counter()
+        compressed = self.compress(data, encoding)
+        elapsed = time.perf_counter() - started
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['X-Uncompressed-Length'] = str(len(data))
+        response.headers.add('Server-Timing', f"{encoding};dur={elapsed * 1000:.2f}")
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'responses': self.responses,
+                'uncompressed_bytes': self.bytes_in,
+                'compressed_bytes': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None
+            }
+
+compression = Compression()
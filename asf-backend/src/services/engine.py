@@ -0,0 +1,50 @@
+"""Database engine tuning for concurrent serving.
+
+SQLite connections are switched to WAL journaling (readers don't block the writer),
+wait for locks instead of failing with "database is locked", and use synchronous=NORMAL,
+which is safe with WAL. Their lower() folds all of Unicode like Python and Postgres, not only
+ASCII ('Émile' matches a search for 'é'). Other databases (Postgres) get a tunable connection pool.
+All settings can be overridden with environment variables.
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS suited to the database behind `database_uri`"""
+    if make_url(database_uri).get_backend_name() == 'sqlite':
+        # The driver-level timeout is in seconds and applies before the busy_timeout pragma is set
+        return {'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+                                 'check_same_thread': False}}
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True
+    }
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+def install_sqlite_pragmas(engine):
+    """Set the WAL / busy_timeout / synchronous pragmas and lower() on every new SQLite connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    synchronous = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    busy_timeout = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.close()
+        # Replaces the ASCII-only built-in; deterministic, so the lower(...) indexes can use it
+        dbapi_connection.create_function('lower', 1, _lower, deterministic=True)
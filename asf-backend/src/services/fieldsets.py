@@ -0,0 +1,110 @@
+"""Sparse fieldsets for list endpoints: ?fields= and ?expand=.
+
+    fields=id,title,author   serialize only these fields, and only load their columns
+    expand=author            embed the full related object instead of its summary
+
+Without fields= a resource's compact default applies. A relation listed in fields is embedded
+as a summary (e.g. an author's id and username) through one narrow join; relations that are
+neither listed nor expanded are not joined at all.
+"""
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only
+
+Selection = namedtuple('Selection', ['fields', 'expand'])
+
+Relation = namedtuple('Relation', ['attribute', 'fieldset', 'summary'])
+
+Computed = namedtuple('Computed', ['compute', 'requires'])
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+class Fieldset:
+    """Selectable fields of a model.
+
+    `computed` maps extra field names to Computed(compute, requires): `compute(obj)` builds the
+    value from the columns named in `requires`, or is None when the route supplies the value
+    (such fields are left out of the resource when it is expanded inside another one).
+    `relations` maps names to Relation(relationship attribute, related Fieldset, summary fields).
+    """
+
+    def __init__(self, model, default, computed=None, relations=None, hidden=()):
+        mapper = inspect(model)
+        self.model = model
+        self.columns = {attr.key: getattr(model, attr.key)
+                        for attr in mapper.column_attrs if attr.key not in hidden}
+        self.computed = computed or {}
+        self.relations = relations or {}
+        self.default = tuple(default)
+        self.primary_key = [getattr(model, attr.key) for attr in mapper.column_attrs
+                            if any(column.primary_key for column in attr.columns)]
+
+    def parse(self, args, extra_expand=()):
+        """Selection from request arguments; raises ValueError naming unknown fields"""
+        fields = _split(args.get('fields')) or list(self.default)
+        expand = _split(args.get('expand'))
+        unknown = [name for name in fields
+                   if name not in self.columns and name not in self.computed and name not in self.relations]
+        unknown += [name for name in expand if name not in self.relations and name not in extra_expand]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        # Expanding a relation implies including it
+        fields += [name for name in expand if name in self.relations and name not in fields]
+        return Selection(tuple(dict.fromkeys(fields)), frozenset(expand))
+
+    def _related_selection(self, selection, name):
+        relation = self.relations[name]
+        if name in selection.expand:
+            fieldset = relation.fieldset
+            # Values supplied by the related resource's own route can't be embedded
+            fields = [field for field in fieldset.default
+                      if field not in fieldset.computed or fieldset.computed[field].compute is not None]
+        else:
+            fields = relation.summary
+        return Selection(tuple(fields), frozenset())
+
+    def options(self, selection, always=(), relation_loader=joinedload):
+        """Loader options selecting only the columns `selection` needs (plus `always`).
+
+        Relations are joined by default; pass relation_loader=selectinload to load them in one
+        batched query instead (better when many rows share few related objects).
+        """
+        columns = list(self.primary_key) + list(always)
+        for name in selection.fields:
+            if name in self.columns:
+                columns.append(self.columns[name])
+            elif name in self.computed:
+                columns.extend(self.columns[required] for required in self.computed[name].requires)
+        for name, relation in self.relations.items():
+            if name in selection.fields:
+                # The foreign key, so that a separate (select-in) load can match related rows
+                columns.extend(getattr(self.model, column.key) for column in relation.attribute.property.local_columns)
+        options = [load_only(*dict.fromkeys(columns))]
+        for name, relation in self.relations.items():
+            if name in selection.fields:
+                related = self._related_selection(selection, name)
+                options.append(relation_loader(relation.attribute).options(
+                    *relation.fieldset.options(related)))
+        return options
+
+    def serialize(self, obj, selection, **values):
+        """Dict of the selected fields; `values` supplies computed fields the route calculated"""
+        data = {}
+        for name in selection.fields:
+            if name in self.relations:
+                relation = self.relations[name]
+                related = getattr(obj, relation.attribute.key)
+                data[name] = None if related is None else \
+                    relation.fieldset.serialize(related, self._related_selection(selection, name))
+            elif name in self.columns:
+                value = getattr(obj, name)
+                data[name] = value.isoformat() if isinstance(value, datetime) else value
+            elif name in values:
+                data[name] = values[name]
+            elif self.computed[name].compute is not None:
+                data[name] = self.computed[name].compute(obj)
+            else:
+                data[name] = None
+        return data
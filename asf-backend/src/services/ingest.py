@@ -0,0 +1,294 @@
+"""Batched ingestion of survey submissions.
+
+In 'batched' mode a submission is acknowledged as soon as it is written to a spill file and
+queued; a background writer inserts queued submissions in group commits of up to
+SURVEY_INGEST_BATCH_SIZE rows, or after SURVEY_INGEST_FLUSH_MS milliseconds. A submission that
+cannot be spilled (e.g. disk full) is written synchronously instead.
+
+The spill file is only truncated once everything it holds has been committed. On startup,
+spill files left by dead processes are replayed; each submission carries a unique
+submission_id, so rows that were already committed are skipped.
+
+A batch that still fails after SURVEY_INGEST_MAX_RETRIES attempts is written record by
+record, so one poison record (e.g. a constraint violation) cannot hold back the others:
+records that fail on their own, and records whose survey was deleted in the meantime, are
+appended to the dead-letter file (SURVEY_INGEST_DEAD_LETTER), logged and counted. Renaming that file to ingest-<n>.jsonl in
+the spill directory replays it on the next start.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from src.models.user import Survey, SurveyResponse, db
+from src.services.live_stats import live_stats
+from src.services.survey_answers import build_answers
+from src.services.survey_stats import record_response
+
+try:
+    import fcntl
+except ImportError:  # Windows: spill files of other processes are not replayed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class SubmissionIngestor:
+    """Queues survey submissions and writes them in group commits from a background thread"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SURVEY_INGEST_MODE', 'sync')
+        app.config.setdefault('SURVEY_INGEST_BATCH_SIZE', 200)
+        app.config.setdefault('SURVEY_INGEST_FLUSH_MS', 50)
+        app.config.setdefault('SURVEY_INGEST_SPILL_DIR', os.path.join(app.root_path, 'database', 'spill'))
+        app.config.setdefault('SURVEY_INGEST_FSYNC', True)
+        app.config.setdefault('SURVEY_INGEST_MAX_RETRIES', 3)
+        app.config.setdefault('SURVEY_INGEST_DEAD_LETTER',
+                              os.path.join(app.config['SURVEY_INGEST_SPILL_DIR'], 'dead-letter.jsonl'))
+        app.extensions['survey_ingest'] = self
+        self.app = app
+
+        self.batch_size = app.config['SURVEY_INGEST_BATCH_SIZE']
+        self.flush_interval = app.config['SURVEY_INGEST_FLUSH_MS'] / 1000
+        self.fsync = app.config['SURVEY_INGEST_FSYNC']
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._unwritten = 0  # Acknowledged and not committed yet
+        self._stopping = threading.Event()
+        self._thread = None
+        self._spill = None
+        self._spill_pid = None
+        self._atexit = False
+        self.dead_letters = 0
+
+        if self.enabled:
+            os.makedirs(app.config['SURVEY_INGEST_SPILL_DIR'], exist_ok=True)
+            with app.app_context():
+                self.replay_spill_files()
+
+    @property
+    def enabled(self):
+        return self.app.config['SURVEY_INGEST_MODE'] == 'batched'
+
+    def _close_spill(self):
+        if self._spill is not None:
+            try:
+                self._spill.close()
+            except OSError:
+                pass
+            self._spill = None
+
+    def _open_spill(self):
+        """Open and lock the spill file of this process, once (again in a forked worker)"""
+        self._close_spill()
+        directory = self.app.config['SURVEY_INGEST_SPILL_DIR']
+        os.makedirs(directory, exist_ok=True)
+        spill = open(os.path.join(directory, f'ingest-{os.getpid()}.jsonl'), 'a+', encoding='utf-8')
+        if fcntl is not None:
+            # Held for the lifetime of the process: a lockable spill file belongs to a dead process.
+            # Raises while another worker replays a file left by a dead process with the same pid
+            try:
+                fcntl.flock(spill.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                spill.close()
+                raise
+        self._spill = spill
+        self._spill_pid = os.getpid()
+
+    def _start(self):
+        """Start the writer thread (lazily, so forked workers each get their own)"""
+        if self._spill is None or self._spill_pid != os.getpid():
+            self._open_spill()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='survey-ingest', daemon=True)
+            self._thread.start()
+        if not self._atexit:
+            self._atexit = True
+            atexit.register(self.stop)
+
+    def submit(self, survey_id, user_id, responses, ip_address):
+        """Durably queue a submission and return its acknowledgement id.
+
+        Returns None when it could not be spilled (e.g. disk full): the caller writes it itself.
+        """
+        record = {
+            'submission_id': uuid.uuid4().hex,
+            'survey_id': survey_id,
+            'user_id': user_id,
+            'responses': responses,
+            'ip_address': ip_address,
+            'submitted_at': datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            try:
+                self._start()
+                self._spill.write(json.dumps(record) + '\n')
+                self._spill.flush()
+                if self.fsync:
+                    os.fsync(self._spill.fileno())
+            except OSError:
+                logger.exception('Survey submission could not be spilled, writing it synchronously')
+                # Reopened by the next submission; a torn line left behind is skipped on replay
+                self._close_spill()
+                return None
+            self._unwritten += 1
+            self._queue.put(record)
+        return record['submission_id']
+
+    def _next_batch(self):
+        """Wait for a first record, then collect up to batch_size records or until the flush interval"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    self.write_records(batch)
+                except Exception:
+                    # e.g. the dead-letter file cannot be written: the thread carries on and the
+                    # batch is retried, its committed records are skipped by submission_id
+                    logger.exception('Survey ingestion writer failed on a batch of %d', len(batch))
+                    db.session.rollback()
+                    for record in batch:
+                        self._queue.put(record)
+                    time.sleep(1)
+                    continue
+                finally:
+                    db.session.remove()
+                with self._lock:
+                    self._unwritten -= len(batch)
+                    if not self._unwritten and self._spill is not None:
+                        # Everything acknowledged so far is committed
+                        self._spill.truncate(0)
+
+    def write_records(self, records):
+        """Write records in one batch, or one by one if the batch keeps failing; returns rows written"""
+        attempts = self.app.config['SURVEY_INGEST_MAX_RETRIES']
+        for attempt in range(1, attempts + 1):
+            try:
+                return self.write_batch(records)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Survey ingestion batch of %d failed (attempt %d/%d)', len(records), attempt, attempts)
+                if attempt < attempts:
+                    time.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+
+        written = 0
+        for record in records:
+            try:
+                written += self.write_batch([record])
+            except Exception as e:
+                db.session.rollback()
+                self.dead_letter(record, e)
+        return written
+
+    def dead_letter(self, record, error):
+        """Set aside a submission that cannot be written"""
+        logger.error('Survey submission %s dead-lettered: %s', record.get('submission_id'), error)
+        path = self.app.config['SURVEY_INGEST_DEAD_LETTER']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(record, error=str(error))) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        with self._lock:
+            self.dead_letters += 1
+
+    def write_batch(self, records):
+        """Insert a batch of submissions and update the survey aggregates in one transaction"""
+        submission_ids = [r['submission_id'] for r in records]
+        committed = {sid for (sid,) in db.session.query(SurveyResponse.submission_id)
+                                                 .filter(SurveyResponse.submission_id.in_(submission_ids))}
+        surveys = {s.id: s for s in Survey.query.filter(Survey.id.in_({r['survey_id'] for r in records}))}
+
+        written = 0
+        orphans = []
+        for record in records:
+            if record['submission_id'] in committed:
+                continue
+            survey = surveys.get(record['survey_id'])
+            if survey is None:
+                orphans.append(record)
+                continue
+            db.session.add(SurveyResponse(
+                survey_id=record['survey_id'],
+                user_id=record['user_id'],
+                responses_json=json.dumps(record['responses']),
+                ip_address=record['ip_address'],
+                submitted_at=datetime.fromisoformat(record['submitted_at']),
+                submission_id=record['submission_id'],
+                answers=build_answers(survey, record['responses'])
+            ))
+            record_response(survey, record['responses'])
+            written += 1
+        db.session.commit()
+        # Set aside once the batch is committed, so a retried batch doesn't set them aside twice
+        for record in orphans:
+            self.dead_letter(record, f"Survey {record['survey_id']} no longer exists")
+        if written:
+            live_stats.notify()
+        return written
+
+    def replay_spill_files(self):
+        """Commit the submissions left in spill files by processes that died"""
+        if fcntl is None:
+            return 0
+        replayed = 0
+        pattern = os.path.join(self.app.config['SURVEY_INGEST_SPILL_DIR'], 'ingest-*.jsonl')
+        for path in glob.glob(pattern):
+            with open(path, 'r+', encoding='utf-8') as spill:
+                try:
+                    fcntl.flock(spill.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Owned by a live process
+                records = []
+                for line in spill:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # Torn line of a failed or interrupted write: never acknowledged
+                for start in range(0, len(records), self.batch_size):
+                    replayed += self.write_records(records[start:start + self.batch_size])
+                os.remove(path)
+        if replayed:
+            logger.info('Replayed %d spilled survey submissions', replayed)
+        return replayed
+
+    def stop(self, timeout=10):
+        """Flush the queue and stop the writer thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def pending(self):
+        """Number of acknowledged submissions not committed yet"""
+        with self._lock:
+            return self._unwritten
+
+ingestor = SubmissionIngestor()
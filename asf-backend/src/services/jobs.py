@@ -0,0 +1,320 @@
+"""In-process background jobs for heavy admin operations.
+
+Jobs are rows of the job table, so their state survives restarts and is visible from every
+worker process; no broker is involved. Each process runs a dispatcher thread that claims
+queued jobs and hands them to a pool of JOB_WORKERS threads. A claim is a single UPDATE that
+also checks how many jobs are running, so at most JOB_WORKERS jobs run at once across all
+processes; the others wait in the table until a slot frees up.
+
+Tasks are registered by name:
+
+    @jobs.task('rebuild-stats', validate=parse_params)
+    def rebuild_stats(job, survey_id=None):
+        ...
+        job.progress(done, total)   # saved for the status endpoint; raises JobCancelled
+        return {'surveys': total}   # kept as the job's result
+
+Running jobs report a heartbeat from a side thread of whichever process runs them; a job whose process died is marked failed after
+JOB_STALE_SECONDS, or queued again if its task is registered as resumable (idempotent, like
+the purges of purge.py). Finished jobs and their result files are deleted after
+JOB_RETENTION_HOURS. `flask --app src.main run-jobs` runs the queued jobs in the foreground.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, select, update
+from src.models.user import Job, db
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', ['function', 'validate', 'resumable'])
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+class JobQueueFull(Exception):
+    """Too many jobs are waiting to run"""
+
+class JobCancelled(Exception):
+    """Raised inside a task when an admin cancelled its job"""
+
+class JobContext:
+    """Handle passed to a task to report progress and produce a result file"""
+
+    def __init__(self, runner, job):
+        self.id = job.id
+        self.params = json.loads(job.params_json or '{}')
+        self._runner = runner
+        self.result_file = None
+
+    def progress(self, done, total=None, message=None):
+        """Save progress (and the heartbeat) and raise JobCancelled if cancellation was requested.
+
+        Written on its own short transaction: with SQLite, call it between units of work that
+        have been committed, not while the task's session holds uncommitted writes.
+        """
+        values = {'done': done, 'updated_at': datetime.utcnow()}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:200]
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == self.id).values(**values))
+            cancelled = connection.execute(select(Job.cancel_requested).where(Job.id == self.id)).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+    def open_result(self, filename, mimetype):
+        """Open the file the job produces as its result; downloaded as `filename`"""
+        path = os.path.join(self._runner.app.config['JOB_RESULT_DIR'], f'job-{self.id}-{filename}')
+        self.result_file = (path, filename, mimetype)
+        return open(path, 'w', encoding='utf-8', newline='')
+
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = set()  # Ids of the jobs running in this process
+        self._executor = None
+        self._thread = None
+        self._started = False
+        self._last_cleanup = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_MAX_QUEUED', 50)
+        app.config.setdefault('JOB_POLL_SECONDS', 2)
+        app.config.setdefault('JOB_STALE_SECONDS', 60)
+        app.config.setdefault('JOB_RETENTION_HOURS', 24)
+        app.config.setdefault('JOB_RESULT_DIR', os.path.join(app.root_path, 'database', 'jobs'))
+        app.config.setdefault('JOB_DISPATCH', True)
+        app.extensions['jobs'] = self
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+        # Jobs queued before a restart are picked up with the first request
+        if app.config['JOB_DISPATCH']:
+            app.before_request(self._start_once)
+
+    def running(self):
+        """Number of jobs running in this process"""
+        with self._lock:
+            return len(self._running)
+
+    def task(self, kind, validate=None, resumable=False):
+        """Register a task; `validate(params)` returns cleaned parameters or raises ValueError.
+
+        A resumable task can be run again after an interruption and carry on where it stopped.
+        """
+        def register(function):
+            self.tasks[kind] = Task(function, validate, resumable)
+            return function
+        return register
+
+    def start(self, kind, params=None, user_id=None):
+        """Queue a job and return it; raises ValueError for bad input and JobQueueFull"""
+        if kind not in self.tasks:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of: {', '.join(sorted(self.tasks))}")
+        params = params or {}
+        if not isinstance(params, dict):
+            raise ValueError('params must be an object')
+        validate = self.tasks[kind].validate
+        if validate is not None:
+            params = validate(params)
+        queued = db.session.execute(select(func.count()).select_from(Job).where(Job.status == 'queued')).scalar()
+        if queued >= self.app.config['JOB_MAX_QUEUED']:
+            raise JobQueueFull()
+
+        job = Job(kind=kind, params_json=json.dumps(params), created_by=user_id)
+        db.session.add(job)
+        db.session.commit()
+        self._start()
+        self._wake.set()
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued job now, or ask a running one to stop at its next progress report"""
+        if job.status == 'queued':
+            cancelled = db.session.execute(update(Job).where(Job.id == job.id, Job.status == 'queued').values(
+                status='cancelled', finished_at=datetime.utcnow())).rowcount
+            db.session.commit()
+            if cancelled:
+                return job
+        # Reloaded after the commit: it may have been claimed in the meantime
+        if job.status == 'running':
+            job.cancel_requested = True
+            db.session.commit()
+        return job
+
+    def _start_once(self):
+        if not self._started:
+            self._started = True
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                os.makedirs(self.app.config['JOB_RESULT_DIR'], exist_ok=True)
+                self._thread = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+                self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    self.fail_stale()
+                    self.dispatch()
+                    if time.monotonic() - self._last_cleanup > 600:
+                        self._last_cleanup = time.monotonic()
+                        self.cleanup()
+                except Exception:
+                    logger.exception('Job dispatcher failed')
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.app.config['JOB_POLL_SECONDS'])
+            self._wake.clear()
+
+    @contextmanager
+    def _heartbeat(self, job_id):
+        """Keep the job's updated_at fresh while the block runs, also in `flask run-jobs`"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.app.config['JOB_POLL_SECONDS']):
+                try:
+                    with self.app.app_context(), db.engine.begin() as connection:
+                        connection.execute(update(Job).where(Job.id == job_id, Job.status == 'running')
+                                           .values(updated_at=datetime.utcnow()))
+                except Exception:
+                    # e.g. SQLite busy while the task writes; the next beat retries
+                    logger.exception('Heartbeat of job %s failed', job_id)
+
+        thread = threading.Thread(target=beat, name=f'job-{job_id}-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def fail_stale(self):
+        """Handle the running jobs whose process stopped sending heartbeats: resumable ones are
+        queued again, the others marked failed. Returns the number of failed jobs."""
+        stale = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_STALE_SECONDS'])
+        interrupted = and_(Job.status == 'running', Job.updated_at < stale)
+        resumable = [kind for kind, task in self.tasks.items() if task.resumable]
+        if resumable:
+            db.session.execute(update(Job).where(interrupted, Job.kind.in_(resumable)).values(
+                status='queued', updated_at=datetime.utcnow()))
+        failed = db.session.execute(update(Job).where(interrupted).values(
+            status='failed', error='Interrupted: the worker running this job stopped',
+            finished_at=datetime.utcnow())).rowcount
+        db.session.commit()
+        return failed
+
+    def claim(self, job_id):
+        """Mark a queued job running if fewer than JOB_WORKERS jobs run in all processes"""
+        running = select(func.count()).select_from(Job).where(Job.status == 'running').scalar_subquery()
+        now = datetime.utcnow()
+        # Atomic: the job is still queued and there is a free slot
+        claimed = db.session.execute(update(Job).where(
+            Job.id == job_id, Job.status == 'queued', running < self.app.config['JOB_WORKERS']
+        ).values(status='running', started_at=now, updated_at=now)).rowcount
+        db.session.commit()
+        return bool(claimed)
+
+    def dispatch(self):
+        """Claim queued jobs for the free threads of this process; returns the number started"""
+        limit = self.app.config['JOB_WORKERS']
+        with self._lock:
+            free = limit - len(self._running)
+        started = 0
+        if free <= 0:
+            return started
+        queued = db.session.execute(select(Job.id).where(Job.status == 'queued')
+                                    .order_by(Job.id).limit(free)).scalars().all()
+        for job_id in queued:
+            if not self.claim(job_id):
+                break
+            with self._lock:
+                self._running.add(job_id)
+            self._executor.submit(self._execute, job_id)
+            started += 1
+        return started
+
+    def run_pending(self):
+        """Run the queued jobs in the foreground, oldest first, until none is left; returns them"""
+        self.fail_stale()
+        finished = []
+        while True:
+            job_id = db.session.execute(select(Job.id).where(Job.status == 'queued')
+                                        .order_by(Job.id).limit(1)).scalar()
+            # Stop when another process claimed it first or every slot is taken
+            if job_id is None or not self.claim(job_id):
+                return finished
+            finished.append(self.run(job_id))
+
+    def _execute(self, job_id):
+        with self.app.app_context():
+            try:
+                self.run(job_id)
+            except Exception:
+                logger.exception('Job %s could not be recorded', job_id)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._running.discard(job_id)
+                self._wake.set()
+
+    def run(self, job_id):
+        """Run a claimed job to completion and record its outcome"""
+        job = db.session.get(Job, job_id)
+        context = JobContext(self, job)
+        status, result, error = 'succeeded', None, None
+        try:
+            with self._heartbeat(job_id):
+                result = self.tasks[job.kind].function(context, **context.params)
+            db.session.commit()
+        except JobCancelled:
+            db.session.rollback()
+            status = 'cancelled'
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Job %s (%s) failed', job_id, job.kind)
+            status, error = 'failed', str(e)
+
+        job = db.session.get(Job, job_id)
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        if status == 'succeeded':
+            if job.total is not None:
+                job.done = job.total
+            job.result_json = json.dumps(result) if result is not None else None
+            if context.result_file is not None:
+                job.result_path, job.result_name, job.result_mimetype = context.result_file
+        elif context.result_file is not None and os.path.exists(context.result_file[0]):
+            os.remove(context.result_file[0])
+        db.session.commit()
+        return job
+
+    def cleanup(self):
+        """Delete the jobs finished more than JOB_RETENTION_HOURS ago, with their result files"""
+        expired = datetime.utcnow() - timedelta(hours=self.app.config['JOB_RETENTION_HOURS'])
+        jobs = Job.query.filter(Job.status.in_(FINISHED), Job.finished_at < expired).all()
+        for job in jobs:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(jobs)
+
+jobs = JobRunner()
@@ -0,0 +1,262 @@
+"""Live survey statistics pushed to admins as Server-Sent Events.
+
+One hub thread per process watches the surveys that have subscribers. Each tick it reads the
+aggregate rows of a watched survey once (a single primary-key lookup when nothing changed),
+diffs them against the previous snapshot, and hands the same delta to every subscriber:
+
+    event: stats
+    id: 305
+    data: {"previous_total": 300, "total_responses": 305, "completion_percentage": 71.4,
+           "questions": {"question_0": {"answered_count": 5, "option_counts": {"Oui": 3, "Non": 2}}}, ...}
+
+Ticks happen every SURVEY_STREAM_POLL_MS, or right away after a submission committed by this
+process, so responses written by other workers or by the batched ingestor are picked up too.
+A `sync` event tells a new subscriber the current total, and a `reset` event (aggregates
+rebuilt, which moves their generation; survey deleted; subscriber fell behind) asks it to reload the full statistics.
+
+Streams only wait on their subscription queue: they hold no application context and no
+database connection, but a connection stays open for as long as the page does. They are
+therefore only served by cooperative workers (gunicorn's gevent worker, see
+gunicorn_stream.conf.py), where an open stream costs a greenlet rather than one of the few
+threads of a gthread worker. Elsewhere, and above SURVEY_STREAM_MAX_CLIENTS streams per
+process, the client gets a single `fallback` event and polls the statistics every
+SURVEY_STREAM_FALLBACK_POLL_SECONDS instead:
+
+    event: fallback
+    data: {"reason": "busy", "poll_seconds": 30}
+
+Streams close after SURVEY_STREAM_MAX_SECONDS; EventSource reconnects by itself.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from src.models.user import Survey, SurveyQuestionStatistics, SurveyStatistics, db
+from src.services.survey_schema import compile_survey
+from src.services.survey_stats import COUNTED_TYPES, rating_counts
+
+logger = logging.getLogger(__name__)
+
+class StreamLimitReached(Exception):
+    """Too many statistics streams are open in this process"""
+
+def cooperative():
+    """Whether this process serves requests on greenlets (gevent monkey-patched the socket module)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+class Subscription:
+    def __init__(self, survey_id, maxsize=100):
+        self.survey_id = survey_id
+        self.events = queue.Queue(maxsize)
+
+    def put(self, name, data):
+        try:
+            self.events.put_nowait((name, data))
+        except queue.Full:
+            # Fallen behind: drop the backlog, the client reloads everything instead
+            with self.events.mutex:
+                self.events.queue.clear()
+            self.events.put_nowait(('reset', {'reason': 'overflow'}))
+
+class Snapshot:
+    """Aggregates of a survey as last sent to its subscribers"""
+
+    def __init__(self, total, generation, rows):
+        self.total = total
+        self.generation = generation  # Moved by every rebuild: the rows may be keyed differently
+        self.rows = rows  # {question_id: (answered_count, value_counts_json)}
+
+def _format(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+class LiveStatsHub:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._subscribers = {}  # {survey_id: set of Subscription}
+        self._snapshots = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SURVEY_STREAM_POLL_MS', 1000)
+        app.config.setdefault('SURVEY_STREAM_HEARTBEAT_SECONDS', 15)
+        app.config.setdefault('SURVEY_STREAM_MAX_SECONDS', 300)
+        app.config.setdefault('SURVEY_STREAM_MAX_CLIENTS', 500)
+        app.config.setdefault('SURVEY_STREAM_FALLBACK_POLL_SECONDS', 30)
+        # Thread-based servers refuse streams; False only for the development server
+        app.config.setdefault('SURVEY_STREAM_ASYNC_ONLY', True)
+        app.extensions['live_stats'] = self
+        self.app = app
+
+    def available(self):
+        """Whether this process may hold streams open"""
+        return cooperative() or not self.app.config['SURVEY_STREAM_ASYNC_ONLY']
+
+    def clients(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribe(self, survey_id):
+        """Register a subscriber of a survey; raises StreamLimitReached when the process is full"""
+        subscription = Subscription(survey_id)
+        with self._lock:
+            if sum(len(s) for s in self._subscribers.values()) >= self.app.config['SURVEY_STREAM_MAX_CLIENTS']:
+                raise StreamLimitReached()
+            self._subscribers.setdefault(survey_id, set()).add(subscription)
+            snapshot = self._snapshots.get(survey_id)
+            if snapshot is not None:
+                subscription.put('sync', {'total_responses': snapshot.total})
+            # Otherwise the next tick takes the first snapshot and sends it
+        self._start()
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.survey_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.survey_id]
+                    self._snapshots.pop(subscription.survey_id, None)
+
+    def notify(self, survey_id=None):
+        """Wake the hub after a commit that changed survey aggregates (cheap when nobody watches)"""
+        if self._subscribers and (survey_id is None or survey_id in self._subscribers):
+            self._wake.set()
+
+    def stream(self, subscription):
+        """Server-Sent Events of a subscription; to be returned as the response body"""
+        heartbeat = self.app.config['SURVEY_STREAM_HEARTBEAT_SECONDS']
+        deadline = time.monotonic() + self.app.config['SURVEY_STREAM_MAX_SECONDS']
+        try:
+            # Reconnect quickly when the server closes the stream
+            yield 'retry: 1000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    name, data = subscription.events.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    # Comment line: keeps proxies from closing the connection, detects gone clients
+                    yield ': keep-alive\n\n'
+                    continue
+                yield _format(name, data, data.get('total_responses'))
+        finally:
+            self.unsubscribe(subscription)
+
+    def fallback(self, reason):
+        """Body of a stream that is not served: tells the client to poll the statistics instead"""
+        poll_seconds = self.app.config['SURVEY_STREAM_FALLBACK_POLL_SECONDS']
+        # Clients ignoring the event reconnect no sooner than they would poll
+        return f"retry: {poll_seconds * 1000}\n\n" + _format('fallback', {'reason': reason, 'poll_seconds': poll_seconds})
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-stats', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        poll = self.app.config['SURVEY_STREAM_POLL_MS'] / 1000
+        while True:
+            self._wake.wait(poll)
+            self._wake.clear()
+            with self._lock:
+                survey_ids = list(self._subscribers)
+            if not survey_ids:
+                continue
+            with self.app.app_context():
+                try:
+                    for survey_id in survey_ids:
+                        self.tick(survey_id)
+                except Exception:
+                    logger.exception('Live statistics update failed')
+                finally:
+                    db.session.remove()
+
+    def tick(self, survey_id):
+        """Diff a survey's aggregates against its snapshot and send the delta to its subscribers"""
+        stats = db.session.get(SurveyStatistics, survey_id)
+        total = stats.responses_count if stats is not None else 0
+        generation = stats.generation if stats is not None else None
+        with self._lock:
+            snapshot = self._snapshots.get(survey_id)
+        if snapshot is not None and snapshot.total == total and snapshot.generation == generation:
+            return
+
+        rows = {row.question_id: (row.answered_count, row.value_counts_json)
+                for row in SurveyQuestionStatistics.query.filter_by(survey_id=survey_id)}
+        current = Snapshot(total, generation, rows)
+        survey = db.session.get(Survey, survey_id)
+        if survey is None:
+            self._broadcast(survey_id, 'reset', {'reason': 'deleted'}, current)
+            return
+        if snapshot is None:
+            self._broadcast(survey_id, 'sync', {'total_responses': total}, current)
+            return
+        if generation != snapshot.generation or total < snapshot.total:
+            # The aggregates were rebuilt (questions changed, responses removed): no delta applies
+            self._broadcast(survey_id, 'reset', {'reason': 'rebuilt'}, current)
+            return
+        self._broadcast(survey_id, 'stats', self.delta(survey, snapshot, total, rows), current)
+
+    @staticmethod
+    def delta(survey, snapshot, total, rows):
+        """Increments between two snapshots, keyed like the statistics payload (question_<index>)"""
+        schema = compile_survey(survey)
+        questions = {}
+        total_answered = 0
+        for item in schema.items:
+            answered, value_counts_json = rows.get(item.key, (0, '{}'))
+            total_answered += answered
+            previous_answered, previous_json = snapshot.rows.get(item.key, (0, '{}'))
+            if answered == previous_answered:
+                continue
+            change = {'answered_count': answered - previous_answered}
+            if item.type in COUNTED_TYPES:
+                counts = json.loads(value_counts_json)
+                previous = json.loads(previous_json)
+                if item.type == 'rating':
+                    counts, previous = rating_counts(counts), rating_counts(previous)
+                increments = {value: count - previous.get(value, 0)
+                              for value, count in counts.items() if count != previous.get(value, 0)}
+                change['rating_counts' if item.type == 'rating' else 'option_counts'] = increments
+            questions[f"question_{item.index}"] = change
+
+        total_possible = total * len(schema.items)
+        return {
+            'survey_id': survey.id,
+            'previous_total': snapshot.total,
+            'total_responses': total,
+            'new_responses': total - snapshot.total,
+            'total_answered_questions': total_answered,
+            'total_possible_answers': total_possible,
+            'completion_percentage': round(total_answered / total_possible * 100, 2) if total_possible else 0,
+            'questions': questions
+        }
+
+    def _broadcast(self, survey_id, name, data, snapshot):
+        with self._lock:
+            subscriptions = self._subscribers.get(survey_id)
+            if not subscriptions:
+                return
+            if snapshot is not None:
+                self._snapshots[survey_id] = snapshot
+            for subscription in subscriptions:
+                subscription.put(name, data)
+
+live_stats = LiveStatsHub()
@@ -0,0 +1,168 @@
+"""Request instrumentation exposed in the Prometheus text format.
+
+For each endpoint this records request latency, SQL query count and time (from SQLAlchemy
+engine events) and response size, plus connection pool and cache gauges. With
+METRICS_SLOW_REQUEST_MS set, requests slower than that are logged with the SQL statements
+they issued, which makes N+1 query patterns visible in production.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Histogram:
+    """Cumulative histogram per label set"""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+class Metrics:
+    """Flask extension collecting per-endpoint metrics"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._gauges = []
+        label_names = ('blueprint', 'endpoint', 'method')
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency', LATENCY_BUCKETS, label_names)
+        self.queries = Histogram('http_request_sql_queries', 'SQL queries per request', QUERY_BUCKETS, label_names)
+        self.sql_time = Histogram('http_request_sql_duration_seconds', 'SQL time per request', LATENCY_BUCKETS, label_names)
+        self.size = Histogram('http_response_size_bytes', 'Response body size', SIZE_BUCKETS, label_names)
+        self.responses = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, engine=None):
+        app.config.setdefault('METRICS_SLOW_REQUEST_MS', None)
+        app.extensions['metrics'] = self
+        self.app = app
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if engine is not None:
+            self.instrument_engine(engine)
+
+    def register_gauge(self, name, help_text, collect):
+        """Add a gauge whose value(s) come from `collect()`: a number or a {label value: number} dict.
+
+        Registering a name again replaces the previous gauge (e.g. when another app is created).
+        """
+        self._gauges = [gauge for gauge in self._gauges if gauge[0] != name]
+        self._gauges.append((name, help_text, collect))
+
+    def instrument_engine(self, engine):
+        """Count and time the SQL statements issued while handling a request"""
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info['query_start'].pop()
+            if has_request_context() and 'metrics_start' in g:
+                g.metrics_queries += 1
+                g.metrics_sql_time += elapsed
+                if g.metrics_statements is not None:
+                    g.metrics_statements.append((elapsed, statement))
+
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            self.register_gauge('db_pool_checked_out', 'Connections currently checked out', pool.checkedout)
+        if hasattr(pool, 'size'):
+            self.register_gauge('db_pool_size', 'Configured pool size', pool.size)
+        if hasattr(pool, 'overflow'):
+            self.register_gauge('db_pool_overflow', 'Connections above the pool size', pool.overflow)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_statements = [] if self.app.config['METRICS_SLOW_REQUEST_MS'] else None
+
+    def _after_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or 'unmatched'
+        labels = (request.blueprint or '', endpoint, request.method)
+        size = None if response.is_streamed else response.calculate_content_length()
+
+        with self._lock:
+            self.latency.observe(labels, elapsed)
+            self.queries.observe(labels, g.metrics_queries)
+            self.sql_time.observe(labels, g.metrics_sql_time)
+            if size is not None:
+                self.size.observe(labels, size)
+            key = labels + (str(response.status_code),)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+        slow_ms = self.app.config['METRICS_SLOW_REQUEST_MS']
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            statements = '\n'.join(f'  {duration * 1000:.1f} ms  {statement}'
+                                   for duration, statement in g.metrics_statements)
+            logger.warning('Slow request %s %s: %.1f ms, %d queries (%.1f ms SQL)\n%s',
+                           request.method, request.path, elapsed * 1000, g.metrics_queries,
+                           g.metrics_sql_time * 1000, statements)
+        return response
+
+    def render(self):
+        """Current metrics in the Prometheus text exposition format"""
+        lines = ['# HELP http_responses_total Responses by status code', '# TYPE http_responses_total counter']
+        with self._lock:
+            for key, count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{_labels(("blueprint", "endpoint", "method", "status"), key)} {count}')
+            for histogram in (self.latency, self.queries, self.sql_time, self.size):
+                lines.extend(histogram.render())
+        for name, help_text, collect in self._gauges:
+            value = collect()
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge'])
+            if isinstance(value, dict):
+                for label, label_value in sorted(value.items()):
+                    lines.append(f'{name}{{name="{_escape(label)}"}} {label_value}')
+            else:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+metrics = Metrics()
@@ -0,0 +1,133 @@
+"""Versioned schema migrations for existing databases.
+
+db.create_all() only creates missing tables: it never adds indexes or columns to a table
+that already exists. Each migration below brings an older database up to the current models
+and is recorded in the schema_migration table, so it runs once per database.
+New databases get the same schema from db.create_all(), so every step must be idempotent.
+db.create_all() runs first (`init-db` and `migrate` both do it): migrations may fill tables
+that were added to the models after the database was created, like survey_answer.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from src.models.user import SchemaMigration, db
+from src.services.search import SqliteFtsIndex
+from src.services.survey_answers import backfill_answers
+from src.services.survey_stats import create_missing_statistics
+
+def _create_indexes(connection, names):
+    """Create the model indexes with the given names if they don't exist yet"""
+    # Reflection can't see expression indexes (lower(...)), so let the database skip existing ones
+    if_not_exists = connection.dialect.name in ('sqlite', 'postgresql')
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names:
+                if if_not_exists:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+                else:
+                    index.create(bind=connection, checkfirst=True)
+
+def _add_column(connection, table_name, column_name, ddl_type):
+    """Add a column (nullable or with a default) to an existing table if it is missing"""
+    columns = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    if column_name not in columns:
+        connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl_type}'))
+
+def _add_hot_path_indexes(connection):
+    _create_indexes(connection, {
+        'ix_question_active_created',
+        'ix_question_created',
+        'ix_question_user',
+        'ix_comment_question_active_created',
+        'ix_comment_created',
+        'ix_comment_user',
+        'ix_survey_active',
+        'ix_survey_response_survey_submitted',
+        'ix_survey_response_user',
+    })
+
+def _add_submission_id(connection):
+    _add_column(connection, 'survey_response', 'submission_id', 'VARCHAR(32)')
+    _create_indexes(connection, {'ix_survey_response_submission'})
+
+def _backfill_survey_answers(connection):
+    backfill_answers(connection)
+
+def _create_forum_search(connection):
+    if connection.dialect.name == 'sqlite':
+        SqliteFtsIndex().rebuild(connection)
+
+def _add_user_directory_indexes(connection):
+    _create_indexes(connection, {
+        'ix_user_username_lower',
+        'ix_user_email_lower',
+        'ix_user_company_lower',
+        'ix_user_created',
+    })
+
+def _add_statistics_generation(connection):
+    _add_column(connection, 'survey_statistics', 'generation', 'INTEGER NOT NULL DEFAULT 0')
+
+def _create_missing_statistics(connection):
+    create_missing_statistics(connection)
+
+def _require_sort_timestamps(connection):
+    # Keyset cursors are positions on these columns: give the rows without one the oldest
+    # timestamp of their table. SQLite can't add the constraint to an existing column, the
+    # models' defaults keep new rows from having NULLs there
+    for table_name, column_name in (('user', 'created_at'), ('question', 'created_at'),
+                                    ('comment', 'created_at'), ('survey_response', 'submitted_at')):
+        connection.execute(text(
+            f'UPDATE "{table_name}" SET {column_name} = COALESCE((SELECT MIN({column_name}) FROM "{table_name}"), '
+            f':now) WHERE {column_name} IS NULL'), {'now': datetime.utcnow()})
+        if connection.dialect.name != 'sqlite':
+            connection.execute(text(f'ALTER TABLE "{table_name}" ALTER COLUMN {column_name} SET NOT NULL'))
+
+def _add_answer_value_index(connection):
+    # Supersedes ix_survey_answer_option (its prefix) and covers the grouped analytics load
+    _create_indexes(connection, {'ix_survey_answer_value'})
+    connection.execute(text('DROP INDEX IF EXISTS ix_survey_answer_option'))
+
+def _reindex_user_directory(connection):
+    # Built with SQLite's ASCII-only lower(): rebuilt with the Unicode one of engine.py
+    if connection.dialect.name == 'sqlite':
+        for name in ('ix_user_username_lower', 'ix_user_email_lower', 'ix_user_company_lower'):
+            connection.execute(text(f'REINDEX {name}'))
+
+# (version, description, function(connection)), in order of application
+MIGRATIONS = [
+    (1, 'Indexes for the hot filter/order columns', _add_hot_path_indexes),
+    (2, 'Submission id on survey responses for batched ingestion', _add_submission_id),
+    (3, 'Backfill normalized survey answers from responses_json', _backfill_survey_answers),
+    (4, 'Full-text search index over forum questions and comments', _create_forum_search),
+    (5, 'Indexes for searching and sorting the user directory', _add_user_directory_indexes),
+    (6, 'Generation counter of survey statistics for cache invalidation', _add_statistics_generation),
+    (7, 'Statistics of the surveys created without them', _create_missing_statistics),
+    (8, 'Timestamps of keyset-paginated rows are required', _require_sort_timestamps),
+    (9, 'Covering index of survey answers by value for analytics', _add_answer_value_index),
+    (10, 'User directory indexes with Unicode lower() on SQLite', _reindex_user_directory),
+]
+
+def applied_versions():
+    """Versions already recorded as applied on the current database"""
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+def upgrade():
+    """Apply all pending migrations, each in its own transaction. Returns the applied versions."""
+    SchemaMigration.__table__.create(bind=db.engine, checkfirst=True)
+    done = applied_versions()
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with db.engine.begin() as connection:
+                migrate(connection)
+                connection.execute(SchemaMigration.__table__.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()))
+        except IntegrityError:
+            # Another worker applied this version concurrently
+            continue
+        applied.append(version)
+    return applied
@@ -0,0 +1,63 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor'])
+
+MAX_PER_PAGE = 100
+
+def clamp_per_page(per_page):
+    """Page size bounded to 1..MAX_PER_PAGE, for offset and cursor pages alike"""
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+def encode_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) position as an opaque URL-safe cursor"""
+    payload = json.dumps([timestamp.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor into (timestamp, id), raise ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def keyset_paginate(query, order_column, id_column, cursor, per_page, descending=True, entity=lambda row: row):
+    """Return one page of `query` ordered by (order_column, id_column), starting after `cursor`.
+
+    Pages are selected with a WHERE on the sort key instead of OFFSET, so deep pages cost the
+    same as the first one. `entity` extracts the model instance from a row for multi-entity queries.
+    An empty cursor starts at the first page; raises ValueError for a malformed cursor.
+    `order_column` must be NOT NULL: a NULL can't be compared with, so it can't be a position.
+    """
+    per_page = clamp_per_page(per_page)
+
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(order_column < timestamp,
+                                     and_(order_column == timestamp, id_column < row_id)))
+        else:
+            query = query.filter(or_(order_column > timestamp,
+                                     and_(order_column == timestamp, id_column > row_id)))
+
+    if descending:
+        query = query.order_by(order_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(order_column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = entity(rows[-1])
+        next_cursor = encode_cursor(getattr(last, order_column.key), getattr(last, id_column.key))
+    return KeysetPage(rows, next_cursor)
+
+def wants_total(args):
+    """Whether the client asked for the (expensive) total count in cursor mode"""
+    return args.get('include_total', 'false').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,142 @@
+"""Password hashing off the request threads, with back-pressure and login throttling.
+
+Hashes are computed by a small dedicated thread pool. At most PASSWORD_HASH_WORKERS hashes
+run at once and at most PASSWORD_HASH_QUEUE wait; beyond that HasherBusy is raised and the
+route answers 503, so a login storm cannot starve the other endpoints of CPU.
+LoginThrottle rejects (username, client IP) pairs and client IPs with too many recent
+failures before any hashing.
+The hash method (and so its cost) is configurable; hashes made with other parameters are
+replaced on the next successful login that finds a free slot in the pool.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class HasherBusy(Exception):
+    """Too many password hashes are running or queued"""
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+        app.config.setdefault('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 16)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+        app.extensions['password_hasher'] = self
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+        self._method_prefix = None
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the hash is done, even when the caller stops waiting for it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured method"""
+        if self._method_prefix is None:
+            # Full parameter string of the configured method, e.g. 'scrypt:32768:8:1'
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+class LoginThrottle:
+    """Sliding-window count of failed logins per (username, client IP) and per client IP.
+
+    A username is never locked out on its own, so nobody can lock an account (the admin's)
+    by failing its login from elsewhere. At most `max_keys` keys are tracked: the least
+    recently failing ones are dropped first and expired ones are swept every window, so a
+    credential-stuffing run over unique usernames or IPs cannot grow the table without bound.
+    """
+
+    def __init__(self, max_per_user=5, max_per_ip=50, window=300, max_keys=10000):
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def init_app(self, app):
+        self.max_per_user = app.config.setdefault('LOGIN_MAX_FAILURES_PER_USER', self.max_per_user)
+        self.max_per_ip = app.config.setdefault('LOGIN_MAX_FAILURES_PER_IP', self.max_per_ip)
+        self.window = app.config.setdefault('LOGIN_FAILURE_WINDOW', self.window)
+        self.max_keys = app.config.setdefault('LOGIN_THROTTLE_MAX_KEYS', self.max_keys)
+
+    def _keys(self, username, ip_address):
+        return ((('user', username, ip_address), self.max_per_user), (('ip', ip_address), self.max_per_ip))
+
+    def _recent(self, key, now):
+        attempts = [t for t in self._failures.get(key, ()) if now - t < self.window]
+        if attempts:
+            self._failures[key] = attempts
+        else:
+            self._failures.pop(key, None)
+        return attempts
+
+    def _sweep(self, now):
+        """Drop expired keys; the oldest key has the oldest last failure"""
+        self._last_sweep = now
+        while self._failures:
+            key, attempts = next(iter(self._failures.items()))
+            if now - attempts[-1] < self.window:
+                break
+            del self._failures[key]
+
+    def __len__(self):
+        return len(self._failures)
+
+    def retry_after(self, username, ip_address):
+        """Seconds before another attempt is allowed, or 0 if it is allowed now"""
+        now = time.monotonic()
+        with self._lock:
+            wait = 0
+            for key, limit in self._keys(username, ip_address):
+                attempts = self._recent(key, now)
+                if len(attempts) >= limit:
+                    wait = max(wait, attempts[-limit] + self.window - now)
+            return int(wait) + 1 if wait else 0
+
+    def failed(self, username, ip_address):
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._keys(username, ip_address):
+                self._failures[key] = self._recent(key, now) + [now]
+                self._failures.move_to_end(key)
+            if now - self._last_sweep >= self.window:
+                self._sweep(now)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def succeeded(self, username, ip_address):
+        with self._lock:
+            self._failures.pop(('user', username, ip_address), None)
+
+hasher = PasswordHasher()
+login_throttle = LoginThrottle()
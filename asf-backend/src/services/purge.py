@@ -0,0 +1,173 @@
+"""Set-based deletion of users and surveys.
+
+Deleting through the ORM cascades loaded every dependent row and issued one DELETE per row,
+all in one transaction that kept SQLite locked. A purge deletes each dependent table with bulk
+DELETE statements of at most PURGE_BATCH_SIZE rows, children before parents.
+
+Purges of up to PURGE_INLINE_LIMIT rows run inline in one transaction, which also takes the
+deleted responses out of the survey statistics (no rescan of the surveys). Larger ones deactivate
+the user/survey right away and run as a `purge-user` / `purge-survey` job (see jobs.py), one
+short transaction per batch with the progress reported in between. Every batch is idempotent,
+so these jobs are resumable: one interrupted by a restart is queued again and carries on where
+it stopped. A cancelled purge stops between two batches; the target stays deactivated, and
+deleting it again finishes the purge.
+"""
+import json
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from src.models.user import (Comment, Job, Question, Survey, SurveyAnswer, SurveyQuestionStatistics,
+                             SurveyResponse, SurveyStatistics, User, db)
+from src.services.jobs import jobs
+from src.services.search import forum_search
+from src.services.survey_stats import forget_responses, rebuild_survey_statistics
+
+# One bulk delete: rows of `table` matching `condition`; `search_kind` posts leave the search index
+Step = namedtuple('Step', ['table', 'condition', 'search_kind'])
+
+PURGE_KINDS = ('user', 'survey')
+
+def survey_steps(survey_id):
+    return [
+        Step(SurveyAnswer.__table__, SurveyAnswer.survey_id == survey_id, None),
+        Step(SurveyResponse.__table__, SurveyResponse.survey_id == survey_id, None),
+        Step(SurveyQuestionStatistics.__table__, SurveyQuestionStatistics.survey_id == survey_id, None),
+        Step(SurveyStatistics.__table__, SurveyStatistics.survey_id == survey_id, None),
+        Step(Survey.__table__, Survey.id == survey_id, None),
+    ]
+
+def user_steps(user_id):
+    responses = select(SurveyResponse.id).where(SurveyResponse.user_id == user_id)
+    questions = select(Question.id).where(Question.user_id == user_id)
+    return [
+        Step(SurveyAnswer.__table__, SurveyAnswer.response_id.in_(responses), None),
+        Step(SurveyResponse.__table__, SurveyResponse.user_id == user_id, None),
+        Step(Comment.__table__, Comment.user_id == user_id, 'comment'),
+        Step(Comment.__table__, Comment.question_id.in_(questions), 'comment'),
+        Step(Question.__table__, Question.user_id == user_id, 'question'),
+        Step(User.__table__, User.id == user_id, None),
+    ]
+
+def plan(kind, target_id):
+    return survey_steps(target_id) if kind == 'survey' else user_steps(target_id)
+
+def count_rows(session, steps):
+    """Rows a purge will delete (index-backed COUNTs)"""
+    return sum(session.execute(select(func.count()).select_from(step.table).where(step.condition)).scalar()
+               for step in steps)
+
+def delete_batch(session, step, batch_size):
+    """Delete up to `batch_size` rows of a step; returns the number deleted"""
+    if 'id' not in step.table.c:
+        # Tables keyed by survey_id (statistics) hold a handful of rows per target
+        return session.execute(delete(step.table).where(step.condition)).rowcount
+    ids = session.execute(select(step.table.c.id).where(step.condition).limit(batch_size)).scalars().all()
+    if not ids:
+        return 0
+    session.execute(delete(step.table).where(step.table.c.id.in_(ids)))
+    if step.search_kind and forum_search.index is not None:
+        forum_search.index.remove_many(session.connection(), step.search_kind, ids)
+    return len(ids)
+
+def _model(kind):
+    return Survey if kind == 'survey' else User
+
+def _affected_surveys(kind, target_id):
+    """Surveys whose statistics lose responses in a purge job; rebuilt once it is done"""
+    if kind != 'user':
+        return []
+    return db.session.execute(select(SurveyResponse.survey_id).distinct()
+                              .where(SurveyResponse.user_id == target_id)).scalars().all()
+
+def _forget_responses(kind, target_id):
+    """Take the user's responses out of the statistics of the surveys they answered"""
+    if kind != 'user':
+        return
+    responses = {}
+    for survey_id, responses_json in db.session.execute(
+            select(SurveyResponse.survey_id, SurveyResponse.responses_json).where(SurveyResponse.user_id == target_id)):
+        responses.setdefault(survey_id, []).append(responses_json)
+    for survey_id in sorted(responses):
+        survey = db.session.get(Survey, survey_id)
+        if survey is not None:
+            forget_responses(survey, responses[survey_id])
+
+def _finish(surveys):
+    for survey_id in surveys:
+        survey = db.session.get(Survey, survey_id)
+        if survey is not None:
+            rebuild_survey_statistics(survey)
+    db.session.commit()
+
+def delete_target(kind, target_id, user_id=None):
+    """Delete a user or survey and its dependents.
+
+    Runs inline (and commits) when small and returns None; otherwise queues a purge job and
+    returns it. Deleting a target already being purged returns its job. Raises JobQueueFull.
+    """
+    steps = plan(kind, target_id)
+    batch_size = current_app.config['PURGE_BATCH_SIZE']
+    if count_rows(db.session, steps) <= current_app.config['PURGE_INLINE_LIMIT']:
+        # In the same transaction as the deletion: a handful of responses, no survey rescan
+        _forget_responses(kind, target_id)
+        for step in steps:
+            while delete_batch(db.session, step, batch_size) >= batch_size:
+                pass
+        db.session.commit()
+        return None
+
+    job_kind = f'purge-{kind}'
+    for job in Job.query.filter(Job.kind == job_kind, Job.status.in_(('queued', 'running'))):
+        if json.loads(job.params_json).get(f'{kind}_id') == target_id:
+            return job
+    # Hidden right away: inactive users can't sign in, inactive surveys aren't served
+    model = _model(kind)
+    db.session.execute(update(model).where(model.id == target_id).values(is_active=False))
+    try:
+        return jobs.start(job_kind, {f'{kind}_id': target_id}, user_id)
+    except Exception:
+        db.session.rollback()
+        raise
+
+def run_purge(job, kind, target_id, surveys=()):
+    """Delete a target batch by batch, reporting progress to its job between batches"""
+    model = _model(kind)
+    db.session.execute(update(model).where(model.id == target_id).values(is_active=False))
+    db.session.commit()
+    steps = plan(kind, target_id)
+    batch_size = current_app.config['PURGE_BATCH_SIZE']
+    pause = current_app.config['PURGE_PAUSE_MS'] / 1000
+    # What is left: a resumed purge only counts the rows the interrupted run didn't delete
+    job.progress(0, count_rows(db.session, steps))
+    deleted = 0
+    for step in steps:
+        while True:
+            count = delete_batch(db.session, step, batch_size)
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                break
+            job.progress(deleted)
+            # Let other writers in between batches
+            time.sleep(pause)
+    _finish(surveys)
+    return {'deleted': deleted}
+
+def _purge_params(kind):
+    def validate(params):
+        target_id = params.get(f'{kind}_id')
+        if not isinstance(target_id, int) or db.session.get(_model(kind), target_id) is None:
+            raise ValueError(f'{kind.capitalize()} {target_id} not found')
+        return {f'{kind}_id': target_id, 'surveys': _affected_surveys(kind, target_id)}
+    return validate
+
+@jobs.task('purge-user', validate=_purge_params('user'), resumable=True)
+def purge_user_job(job, user_id, surveys=()):
+    """Delete a user with their posts and responses, then recount the surveys they answered"""
+    return run_purge(job, 'user', user_id, surveys)
+
+@jobs.task('purge-survey', validate=_purge_params('survey'), resumable=True)
+def purge_survey_job(job, survey_id, surveys=()):
+    """Delete a survey with its responses and statistics"""
+    return run_purge(job, 'survey', survey_id, surveys)
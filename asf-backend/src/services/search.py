@@ -0,0 +1,180 @@
+"""Full-text search over forum questions and comments.
+
+On SQLite the index is an FTS5 virtual table (forum_search) ranked with BM25, titles weighing
+more than bodies. It only holds active posts and is kept in sync by mapper events on Question
+and Comment, in the same transaction as the change. Rows bulk-inserted without the ORM are
+picked up by `flask forum rebuild-search`. Other databases fall back to LIKE queries, which
+don't scale; a native index can be added by implementing SearchIndex.
+"""
+import re
+from sqlalchemy import event, or_, text
+from src.models.user import Comment, Question, db
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def _rowid(kind, doc_id):
+    # Questions and comments share the index: even rowids are questions, odd ones comments
+    return doc_id * 2 + (1 if kind == 'comment' else 0)
+
+class SearchIndex:
+    """Interface of a forum search index"""
+    name = None
+
+    def create(self, connection):
+        pass
+
+    def index_question(self, connection, question):
+        pass
+
+    def index_comment(self, connection, comment):
+        pass
+
+    def remove(self, connection, kind, doc_id):
+        pass
+
+    def remove_many(self, connection, kind, doc_ids):
+        """Remove posts deleted in bulk (mapper events don't fire for bulk deletes)"""
+        for doc_id in doc_ids:
+            self.remove(connection, kind, doc_id)
+
+    def rebuild(self, connection):
+        return 0
+
+    def search(self, query, page, per_page):
+        """Return (results, total) for a page of ranked results"""
+        raise NotImplementedError
+
+class SqliteFtsIndex(SearchIndex):
+    name = 'sqlite-fts5'
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS forum_search USING fts5("
+            "kind UNINDEXED, question_id UNINDEXED, title, content, "
+            "tokenize='unicode61 remove_diacritics 2')"))
+
+    def _insert(self, connection, kind, doc_id, question_id, title, content):
+        connection.execute(text(
+            "INSERT INTO forum_search (rowid, kind, question_id, title, content) "
+            "VALUES (:rowid, :kind, :question_id, :title, :content)"),
+            {'rowid': _rowid(kind, doc_id), 'kind': kind, 'question_id': question_id,
+             'title': title, 'content': content})
+
+    def remove(self, connection, kind, doc_id):
+        connection.execute(text("DELETE FROM forum_search WHERE rowid = :rowid"),
+                           {'rowid': _rowid(kind, doc_id)})
+
+    def remove_many(self, connection, kind, doc_ids):
+        if doc_ids:
+            connection.execute(text("DELETE FROM forum_search WHERE rowid IN ({})".format(
+                ', '.join(str(_rowid(kind, int(doc_id))) for doc_id in doc_ids))))
+
+    def index_question(self, connection, question):
+        self.remove(connection, 'question', question.id)
+        if question.is_active:
+            self._insert(connection, 'question', question.id, question.id, question.title, question.content)
+
+    def index_comment(self, connection, comment):
+        self.remove(connection, 'comment', comment.id)
+        if comment.is_active:
+            self._insert(connection, 'comment', comment.id, comment.question_id, '', comment.content)
+
+    def rebuild(self, connection):
+        self.create(connection)
+        connection.execute(text("DELETE FROM forum_search"))
+        connection.execute(text(
+            "INSERT INTO forum_search (rowid, kind, question_id, title, content) "
+            "SELECT id * 2, 'question', id, title, content FROM question WHERE is_active = 1"))
+        connection.execute(text(
+            "INSERT INTO forum_search (rowid, kind, question_id, title, content) "
+            "SELECT id * 2 + 1, 'comment', question_id, '', content FROM comment WHERE is_active = 1"))
+        connection.execute(text("INSERT INTO forum_search (forum_search) VALUES ('optimize')"))
+        return connection.execute(text("SELECT count(*) FROM forum_search")).scalar()
+
+    def search(self, query, page, per_page):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return [], 0
+        # Every word must match, the last one as a prefix (search-as-you-type)
+        match = ' '.join(f'"{token}"' for token in tokens[:-1]) + f' "{tokens[-1]}"*'
+        where = ("FROM forum_search JOIN question ON question.id = forum_search.question_id "
+                 "AND question.is_active = 1 WHERE forum_search MATCH :match")
+        rows = db.session.execute(text(
+            "SELECT forum_search.rowid, forum_search.kind, forum_search.question_id, question.title, "
+            "snippet(forum_search, -1, '', '', '…', 16) AS snippet, "
+            "bm25(forum_search, 0, 0, 10.0, 1.0) AS rank "
+            f"{where} ORDER BY rank LIMIT :limit OFFSET :offset"),
+            {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page})
+        results = [{
+            'type': kind,
+            'id': rowid // 2,
+            'question_id': question_id,
+            'question_title': title,
+            'snippet': snippet,
+            'score': round(-rank, 4)
+        } for rowid, kind, question_id, title, snippet, rank in rows]
+        total = db.session.execute(text(f"SELECT count(*) {where}"), {'match': match}).scalar()
+        return results, total
+
+class LikeSearchIndex(SearchIndex):
+    """Fallback without an inverted index: LIKE scans, newest first"""
+    name = 'like'
+
+    def search(self, query, page, per_page):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return [], 0
+        question_query = Question.query.filter(Question.is_active == True)
+        for token in tokens:
+            question_query = question_query.filter(or_(Question.title.ilike(f'%{token}%'),
+                                                       Question.content.ilike(f'%{token}%')))
+        comment_query = Comment.query.join(Question).filter(Comment.is_active == True, Question.is_active == True)
+        for token in tokens:
+            comment_query = comment_query.filter(Comment.content.ilike(f'%{token}%'))
+
+        questions = question_query.order_by(Question.created_at.desc()).limit(page * per_page).all()
+        comments = comment_query.order_by(Comment.created_at.desc()).limit(page * per_page).all()
+        results = [{'type': 'question', 'id': q.id, 'question_id': q.id, 'question_title': q.title,
+                    'snippet': q.content[:200], 'score': None, 'created_at': q.created_at} for q in questions]
+        results += [{'type': 'comment', 'id': c.id, 'question_id': c.question_id, 'question_title': c.question.title,
+                     'snippet': c.content[:200], 'score': None, 'created_at': c.created_at} for c in comments]
+        results.sort(key=lambda r: r.pop('created_at'), reverse=True)
+        total = question_query.count() + comment_query.count()
+        return results[(page - 1) * per_page:page * per_page], total
+
+class ForumSearch:
+    """Selects the index for the configured database and keeps it in sync with the models"""
+
+    def __init__(self):
+        self.index = None
+
+    def init_app(self, app, engine):
+        self.index = SqliteFtsIndex() if engine.dialect.name == 'sqlite' else LikeSearchIndex()
+        app.extensions['forum_search'] = self
+
+    def search(self, query, page, per_page):
+        return self.index.search(query, page, per_page)
+
+forum_search = ForumSearch()
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+def _sync_question(mapper, connection, question):
+    if forum_search.index is not None:
+        forum_search.index.index_question(connection, question)
+
+@event.listens_for(Question, 'after_delete')
+def _remove_question(mapper, connection, question):
+    if forum_search.index is not None:
+        forum_search.index.remove(connection, 'question', question.id)
+
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_update')
+def _sync_comment(mapper, connection, comment):
+    if forum_search.index is not None:
+        forum_search.index.index_comment(connection, comment)
+
+@event.listens_for(Comment, 'after_delete')
+def _remove_comment(mapper, connection, comment):
+    if forum_search.index is not None:
+        forum_search.index.remove(connection, 'comment', comment.id)
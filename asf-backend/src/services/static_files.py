@@ -0,0 +1,136 @@
+"""Serving the bundled frontend from the static folder.
+
+The folder is scanned once into an in-memory manifest: requests are matched against it without
+touching the filesystem, and any path that is not a file (a client-side route) gets index.html.
+Precompressed siblings (`app.js.br`, `app.js.gz`, written by `flask --app src.main
+compress-static` after a build) are served to clients that accept them. Vite's content-hashed
+assets (`assets/index-B2xZ3q9a.js`) are cached for a year as immutable; other files, index.html
+included, are revalidated with their ETag and answered with 304 when unchanged.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from collections import namedtuple
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # .gz variants only
+    brotli = None
+
+# Preferred first; 'identity' is the file itself
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'application/manifest+json',
+                      'image/svg+xml', 'text/')
+
+Variant = namedtuple('Variant', ['path', 'size', 'etag'])
+
+StaticFile = namedtuple('StaticFile', ['mimetype', 'mtime', 'immutable', 'variants'])
+
+def _etag(stat, encoding):
+    return f"{int(stat.st_mtime)}-{stat.st_size:x}-{encoding}"
+
+class StaticFiles:
+    def __init__(self, app=None):
+        self.folder = None
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STATIC_MAX_AGE', 0)
+        app.config.setdefault('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600)
+        # Vite names bundled files <name>-<8 character content hash>.<ext> under assets/
+        app.config.setdefault('STATIC_IMMUTABLE_PATTERN', r'^assets/.+-[A-Za-z0-9_-]{8,}\.\w+$')
+        app.extensions['static_files'] = self
+        self.app = app
+        self.folder = app.static_folder
+        self.refresh()
+
+    def refresh(self):
+        """Rescan the static folder (after a new build or compress-static)"""
+        immutable = re.compile(self.app.config['STATIC_IMMUTABLE_PATTERN'])
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        manifest = {}
+        if self.folder and os.path.isdir(self.folder):
+            for root, _, files in os.walk(self.folder):
+                names = set(files)
+                for name in files:
+                    if name.endswith(suffixes) and name.rsplit('.', 1)[0] in names:
+                        continue  # A variant of another file
+                    path = os.path.join(root, name)
+                    url_path = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                    manifest[url_path] = self._entry(path, url_path, names, immutable)
+        self.manifest = manifest
+        return len(manifest)
+
+    @staticmethod
+    def _entry(path, url_path, names, immutable):
+        stat = os.stat(path)
+        variants = {'identity': Variant(path, stat.st_size, _etag(stat, 'identity'))}
+        for encoding, suffix in ENCODINGS:
+            name = os.path.basename(path) + suffix
+            if name in names:
+                variant_stat = os.stat(path + suffix)
+                # A variant older than its file is left over from a previous build
+                if variant_stat.st_mtime >= stat.st_mtime:
+                    variants[encoding] = Variant(path + suffix, variant_stat.st_size, _etag(stat, encoding))
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return StaticFile(mimetype, stat.st_mtime, bool(immutable.match(url_path)), variants)
+
+    def lookup(self, path):
+        """Manifest entry for a URL path; unknown paths are client-side routes served index.html"""
+        return self.manifest.get(path) or self.manifest.get('index.html')
+
+    def response(self, path):
+        entry = self.lookup(path)
+        if entry is None:
+            return None
+        if len(entry.variants) > 1:
+            encoding = request.accept_encodings.best_match(list(entry.variants), default='identity')
+        else:
+            encoding = 'identity'
+        variant = entry.variants[encoding]
+        if entry.immutable:
+            max_age = self.app.config['STATIC_IMMUTABLE_MAX_AGE']
+        else:
+            max_age = self.app.config['STATIC_MAX_AGE']
+        # Handles If-None-Match / If-Modified-Since (304) and ranges
+        response = send_file(variant.path, mimetype=entry.mimetype, etag=variant.etag,
+                             last_modified=entry.mtime, max_age=max_age, conditional=True)
+        if entry.immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        if len(entry.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, min_size=256):
+        """Write .gz (and .br when brotli is installed) next to compressible files; returns their number"""
+        written = 0
+        for url_path, entry in self.manifest.items():
+            source = entry.variants['identity']
+            if source.size < min_size or not entry.mimetype.startswith(COMPRESSIBLE_TYPES):
+                continue
+            with open(source.path, 'rb') as f:
+                data = f.read()
+            for encoding, suffix in ENCODINGS:
+                if encoding in entry.variants or (encoding == 'br' and brotli is None):
+                    continue
+                if encoding == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data):
+                    with open(source.path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written += 1
+        self.refresh()
+        return written
+
+static_files = StaticFiles()
@@ -0,0 +1,78 @@
+"""Normalized storage of survey answers (SurveyAnswer rows) derived from responses_json"""
+import json
+from sqlalchemy import select
+from src.models.user import Survey, SurveyAnswer, SurveyResponse
+from src.services.survey_schema import CompiledSurvey, compile_survey, is_answered
+
+CHOICE_TYPES = ('multiple_choice', 'radio', 'select', 'checkbox')
+
+def _numeric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def answer_values(schema, response_data):
+    """Yield the column values of the SurveyAnswer rows of one parsed response"""
+    if not isinstance(response_data, dict):
+        return
+    for item in schema.items:
+        question_id = item.key
+        value = response_data.get(question_id)
+        if not is_answered(value):
+            continue
+        question_type = item.type
+        values = value if isinstance(value, list) else [value]
+        for value in values:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            if question_type == 'text':
+                yield {'question_id': question_id, 'option_value': None, 'numeric_value': None, 'text_value': str(value)}
+            elif question_type == 'rating':
+                yield {'question_id': question_id, 'option_value': str(value)[:255],
+                       'numeric_value': _numeric(value), 'text_value': None}
+            elif question_type in CHOICE_TYPES:
+                yield {'question_id': question_id, 'option_value': str(value)[:255], 'numeric_value': None, 'text_value': None}
+            else:
+                yield {'question_id': question_id, 'option_value': None,
+                       'numeric_value': _numeric(value), 'text_value': str(value)}
+
+def build_answers(survey, response_data):
+    """SurveyAnswer objects for a new response (attach them with response.answers = ...)"""
+    return [SurveyAnswer(survey_id=survey.id, **values)
+            for values in answer_values(compile_survey(survey), response_data)]
+
+def backfill_answers(connection, batch_size=1000, on_batch=None):
+    """Create the SurveyAnswer rows of every response that has none, in batches.
+
+    Works on a plain connection so it can run as a schema migration. `on_batch(processed)` is
+    called after each batch. Returns the number of responses processed.
+    """
+    surveys = {survey_id: CompiledSurvey.from_json(survey_id, questions_json)
+               for survey_id, questions_json in connection.execute(select(Survey.id, Survey.questions_json))}
+    missing = select(SurveyResponse.id, SurveyResponse.survey_id, SurveyResponse.responses_json)\
+        .where(~SurveyResponse.answers.any())\
+        .order_by(SurveyResponse.id)
+
+    processed = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(missing.where(SurveyResponse.id > last_id).limit(batch_size)).all()
+        if not rows:
+            return processed
+        answers = []
+        for response_id, survey_id, responses_json in rows:
+            try:
+                response_data = json.loads(responses_json)
+            except ValueError:
+                continue
+            if survey_id not in surveys:
+                continue
+            for values in answer_values(surveys[survey_id], response_data):
+                answers.append(dict(values, response_id=response_id, survey_id=survey_id))
+        if answers:
+            connection.execute(SurveyAnswer.__table__.insert(), answers)
+        processed += len(rows)
+        last_id = rows[-1][0]
+        if on_batch is not None:
+            on_batch(processed)
@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from src.models.user import SurveyResponse, User, db
+from src.services.survey_schema import compile_survey
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+def _iter_rows(survey, batch_size):
+    """Yield (response columns, parsed answers) for every response, reading rows in batches"""
+    rows = db.session.query(SurveyResponse.id, SurveyResponse.submitted_at, SurveyResponse.user_id,
+                            User.username, SurveyResponse.ip_address, SurveyResponse.responses_json)\
+                     .outerjoin(User, User.id == SurveyResponse.user_id)\
+                     .filter(SurveyResponse.survey_id == survey.id)\
+                     .order_by(SurveyResponse.id)\
+                     .execution_options(yield_per=batch_size)
+    for response_id, submitted_at, user_id, username, ip_address, responses_json in rows:
+        try:
+            answers = json.loads(responses_json)
+        except ValueError:
+            answers = {}
+        if not isinstance(answers, dict):
+            answers = {}
+        yield {
+            'id': response_id,
+            'submitted_at': submitted_at.isoformat() if submitted_at else None,
+            'user_id': user_id,
+            'username': username,
+            'ip_address': ip_address
+        }, answers
+
+def _csv_value(value):
+    """Flatten an answer into a single CSV cell"""
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def generate_csv(survey, batch_size=1000):
+    """Yield the responses of a survey as CSV, one chunk per row"""
+    items = compile_survey(survey).items
+    question_ids = [item.key for item in items]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(['id', 'submitted_at', 'user_id', 'username', 'ip_address'] +
+                    [item.question.get('text') or item.key for item in items])
+    yield flush()
+
+    for columns, answers in _iter_rows(survey, batch_size):
+        writer.writerow(list(columns.values()) + [_csv_value(answers.get(qid)) for qid in question_ids])
+        yield flush()
+
+def generate_ndjson(survey, batch_size=1000):
+    """Yield the responses of a survey as newline-delimited JSON, one object per line"""
+    question_ids = [item.key for item in compile_survey(survey).items]
+    for columns, answers in _iter_rows(survey, batch_size):
+        columns['answers'] = {qid: answers.get(qid) for qid in question_ids}
+        yield json.dumps(columns, ensure_ascii=False) + '\n'
@@ -0,0 +1,135 @@
+"""Compiled survey schemas.
+
+questions_json is parsed once per survey version into a CompiledSurvey, kept in a bounded
+cache keyed by (survey id, updated_at). It gives O(1) question lookup by key, the allowed
+options and required flags, and validates and canonicalizes submissions before they are
+stored: string question keys, unanswered questions omitted, typed values (option labels as
+strings, checkbox answers as lists, ratings as integers).
+"""
+import json
+from src.services.cache import MemoryCache
+
+CHOICE_TYPES = ('radio', 'select', 'multiple_choice')
+MAX_TEXT_LENGTH = 10000
+DEFAULT_RATING_SCALE = (1, 5)
+
+class SubmissionError(ValueError):
+    """A submission does not match the survey questions; `errors` maps question keys to messages"""
+
+    def __init__(self, errors):
+        super().__init__('Invalid responses')
+        self.errors = errors
+
+def load_questions(questions_json):
+    """Parse a questions_json value, or return an empty list if the JSON is invalid"""
+    try:
+        questions = json.loads(questions_json) if questions_json else []
+    except ValueError:
+        return []
+    return [q for q in questions if isinstance(q, dict)] if isinstance(questions, list) else []
+
+def question_key(question, index):
+    """Key of a question in the submitted responses (same fallback as the survey frontend)"""
+    question_id = question.get('id')
+    return str(question_id) if question_id not in (None, '', 0) else f'question_{index}'
+
+def is_answered(value):
+    """A response value counts as an answer if it is not empty ('' and [] are not answers)"""
+    return bool(value)
+
+class CompiledQuestion:
+    __slots__ = ('key', 'index', 'type', 'required', 'options', 'option_set', 'question')
+
+    def __init__(self, question, index):
+        self.key = question_key(question, index)
+        self.index = index
+        self.type = question.get('type')
+        self.required = bool(question.get('required', False))
+        self.options = tuple(str(option) for option in question.get('options') or [])
+        self.option_set = frozenset(self.options)
+        self.question = question
+
+    def canonical_value(self, value):
+        """Return the canonical form of an answer, raise ValueError if it is not acceptable"""
+        if self.type in CHOICE_TYPES:
+            if isinstance(value, (list, dict)):
+                raise ValueError('a single option is expected')
+            value = str(value)
+            if self.option_set and value not in self.option_set:
+                raise ValueError(f'unknown option {value!r}')
+            return value
+        if self.type == 'checkbox':
+            values = value if isinstance(value, list) else [value]
+            if any(isinstance(v, (list, dict)) for v in values):
+                raise ValueError('a list of options is expected')
+            values = [str(v) for v in values]
+            unknown = [v for v in values if self.option_set and v not in self.option_set]
+            if unknown:
+                raise ValueError(f'unknown option(s) {", ".join(map(repr, unknown))}')
+            return list(dict.fromkeys(values))
+        if self.type == 'rating':
+            try:
+                rating = float(value)
+            except (TypeError, ValueError):
+                raise ValueError('a number is expected')
+            low = self.question.get('min', DEFAULT_RATING_SCALE[0])
+            high = self.question.get('max', DEFAULT_RATING_SCALE[1])
+            if not rating.is_integer() or not low <= rating <= high:
+                raise ValueError(f'a whole number between {low} and {high} is expected')
+            return int(rating)
+        if self.type == 'text':
+            if isinstance(value, (list, dict)):
+                raise ValueError('text is expected')
+            value = str(value)
+            if len(value) > MAX_TEXT_LENGTH:
+                raise ValueError(f'at most {MAX_TEXT_LENGTH} characters are allowed')
+            return value
+        return value
+
+class CompiledSurvey:
+    def __init__(self, survey_id, version, questions):
+        self.survey_id = survey_id
+        self.version = version
+        self.questions = questions
+        self.items = [CompiledQuestion(question, index) for index, question in enumerate(questions)]
+        self.by_key = {item.key: item for item in self.items}
+        self.required_count = sum(1 for item in self.items if item.required)
+
+    @classmethod
+    def from_json(cls, survey_id, questions_json, version=None):
+        return cls(survey_id, version, load_questions(questions_json))
+
+    def validate(self, responses):
+        """Canonical copy of a submission; raises SubmissionError listing every problem.
+
+        Keys that are not questions of the survey are dropped, as are unanswered questions.
+        """
+        if not isinstance(responses, dict):
+            raise SubmissionError({'responses': 'an object mapping question ids to answers is expected'})
+        canonical = {}
+        errors = {}
+        for item in self.items:
+            value = responses.get(item.key)
+            if not is_answered(value):
+                if item.required:
+                    errors[item.key] = 'this question is required'
+                continue
+            try:
+                canonical[item.key] = item.canonical_value(value)
+            except ValueError as e:
+                errors[item.key] = str(e)
+        if errors:
+            raise SubmissionError(errors)
+        return canonical
+
+_compiled = MemoryCache(maxsize=512, ttl=3600)
+
+def compile_survey(survey):
+    """CompiledSurvey of the current version of a survey, from the cache when possible"""
+    key = (survey.id, survey.updated_at)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = CompiledSurvey.from_json(survey.id, survey.questions_json, survey.updated_at)
+        if survey.id is not None:
+            _compiled.set(key, compiled)
+    return compiled
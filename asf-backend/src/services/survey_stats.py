@@ -0,0 +1,277 @@
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import exists, select
+from src.models.user import Survey, SurveyAnswer, SurveyResponse, SurveyStatistics, SurveyQuestionStatistics, db
+from src.services.survey_schema import CompiledSurvey, compile_survey, is_answered
+
+logger = logging.getLogger(__name__)
+
+# Question types whose answer values are counted (option counts / rating histogram)
+COUNTED_TYPES = ('multiple_choice', 'radio', 'select', 'checkbox', 'rating')
+
+def _count_values(item, value, value_counts):
+    """Add the values of one answer to the value counts of its question"""
+    if item.type not in COUNTED_TYPES:
+        return
+    if isinstance(value, list):
+        values = value
+    elif item.type == 'checkbox':
+        # Checkbox answers are always a list of selected options
+        return
+    else:
+        values = [value]
+    for value in values:
+        key = str(value)
+        value_counts[key] = value_counts.get(key, 0) + 1
+
+def _accumulate(schema, response_data, answered, value_counts):
+    """Add one parsed response to in-memory counters, return the number of answered questions"""
+    answered_questions = 0
+    for item in schema.items:
+        value = response_data.get(item.key)
+        if not is_answered(value):
+            continue
+        answered[item.key] = answered.get(item.key, 0) + 1
+        _count_values(item, value, value_counts.setdefault(item.key, {}))
+        answered_questions += 1
+    return answered_questions
+
+def record_response(survey, response_data):
+    """Update the survey aggregates for a new response, in the caller's transaction.
+
+    The caller is expected to have added the SurveyResponse to the session and to commit afterwards.
+    """
+    stats = db.session.get(SurveyStatistics, survey.id, with_for_update=True)
+    if stats is None:
+        # Created with the survey (or by migration 7): only missing if something bypassed both.
+        # The response is counted by the next rebuild, not rebuilt here in the submit transaction
+        logger.warning('Survey %s has no statistics, rebuild them to include new responses', survey.id)
+        return
+
+    answered = {}
+    value_counts = {}
+    if isinstance(response_data, dict):
+        _accumulate(compile_survey(survey), response_data, answered, value_counts)
+
+    stats.responses_count += 1
+    if not answered:
+        return
+
+    rows = SurveyQuestionStatistics.query.filter(
+        SurveyQuestionStatistics.survey_id == survey.id,
+        SurveyQuestionStatistics.question_id.in_(list(answered.keys()))
+    ).with_for_update().all()
+    rows = {row.question_id: row for row in rows}
+
+    for question_id, count in answered.items():
+        row = rows.get(question_id)
+        if row is None:
+            row = SurveyQuestionStatistics(survey_id=survey.id, question_id=question_id,
+                                           answered_count=0, value_counts_json='{}')
+            db.session.add(row)
+        row.answered_count += count
+        if value_counts.get(question_id):
+            counts = json.loads(row.value_counts_json)
+            for key, increment in value_counts[question_id].items():
+                counts[key] = counts.get(key, 0) + increment
+            row.value_counts_json = json.dumps(counts)
+
+def forget_responses(survey, responses_jsons):
+    """Take responses that are about to be deleted out of the survey aggregates, in the caller's
+    transaction: the inverse of record_response, so a small deletion does not rescan the survey.
+
+    Moves the statistics generation, like a rebuild: caches keyed on it drop the deleted responses.
+    """
+    stats = db.session.get(SurveyStatistics, survey.id, with_for_update=True)
+    if stats is None:
+        return
+    responses_count, answered, value_counts = _aggregate(compile_survey(survey), responses_jsons)
+    if not responses_count:
+        return
+    stats.responses_count = max(stats.responses_count - responses_count, 0)
+    stats.generation = (stats.generation or 0) + 1
+
+    rows = SurveyQuestionStatistics.query.filter(
+        SurveyQuestionStatistics.survey_id == survey.id,
+        SurveyQuestionStatistics.question_id.in_(list(answered.keys()))
+    ).with_for_update().all() if answered else []
+    for row in rows:
+        row.answered_count = max(row.answered_count - answered[row.question_id], 0)
+        if not row.answered_count:
+            # A rebuild only keeps the questions that were answered
+            db.session.delete(row)
+            continue
+        if value_counts.get(row.question_id):
+            counts = json.loads(row.value_counts_json)
+            for key, decrement in value_counts[row.question_id].items():
+                count = counts.get(key, 0) - decrement
+                if count > 0:
+                    counts[key] = count
+                else:
+                    counts.pop(key, None)
+            row.value_counts_json = json.dumps(counts)
+
+def _aggregate(schema, responses_jsons):
+    """(responses count, {question_id: answered}, {question_id: value counts}) of serialized responses"""
+    answered = {}
+    value_counts = {}
+    responses_count = 0
+    for responses_json in responses_jsons:
+        responses_count += 1
+        try:
+            response_data = json.loads(responses_json)
+        except ValueError:
+            continue
+        if isinstance(response_data, dict):
+            _accumulate(schema, response_data, answered, value_counts)
+    return responses_count, answered, value_counts
+
+def rebuild_survey_statistics(survey, batch_size=1000):
+    """Recompute the aggregates of a survey from its stored responses (does not commit)"""
+    SurveyQuestionStatistics.query.filter_by(survey_id=survey.id).delete(synchronize_session=False)
+
+    # Compiled without the cache: the questions may have been changed and not flushed yet
+    schema = CompiledSurvey.from_json(survey.id, survey.questions_json)
+    rows = db.session.query(SurveyResponse.responses_json)\
+                     .filter(SurveyResponse.survey_id == survey.id)\
+                     .execution_options(yield_per=batch_size)
+    responses_count, answered, value_counts = _aggregate(schema, (responses_json for (responses_json,) in rows))
+
+    stats = db.session.get(SurveyStatistics, survey.id)
+    if stats is None:
+        stats = SurveyStatistics(survey_id=survey.id)
+        db.session.add(stats)
+    stats.responses_count = responses_count
+    stats.generation = (stats.generation or 0) + 1
+
+    for question_id, count in answered.items():
+        db.session.add(SurveyQuestionStatistics(
+            survey_id=survey.id,
+            question_id=question_id,
+            answered_count=count,
+            value_counts_json=json.dumps(value_counts.get(question_id, {}))
+        ))
+    return stats
+
+def create_missing_statistics(connection, batch_size=1000):
+    """Build the aggregates of every survey that has none.
+
+    Works on a plain connection so it can run as a schema migration. Returns the number of surveys.
+    """
+    missing = connection.execute(select(Survey.id, Survey.questions_json).where(
+        ~exists().where(SurveyStatistics.survey_id == Survey.id))).all()
+    for survey_id, questions_json in missing:
+        rows = connection.execute(select(SurveyResponse.responses_json)
+                                  .where(SurveyResponse.survey_id == survey_id)
+                                  .execution_options(yield_per=batch_size))
+        responses_count, answered, value_counts = _aggregate(CompiledSurvey.from_json(survey_id, questions_json),
+                                                             (responses_json for (responses_json,) in rows))
+        connection.execute(SurveyQuestionStatistics.__table__.delete()
+                           .where(SurveyQuestionStatistics.survey_id == survey_id))
+        connection.execute(SurveyStatistics.__table__.insert().values(
+            survey_id=survey_id, responses_count=responses_count, generation=1, updated_at=datetime.utcnow()))
+        if answered:
+            connection.execute(SurveyQuestionStatistics.__table__.insert(), [
+                {'survey_id': survey_id, 'question_id': question_id, 'answered_count': count,
+                 'value_counts_json': json.dumps(value_counts.get(question_id, {}))}
+                for question_id, count in answered.items()])
+    return len(missing)
+
+def rebuild_all_statistics():
+    """Recompute the aggregates of every survey, committing after each one"""
+    rebuilt = 0
+    for survey in Survey.query.order_by(Survey.id).all():
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+        rebuilt += 1
+    return rebuilt
+
+def _latest_text_responses(survey, text_question_ids, limit):
+    """Most recent non-empty answers to each text question, from the normalized answers"""
+    text_responses = {}
+    for question_id in text_question_ids:
+        rows = db.session.query(SurveyAnswer.text_value)\
+                         .filter(SurveyAnswer.survey_id == survey.id,
+                                 SurveyAnswer.question_id == question_id,
+                                 SurveyAnswer.text_value != None)\
+                         .order_by(SurveyAnswer.response_id.desc())\
+                         .limit(limit)
+        text_responses[question_id] = [text for (text,) in rows if text.strip()]
+    return text_responses
+
+def rating_counts(value_counts):
+    """Rating histogram {rating: count} from the value counts of a rating question"""
+    counts = {}
+    for value, count in value_counts.items():
+        if value.isdigit():
+            rating = str(int(value))
+            counts[rating] = counts.get(rating, 0) + count
+    return counts
+
+def build_statistics(survey, text_limit=100):
+    """Build the statistics payload of a survey from its aggregates.
+
+    Runs one query per text question (the `text_limit` most recent answers) plus a constant
+    number of queries for the aggregates. A survey without aggregates gets an empty payload:
+    they are never rebuilt here (see the statistics route).
+    """
+    stats = db.session.get(SurveyStatistics, survey.id)
+
+    schema = compile_survey(survey)
+    total_questions = len(schema.items)
+    required_questions = schema.required_count
+    total_responses = stats.responses_count if stats is not None else 0
+
+    result = {
+        'total_responses': total_responses,
+        'total_questions': total_questions,
+        'required_questions': required_questions,
+        'optional_questions': total_questions - required_questions,
+        'completion_percentage': 0,
+        'statistics': {}
+    }
+    if not total_responses:
+        return result
+
+    rows = {row.question_id: row for row in SurveyQuestionStatistics.query.filter_by(survey_id=survey.id)}
+    text_question_ids = [item.key for item in schema.items if item.type == 'text']
+    text_responses = _latest_text_responses(survey, text_question_ids, text_limit) if text_question_ids and text_limit > 0 else {}
+
+    statistics = {}
+    total_answered_questions = 0
+    for item in schema.items:
+        row = rows.get(item.key)
+        answered_count = row.answered_count if row else 0
+        value_counts = json.loads(row.value_counts_json) if row else {}
+        total_answered_questions += answered_count
+
+        question_stats = {
+            'question': item.question,
+            'answered_count': answered_count,
+            'response_rate': (answered_count / total_responses) * 100
+        }
+
+        if item.type in ('multiple_choice', 'radio', 'select', 'checkbox'):
+            question_stats['option_counts'] = value_counts
+        elif item.type == 'rating':
+            counts = rating_counts(value_counts)
+            rated = sum(counts.values())
+            if rated:
+                question_stats['average_rating'] = sum(int(r) * c for r, c in counts.items()) / rated
+                question_stats['rating_counts'] = counts
+        elif item.type == 'text':
+            question_stats['text_responses'] = text_responses.get(item.key, [])
+
+        statistics[f"question_{item.index}"] = question_stats
+
+    total_possible_answers = total_responses * total_questions
+    completion_percentage = (total_answered_questions / total_possible_answers) * 100 if total_possible_answers > 0 else 0
+
+    result.update({
+        'completion_percentage': round(completion_percentage, 2),
+        'total_answered_questions': total_answered_questions,
+        'total_possible_answers': total_possible_answers,
+        'statistics': statistics
+    })
+    return result
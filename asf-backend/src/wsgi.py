@@ -0,0 +1,64 @@
+"""Production entry point.
+
+Run with gunicorn:   gunicorn -c src/gunicorn.conf.py src.wsgi:app
+or without it:       python src/wsgi.py   (gunicorn if installed, otherwise waitress)
+
+Workers and threads come from WEB_CONCURRENCY / WEB_THREADS, the bind address from
+HOST / PORT. Behind a reverse proxy, set TRUSTED_PROXY_COUNT to the number of proxies so
+client addresses are read from X-Forwarded-For; leave it at 0 when clients reach this address
+directly, or they could pick their own address. Each worker is a separate process, so several cores can be used.
+Live statistics streams are served by a second server with gevent workers:
+                     gunicorn -c src/gunicorn_stream.conf.py src.wsgi:app
+the other servers tell stream clients to poll instead.
+The schema must exist first: flask --app src.main init-db (gunicorn.conf.py does it).
+"""
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.models.user import db
+
+app = create_app()
+
+def dispose_engine(server, worker):
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def serve():
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', 5000))
+    workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+    threads = int(os.environ.get('WEB_THREADS', 4))
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class StandaloneApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'{host}:{port}')
+                self.cfg.set('workers', workers)
+                self.cfg.set('threads', threads)
+                self.cfg.set('worker_class', 'gthread')
+                # The app (and its connection pool) was loaded before forking
+                self.cfg.set('post_fork', dispose_engine)
+
+            def load(self):
+                return app
+
+        StandaloneApplication().run()
+        return
+
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        sys.exit('Install gunicorn or waitress to run the production server')
+    # waitress is single-process: only the thread count applies
+    waitress_serve(app, host=host, port=port, threads=workers * threads)
+
+if __name__ == '__main__':
+    serve()
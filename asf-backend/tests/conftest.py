@@ -0,0 +1,72 @@
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from benchmarks.seed import seed
+from src.main import create_app, init_database, seed_admin
+from src.models.user import db
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('asf')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{directory / 'test.db'}",
+        'SURVEY_INGEST_SPILL_DIR': str(directory / 'spill'),
+        'JOB_RESULT_DIR': str(directory / 'jobs'),
+        'TRUSTED_PROXY_COUNT': 0
+    })
+    with app.app_context():
+        init_database()
+        seed_admin()
+    return app
+
+@pytest.fixture(scope='session')
+def survey_ids(app):
+    """Ids of the seeded surveys; the forum and users are seeded alongside"""
+    with app.app_context():
+        return seed(users=30, questions=40, comments=3, surveys=2, survey_questions=6, responses=200)
+
+@pytest.fixture
+def admin_client(app, survey_ids):
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
+
+@pytest.fixture
+def wait_for_job():
+    """Poll a job's status URL until it is finished (or `timeout` seconds); returns the job"""
+    def wait(client, location, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = client.get(location).get_json()
+            if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+                return job
+            time.sleep(0.05)
+    return wait
+
+@pytest.fixture
+def queries(app):
+    """Context manager recording the SQL statements (with parameters) run by the test's thread.
+
+    Background threads (jobs, live statistics) share the engine and are left out.
+    """
+    @contextmanager
+    def record():
+        statements = []
+        thread = threading.get_ident()
+
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() == thread:
+                statements.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return record
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+from src.models.user import Survey, SurveyAnswer, SurveyResponse, db
+from src.services.analytics import frames
+from src.services.survey_answers import build_answers
+from src.services.survey_stats import build_statistics, rebuild_survey_statistics, record_response
+
+def test_frame_counts_match_the_statistics(app, survey_ids):
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[0])
+        frame = frames.get(survey)
+        statistics = build_statistics(survey)
+        assert len(frame) == statistics['total_responses']
+        mask = frame.segment()
+        for item_index, question_id in enumerate(frame.questions):
+            expected = statistics['statistics'][f'question_{item_index}']
+            result = frame.question_statistics(question_id, mask)
+            assert result['answered_count'] == expected['answered_count']
+            if 'option_counts' in expected:
+                assert {k: v for k, v in result['option_counts'].items() if v} == expected['option_counts']
+
+def test_frame_is_rebuilt_after_a_deletion_even_when_the_id_is_reused(app, survey_ids):
+    with app.app_context():
+        # The most recent response of all, so that its id is the one handed out next
+        last = SurveyResponse.query.order_by(SurveyResponse.id.desc()).first()
+        survey = last.survey
+        frames.get(survey)
+        last_id = last.id
+        SurveyAnswer.query.filter_by(response_id=last_id).delete()
+        db.session.delete(last)
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+
+        # Same count, and SQLite hands the deleted id out again
+        data = {'1': 'replacement'}
+        response = SurveyResponse(survey_id=survey.id, responses_json=json.dumps(data),
+                                  submitted_at=datetime.utcnow(), ip_address='127.0.0.1')
+        response.answers = build_answers(survey, data)
+        db.session.add(response)
+        db.session.commit()
+        assert response.id == last_id
+
+        frame = frames.get(survey)
+        ids = [response_id for (response_id,) in db.session.query(SurveyResponse.id)
+               .filter_by(survey_id=survey.id).order_by(SurveyResponse.id)]
+        assert frame.response_ids.tolist() == ids
+        row = frame.response_ids.tolist().index(last_id)
+        assert frame.options['1'].labels[frame.columns['1'][row]] == 'replacement'
+
+def test_response_committed_behind_the_loaded_ids_is_not_skipped(app, survey_ids):
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[1])
+        # Statistics in line with the stored responses, whatever earlier tests added
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+        next_id = db.session.query(db.func.max(SurveyResponse.id)).scalar() + 1
+
+        def submit(response_id, answer):
+            data = {'1': answer}
+            response = SurveyResponse(id=response_id, survey_id=survey.id, responses_json=json.dumps(data),
+                                      submitted_at=datetime.utcnow(), ip_address='127.0.0.1')
+            response.answers = build_answers(survey, data)
+            db.session.add(response)
+            record_response(survey, data)
+            db.session.commit()
+
+        # As on Postgres, where a transaction holding a lower id can commit after a higher one
+        submit(next_id + 1, 'Option 1')
+        assert frames.get(survey).last_response_id == next_id + 1
+        submit(next_id, 'late')
+
+        frame = frames.get(survey)
+        assert len(frame) == SurveyResponse.query.filter_by(survey_id=survey.id).count()
+        row = frame.response_ids.tolist().index(next_id)
+        assert frame.options['1'].labels[frame.columns['1'][row]] == 'late'
@@ -0,0 +1,22 @@
+from datetime import datetime
+from src.services.cache import MemoryCache, ResponseCache
+
+def test_payload_built_across_an_invalidation_is_not_stored(app):
+    cache = ResponseCache(MemoryCache())
+    builds = []
+
+    def stale_build():
+        builds.append('stale')
+        # The data changes and is invalidated while this payload is being built
+        cache.invalidate()
+        return {'title': 'before'}, datetime(2026, 1, 1)
+
+    def build():
+        builds.append('fresh')
+        return {'title': 'after'}, datetime(2026, 1, 2)
+
+    with app.test_request_context():
+        assert cache.json_response('survey', stale_build).get_json() == {'title': 'before'}
+        assert cache.json_response('survey', build).get_json() == {'title': 'after'}
+        assert cache.json_response('survey', build).get_json() == {'title': 'after'}
+    assert builds == ['stale', 'fresh']
@@ -0,0 +1,71 @@
+import gzip
+import json
+from datetime import datetime
+import brotli
+import pytest
+from flask import Flask, Response, jsonify
+from src.services.compression import Compression
+from src.services.json_provider import OrjsonProvider, init_json
+
+PAYLOAD = {'rows': [{'id': i, 'title': f'Question {i}'} for i in range(50)]}
+
+@pytest.fixture
+def client():
+    # A separate app: the application's extensions stay bound to the test app
+    app = Flask(__name__)
+    app.config['COMPRESS_MIN_SIZE'] = 200
+    Compression(app)
+    init_json(app)
+
+    @app.route('/large')
+    def large():
+        response = jsonify(PAYLOAD)
+        response.set_etag('v1')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(PAYLOAD) for _ in range(2)), mimetype='application/json')
+
+    @app.route('/dated')
+    def dated():
+        return jsonify({'at': datetime(2026, 1, 2, 3, 4, 5)})
+
+    return app.test_client()
+
+def get(client, path, accept_encoding=None):
+    return client.get(path, headers={'Accept-Encoding': accept_encoding} if accept_encoding else {})
+
+def test_brotli_is_preferred_when_accepted(client):
+    response = get(client, '/large', 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == PAYLOAD
+    assert int(response.headers['X-Uncompressed-Length']) > len(response.data)
+
+def test_gzip_for_clients_without_brotli(client):
+    response = get(client, '/large', 'gzip')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+
+def test_compressed_response_varies_on_accept_encoding_with_a_weak_etag(client):
+    compressed = get(client, '/large', 'gzip')
+    plain = get(client, '/large')
+    assert 'Content-Encoding' not in plain.headers
+    for response in (compressed, plain):
+        assert 'Accept-Encoding' in response.headers['Vary']
+    assert compressed.headers['ETag'] == 'W/"v1"'
+    assert plain.headers['ETag'] == '"v1"'
+
+def test_small_and_streamed_responses_are_not_compressed(client):
+    assert 'Content-Encoding' not in get(client, '/small', 'gzip, br').headers
+    response = get(client, '/stream', 'gzip, br')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data(as_text=True) == json.dumps(PAYLOAD) * 2
+
+def test_orjson_encodes_datetimes_like_flask(client):
+    assert isinstance(client.application.json, OrjsonProvider)
+    assert get(client, '/dated').get_json() == {'at': 'Fri, 02 Jan 2026 03:04:05 GMT'}
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+import pytest
+from src.models.user import Survey, SurveyResponse, SurveyStatistics, db
+from src.services.purge import delete_target
+from src.services.survey_schema import compile_survey
+
+QUESTIONS = [
+    {'id': 1, 'type': 'radio', 'text': 'Couleur', 'options': ['Rouge', 'Bleu']},
+    {'id': 2, 'type': 'checkbox', 'text': 'Langues', 'options': ['fr', 'en', 'ar']},
+    {'type': 'rating'},
+]
+
+@pytest.fixture(scope='module')
+def survey_id(app, survey_ids):
+    with app.app_context():
+        survey = Survey(title='Export', questions_json=json.dumps(QUESTIONS), is_active=False)
+        survey.statistics = SurveyStatistics(responses_count=0)
+        survey.responses = [
+            SurveyResponse(responses_json=json.dumps({'1': 'Rouge', '2': ['fr', 'en'], 'question_2': 4}),
+                           ip_address='127.0.0.1'),
+            SurveyResponse(responses_json='{not json', ip_address='127.0.0.2'),
+        ]
+        db.session.add(survey)
+        db.session.commit()
+        survey_id = survey.id
+    yield survey_id
+    with app.app_context():
+        delete_target('survey', survey_id)
+
+def export(admin_client, survey_id, export_format):
+    response = admin_client.get(f'/api/admin/surveys/{survey_id}/export?format={export_format}')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == \
+        f'attachment; filename=survey_{survey_id}_responses.{export_format}'
+    return response.get_data(as_text=True)
+
+def test_csv_has_one_column_per_question_in_order(app, admin_client, survey_id):
+    rows = list(csv.reader(io.StringIO(export(admin_client, survey_id, 'csv'))))
+
+    with app.app_context():
+        items = compile_survey(db.session.get(Survey, survey_id)).items
+    assert rows[0] == ['id', 'submitted_at', 'user_id', 'username', 'ip_address'] + \
+        [item.question.get('text') or item.key for item in items]
+    assert rows[0][-3:] == ['Couleur', 'Langues', 'question_2']
+    # Checkbox answers in one cell; unparseable responses keep their row with empty answers
+    assert rows[1][-3:] == ['Rouge', 'fr; en', '4']
+    assert rows[2][4:] == ['127.0.0.2', '', '', '']
+    assert len(rows) == 3
+
+def test_ndjson_has_one_object_per_response(admin_client, survey_id):
+    lines = [json.loads(line) for line in export(admin_client, survey_id, 'ndjson').splitlines()]
+
+    assert [line['answers'] for line in lines] == [
+        {'1': 'Rouge', '2': ['fr', 'en'], 'question_2': 4},
+        {'1': None, '2': None, 'question_2': None},
+    ]
+    assert lines[1]['ip_address'] == '127.0.0.2'
+
+def test_unknown_export_format_is_rejected(admin_client, survey_id):
+    response = admin_client.get(f'/api/admin/surveys/{survey_id}/export?format=xlsx')
+    assert response.status_code == 400
+    assert 'csv, ndjson' in response.get_json()['error']
@@ -0,0 +1,18 @@
+import pytest
+
+@pytest.mark.parametrize('url, key', [
+    ('/api/admin/questions?per_page=5&expand=author', 'questions'),
+    ('/api/admin/comments?per_page=5&expand=author', 'comments'),
+])
+def test_expanded_author_has_no_route_computed_fields(admin_client, url, key):
+    response = admin_client.get(url)
+    assert response.status_code == 200
+    authors = [item['author'] for item in response.get_json()[key] if item['author'] is not None]
+    assert authors
+    for author in authors:
+        assert 'email' in author and 'created_at' in author
+        assert 'activity' not in author
+
+def test_user_listing_still_computes_activity(admin_client):
+    users = admin_client.get('/api/users?per_page=5').get_json()['users']
+    assert all(isinstance(user['activity'], dict) for user in users)
@@ -0,0 +1,106 @@
+import json
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from src.models.user import SurveyResponse
+from src.services import ingest
+from src.services.ingest import ingestor
+
+def make_record(survey_id, answer):
+    return {
+        'submission_id': uuid.uuid4().hex,
+        'survey_id': survey_id,
+        'user_id': None,
+        'responses': {'1': answer},
+        'ip_address': '127.0.0.1',
+        'submitted_at': datetime.utcnow().isoformat()
+    }
+
+def test_poison_record_is_dead_lettered_and_the_batch_committed(app, survey_ids, monkeypatch):
+    build_answers = ingest.build_answers
+
+    def failing_build_answers(survey, responses):
+        if responses.get('1') == 'poison':
+            raise ValueError('cannot normalize')
+        return build_answers(survey, responses)
+
+    monkeypatch.setattr(ingest, 'build_answers', failing_build_answers)
+    monkeypatch.setitem(app.config, 'SURVEY_INGEST_MAX_RETRIES', 1)
+    records = [make_record(survey_ids[1], 'Option 1'), make_record(survey_ids[1], 'poison'),
+               make_record(survey_ids[1], 'Option 2')]
+    dead_letters = ingestor.dead_letters
+
+    with app.app_context():
+        assert ingestor.write_records(records) == 2
+        written = {sid for (sid,) in SurveyResponse.query.with_entities(SurveyResponse.submission_id)
+                   .filter(SurveyResponse.submission_id.in_([r['submission_id'] for r in records]))}
+
+    assert written == {records[0]['submission_id'], records[2]['submission_id']}
+    assert ingestor.dead_letters == dead_letters + 1
+    with open(app.config['SURVEY_INGEST_DEAD_LETTER'], encoding='utf-8') as f:
+        dead = [json.loads(line) for line in f]
+    assert dead[-1]['submission_id'] == records[1]['submission_id']
+    assert 'cannot normalize' in dead[-1]['error']
+
+def test_submission_to_a_deleted_survey_is_dead_lettered(app, survey_ids):
+    records = [make_record(survey_ids[1], 'Option 1'), make_record(999999, 'Option 1')]
+    dead_letters = ingestor.dead_letters
+
+    with app.app_context():
+        assert ingestor.write_records(records) == 1
+
+    assert ingestor.dead_letters == dead_letters + 1
+    with open(app.config['SURVEY_INGEST_DEAD_LETTER'], encoding='utf-8') as f:
+        dead = [json.loads(line) for line in f]
+    assert dead[-1]['submission_id'] == records[1]['submission_id']
+    assert 'no longer exists' in dead[-1]['error']
+
+def valid_responses(app, survey_id):
+    with app.app_context():
+        return json.loads(SurveyResponse.query.filter_by(survey_id=survey_id).first().responses_json)
+
+def wait_until_written(timeout=5):
+    deadline = time.monotonic() + timeout
+    while ingestor.pending() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return ingestor.pending() == 0
+
+def test_submission_is_written_synchronously_when_it_cannot_be_spilled(app, survey_ids, monkeypatch):
+    monkeypatch.setitem(app.config, 'SURVEY_INGEST_MODE', 'batched')
+    client = app.test_client()
+    responses = valid_responses(app, survey_ids[0])
+
+    def locked(fd, operation):
+        raise BlockingIOError('locked by another worker')
+
+    monkeypatch.setattr(ingest, 'fcntl', SimpleNamespace(flock=locked, LOCK_EX=0, LOCK_NB=0))
+    response = client.post(f'/api/surveys/{survey_ids[0]}/submit', json={'responses': responses})
+    assert response.status_code == 201
+    assert response.get_json()['response_id']
+
+    monkeypatch.undo()
+    monkeypatch.setitem(app.config, 'SURVEY_INGEST_MODE', 'batched')
+    response = client.post(f'/api/surveys/{survey_ids[0]}/submit', json={'responses': responses})
+    assert response.status_code == 202
+    assert wait_until_written()
+
+def test_writer_thread_survives_a_failing_batch(app, survey_ids, monkeypatch):
+    monkeypatch.setitem(app.config, 'SURVEY_INGEST_MODE', 'batched')
+    write_records = ingestor.write_records
+    failures = []
+
+    def disk_full(records):
+        # e.g. the dead-letter file of a poison record cannot be written
+        if not failures:
+            failures.append(records)
+            raise OSError(28, 'No space left on device')
+        return write_records(records)
+
+    monkeypatch.setattr(ingestor, 'write_records', disk_full)
+    with app.app_context():
+        submission_id = ingestor.submit(survey_ids[0], None, valid_responses(app, survey_ids[0]), '127.0.0.1')
+        assert submission_id is not None
+        assert wait_until_written()
+        assert failures
+        assert SurveyResponse.query.filter_by(submission_id=submission_id).count() == 1
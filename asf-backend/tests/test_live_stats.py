@@ -0,0 +1,64 @@
+import json
+import pytest
+from src.models.user import Survey, SurveyResponse, db
+from src.services.live_stats import live_stats
+from src.services.survey_stats import rebuild_survey_statistics, record_response
+
+def stream_url(survey_id):
+    return f'/api/admin/surveys/{survey_id}/statistics/stream'
+
+def fallback_event(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert 'event: fallback' in body
+    return json.loads(body.split('data: ', 1)[1])
+
+def test_threaded_worker_tells_the_client_to_poll(app, survey_ids, admin_client):
+    data = fallback_event(admin_client.get(stream_url(survey_ids[0])))
+    assert data == {'reason': 'unavailable', 'poll_seconds': app.config['SURVEY_STREAM_FALLBACK_POLL_SECONDS']}
+    assert live_stats.clients() == 0
+
+def test_client_above_the_cap_is_told_to_poll(app, survey_ids, admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SURVEY_STREAM_ASYNC_ONLY', False)
+    monkeypatch.setitem(app.config, 'SURVEY_STREAM_MAX_CLIENTS', 0)
+    assert fallback_event(admin_client.get(stream_url(survey_ids[0])))['reason'] == 'busy'
+
+@pytest.fixture
+def subscription(app, survey_ids, monkeypatch):
+    """Subscriber of the first seeded survey, with the hub thread left off: the test ticks it"""
+    monkeypatch.setattr(live_stats, '_start', lambda: None)
+    subscription = live_stats.subscribe(survey_ids[0])
+    yield subscription
+    live_stats.unsubscribe(subscription)
+
+def next_event(subscription):
+    return subscription.events.get_nowait()
+
+def test_new_response_is_sent_as_a_delta_and_a_rebuild_as_a_reset(app, subscription):
+    survey_id = subscription.survey_id
+    with app.app_context():
+        live_stats.tick(survey_id)
+        name, data = next_event(subscription)
+        assert name == 'sync'
+        total = data['total_responses']
+
+        survey = db.session.get(Survey, survey_id)
+        responses = {'1': 'Option 2'}
+        db.session.add(SurveyResponse(survey_id=survey_id, responses_json=json.dumps(responses), ip_address='127.0.0.1'))
+        record_response(survey, responses)
+        db.session.commit()
+        live_stats.tick(survey_id)
+        name, data = next_event(subscription)
+        assert name == 'stats'
+        assert (data['previous_total'], data['total_responses'], data['new_responses']) == (total, total + 1, 1)
+        assert data['questions'] == {'question_0': {'answered_count': 1, 'option_counts': {'Option 2': 1}}}
+
+        # Same number of responses, but the aggregates may be keyed differently now
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+        live_stats.tick(survey_id)
+        assert next_event(subscription) == ('reset', {'reason': 'rebuilt'})
+
+        live_stats.tick(survey_id)
+        assert subscription.events.empty()
@@ -0,0 +1,40 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from src.models.user import User, db
+from src.services.passwords import HasherBusy, hasher
+
+@pytest.fixture
+def outdated_user(app):
+    """A user whose password hash was made with other parameters than the configured method"""
+    with app.app_context():
+        user = User.query.filter_by(username='outdated').first()
+        if user is None:
+            user = User(username='outdated', email='outdated@example.com')
+            db.session.add(user)
+        user.password_hash = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+        db.session.commit()
+        yield user.id
+        db.session.delete(db.session.get(User, user.id))
+        db.session.commit()
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+def test_login_rehashes_an_outdated_hash(app, outdated_user):
+    response = app.test_client().post('/api/login', json={'username': 'outdated', 'password': 'secret'})
+
+    assert response.status_code == 200
+    assert not hasher.needs_rehash(stored_hash(app, outdated_user))
+
+def test_login_skips_the_rehash_when_the_pool_is_busy(app, outdated_user, monkeypatch):
+    before = stored_hash(app, outdated_user)
+
+    def busy(password):
+        raise HasherBusy()
+
+    monkeypatch.setattr(hasher, 'hash', busy)
+    response = app.test_client().post('/api/login', json={'username': 'outdated', 'password': 'secret'})
+
+    assert response.status_code == 200
+    assert stored_hash(app, outdated_user) == before
@@ -0,0 +1,13 @@
+def test_metrics_are_not_public(app):
+    assert app.test_client().get('/api/metrics').status_code == 401
+
+def test_metrics_for_admins(admin_client):
+    response = admin_client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+def test_metrics_for_scrapers_with_the_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    client = app.test_client()
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+    assert client.get('/api/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
@@ -0,0 +1,48 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from src.services.migrations import MIGRATIONS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema of a database created before any migration existed
+BASELINE_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, email VARCHAR(120) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL, is_admin BOOLEAN NOT NULL, company VARCHAR(200), created_at DATETIME,
+    is_active BOOLEAN NOT NULL);
+CREATE TABLE question (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, content TEXT NOT NULL, created_at DATETIME,
+    updated_at DATETIME, is_active BOOLEAN NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id));
+CREATE TABLE comment (id INTEGER PRIMARY KEY, content TEXT NOT NULL, created_at DATETIME, updated_at DATETIME,
+    is_active BOOLEAN NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id),
+    question_id INTEGER NOT NULL REFERENCES question (id));
+CREATE TABLE survey (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, description TEXT, questions_json TEXT NOT NULL,
+    is_active BOOLEAN NOT NULL, created_at DATETIME, updated_at DATETIME);
+CREATE TABLE survey_response (id INTEGER PRIMARY KEY, survey_id INTEGER NOT NULL REFERENCES survey (id),
+    user_id INTEGER REFERENCES user (id), responses_json TEXT NOT NULL, submitted_at DATETIME, ip_address VARCHAR(45));
+"""
+
+def test_migrate_upgrades_a_baseline_database(tmp_path):
+    path = tmp_path / 'baseline.db'
+    questions = [{'id': 1, 'type': 'radio', 'question': 'Satisfait ?', 'options': ['Oui', 'Non']}]
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+        connection.execute("INSERT INTO user VALUES (1, 'alice', 'alice@example.com', 'x', 0, NULL, NULL, 1)")
+        connection.execute("INSERT INTO question VALUES (1, 'Audit', 'Question', NULL, NULL, 1, 1)")
+        connection.execute('INSERT INTO survey VALUES (1, ?, NULL, ?, 1, NULL, NULL)', ('Survey', json.dumps(questions)))
+        connection.executemany('INSERT INTO survey_response VALUES (?, 1, 1, ?, NULL, NULL)',
+                               [(1, json.dumps({'1': 'Oui'})), (2, json.dumps({'1': 'Non'}))])
+
+    # In its own process, like gunicorn.conf.py runs it: the extensions are bound to one app per process
+    environment = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', BACKGROUND_TASKS='0')
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'src.main', 'migrate'], cwd=BACKEND_DIR,
+                            env=environment, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    with sqlite3.connect(path) as connection:
+        assert {version for (version,) in connection.execute('SELECT version FROM schema_migration')} == \
+            {version for version, _, _ in MIGRATIONS}
+        assert 'submission_id' in {row[1] for row in connection.execute('PRAGMA table_info(survey_response)')}
+        assert connection.execute('SELECT COUNT(*) FROM survey_answer').fetchone() == (2,)
+        assert connection.execute('SELECT responses_count FROM survey_statistics WHERE survey_id = 1').fetchone() == (2,)
@@ -0,0 +1,46 @@
+from sqlalchemy import create_engine, text
+from src.models.user import User, db
+from src.services.migrations import _require_sort_timestamps
+from src.services.pagination import MAX_PER_PAGE
+
+def test_offset_pages_are_clamped_too(admin_client):
+    data = admin_client.get('/api/admin/comments?per_page=1000').get_json()
+    assert data['total'] > MAX_PER_PAGE
+    assert len(data['comments']) == MAX_PER_PAGE
+    assert data['pages'] == -(-data['total'] // MAX_PER_PAGE)
+
+def test_missing_timestamps_are_backfilled_with_the_oldest_one():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        for table_name, column_name in (('user', 'created_at'), ('question', 'created_at'),
+                                        ('comment', 'created_at'), ('survey_response', 'submitted_at')):
+            # Tables created before the columns were NOT NULL
+            connection.execute(text(f'CREATE TABLE "{table_name}" (id INTEGER PRIMARY KEY, {column_name} DATETIME)'))
+        connection.execute(text("INSERT INTO comment VALUES (1, '2026-01-02 00:00:00.000000'), "
+                                "(2, NULL), (3, '2026-01-01 00:00:00.000000')"))
+        connection.execute(text('INSERT INTO "user" VALUES (1, NULL)'))
+        _require_sort_timestamps(connection)
+        assert connection.execute(text('SELECT created_at FROM comment WHERE id = 2')).scalar() == \
+            '2026-01-01 00:00:00.000000'
+        assert connection.execute(text('SELECT created_at FROM "user"')).scalar() is not None
+
+def add_users(app, *usernames):
+    with app.app_context():
+        db.session.add_all([User(username=name, email=f'{index}-{name}@example.org', password_hash='x')
+                            for index, name in enumerate(usernames)])
+        db.session.commit()
+
+def usernames(admin_client, term):
+    response = admin_client.get('/api/users', query_string={'q': term, 'fields': 'username'})
+    assert response.status_code == 200
+    return {user['username'] for user in response.get_json()['users']}
+
+def test_user_search_folds_accented_letters(app, admin_client):
+    add_users(app, 'Émilie', 'élodie', 'Emma')
+    assert usernames(admin_client, 'é') == {'Émilie', 'élodie'}
+    assert usernames(admin_client, 'ÉMI') == {'Émilie'}
+
+def test_user_search_ending_with_the_last_code_point(app, admin_client):
+    last = chr(0x10FFFF)
+    add_users(app, f'zz{last}a', 'z{')
+    assert usernames(admin_client, f'zz{last}') == {f'zz{last}a'}
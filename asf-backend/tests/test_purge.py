@@ -0,0 +1,98 @@
+import json
+import time
+from datetime import datetime, timedelta
+from src.models.user import Job, Question, Survey, SurveyResponse, User, db
+from src.services import purge, survey_stats
+from src.services.jobs import jobs
+from src.services.survey_answers import build_answers
+from src.services.survey_stats import build_statistics, rebuild_survey_statistics, record_response
+
+def test_large_user_is_purged_by_a_job(app, admin_client, wait_for_job, monkeypatch):
+    monkeypatch.setitem(app.config, 'PURGE_INLINE_LIMIT', 0)
+    monkeypatch.setitem(app.config, 'PURGE_BATCH_SIZE', 2)
+    monkeypatch.setitem(app.config, 'PURGE_PAUSE_MS', 0)
+    with app.app_context():
+        user = User(username='purged', email='purged@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([Question(title=f'Question {i}', content='...', user_id=user.id) for i in range(5)])
+        db.session.commit()
+        user_id = user.id
+
+    response = admin_client.delete(f'/api/users/{user_id}')
+    assert response.status_code == 202
+    assert response.get_json()['job']['kind'] == 'purge-user'
+    job = wait_for_job(admin_client, response.headers['Location'])
+
+    assert job['status'] == 'succeeded', job
+    assert job['done'] == job['total'] == 6
+    with app.app_context():
+        assert db.session.get(User, user_id) is None
+        assert Question.query.filter_by(user_id=user_id).count() == 0
+
+def test_interrupted_purge_is_queued_again(app):
+    stale = datetime.utcnow() - timedelta(seconds=app.config['JOB_STALE_SECONDS'] + 1)
+    with app.app_context():
+        # A survey that no longer exists: resuming its purge has nothing left to delete
+        purge = Job(kind='purge-survey', params_json='{"survey_id": 999999}', status='running', updated_at=stale)
+        export = Job(kind='export-responses', params_json='{}', status='running', updated_at=stale)
+        db.session.add_all([purge, export])
+        db.session.commit()
+
+        jobs.fail_stale()
+        db.session.expire_all()
+
+        assert export.status == 'failed'
+        assert purge.status != 'failed' and purge.error is None
+
+def test_job_run_in_the_foreground_sends_heartbeats(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_POLL_SECONDS', 0.05)
+    started = datetime.utcnow() - timedelta(seconds=30)
+
+    def slow(job):
+        # No progress() calls: only the runner's heartbeat keeps the job fresh
+        time.sleep(0.3)
+        with db.engine.connect() as connection:
+            return {'beat': connection.execute(db.select(Job.updated_at).where(Job.id == job.id)).scalar() > started}
+
+    monkeypatch.setitem(jobs.tasks, 'slow', jobs.tasks['purge-survey']._replace(function=slow))
+    with app.app_context():
+        # Claimed, as `flask run-jobs` does before running it
+        job = Job(kind='slow', params_json='{}', status='running', started_at=started, updated_at=started)
+        db.session.add(job)
+        db.session.commit()
+
+        job = jobs.run(job.id)
+
+        assert job.status == 'succeeded', job.error
+        assert job.result_json == '{"beat": true}'
+
+def test_inline_purge_takes_the_responses_out_of_the_statistics(app, admin_client, survey_ids, monkeypatch):
+    def rescan(survey):
+        raise AssertionError('the survey was rescanned')
+
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[0])
+        rebuild_survey_statistics(survey)
+        db.session.commit()
+        expected = build_statistics(survey, text_limit=0)
+        user = User(username='respondent', email='respondent@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        for response in SurveyResponse.query.filter_by(survey_id=survey.id).limit(3).all():
+            data = json.loads(response.responses_json)
+            db.session.add(SurveyResponse(survey_id=survey.id, user_id=user.id, responses_json=response.responses_json,
+                                          ip_address='127.0.0.1', answers=build_answers(survey, data)))
+            record_response(survey, data)
+        db.session.commit()
+        user_id = user.id
+        assert build_statistics(survey, text_limit=0) != expected
+
+    monkeypatch.setattr(purge, 'rebuild_survey_statistics', rescan)
+    monkeypatch.setattr(survey_stats, 'rebuild_survey_statistics', rescan)
+    response = admin_client.delete(f'/api/users/{user_id}')
+    assert response.status_code == 204
+
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[0])
+        assert build_statistics(survey, text_limit=0) == expected
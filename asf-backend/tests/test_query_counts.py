@@ -0,0 +1,39 @@
+"""Number of SQL statements per list endpoint.
+
+Each endpoint runs a fixed number of statements whatever the page size: related rows and
+counts are loaded with joins, IN-batches or aggregates, never one query per item (N+1).
+A change in these numbers means a route started issuing per-row queries, or stopped needing
+some; only lower an expected count, never raise it to make a test pass.
+"""
+import pytest
+from src.routes.survey import survey_cache
+
+# (url, statements per request); {question} and {survey} are replaced by seeded ids
+LIST_ENDPOINTS = [
+    ('/api/questions?per_page={per_page}', 2),  # page with comment counts + total
+    ('/api/questions?per_page={per_page}&cursor=', 1),
+    ('/api/questions/{question}?comments_per_page={per_page}', 3),  # question with count + comments + authors
+    ('/api/questions/{question}/comments?per_page={per_page}', 3),  # question + comments + authors
+    ('/api/admin/questions?per_page={per_page}', 2),
+    ('/api/admin/comments?per_page={per_page}', 2),
+    ('/api/search?q=audit&per_page={per_page}', 2),
+    ('/api/surveys/active', 1),
+    ('/api/admin/surveys', 1),
+    ('/api/admin/surveys/{survey}/responses?per_page={per_page}', 3),  # survey + page + total
+    ('/api/admin/surveys/{survey}/responses?per_page={per_page}&fields=id,user&expand=survey', 3),
+    ('/api/users?per_page={per_page}', 3),  # page + total + activity counts
+    ('/api/users?per_page={per_page}&q=user', 3),
+    ('/api/admin/jobs?limit={per_page}', 1),
+    ('/api/admin/jobs?kind=purge-user&limit={per_page}', 1),
+]
+
+@pytest.mark.parametrize('url, expected', LIST_ENDPOINTS)
+def test_list_endpoint_statement_count(admin_client, queries, survey_ids, url, expected):
+    for per_page in (5, 20):
+        target = url.format(per_page=per_page, question=1, survey=survey_ids[0])
+        admin_client.get(target)  # Warm the admin session and compiled-survey caches
+        survey_cache.invalidate()
+        with queries() as statements:
+            response = admin_client.get(target)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert len(statements) == expected, [statement for statement, _ in statements]
@@ -0,0 +1,42 @@
+"""The hot list queries are served by the composite indexes (migrations 1 and 5).
+
+The statements an endpoint actually runs are captured and explained with SQLite's EXPLAIN
+QUERY PLAN; the expected index must appear in the plan of the endpoint's main query, and
+that table must not be scanned without an index.
+"""
+import re
+import pytest
+from sqlalchemy import text
+from src.models.user import db
+
+# (url, table of the main query, index expected in its plan)
+HOT_QUERIES = [
+    ('/api/questions?per_page=20', 'question', 'ix_question_active_created'),
+    ('/api/admin/questions?per_page=20', 'question', 'ix_question_created'),
+    ('/api/questions/1/comments?per_page=20', 'comment', 'ix_comment_question_active_created'),
+    ('/api/admin/comments?per_page=20', 'comment', 'ix_comment_created'),
+    ('/api/admin/surveys/{survey}/responses?per_page=20', 'survey_response', 'ix_survey_response_survey_submitted'),
+    ('/api/users?per_page=20', 'user', 'ix_user_username_lower'),
+    ('/api/users?per_page=20&q=user1', 'user', 'ix_user_username_lower'),
+    ('/api/users?per_page=20&sort=created_at', 'user', 'ix_user_created'),
+]
+
+def explain(statement, parameters):
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return [row[-1] for row in rows]
+
+@pytest.mark.parametrize('url, table, index', HOT_QUERIES)
+def test_hot_query_uses_index(app, admin_client, queries, survey_ids, url, table, index):
+    target = url.format(survey=survey_ids[0])
+    admin_client.get(target)
+    with queries() as statements:
+        response = admin_client.get(target)
+    assert response.status_code == 200
+
+    with app.app_context():
+        plans = [explain(statement, parameters) for statement, parameters in statements
+                 if statement.lstrip().upper().startswith('SELECT')]
+    assert any(f'INDEX {index}' in step for plan in plans for step in plan), plans
+    full_scan = re.compile(rf'^SCAN {table}\b(?! USING)')
+    assert not any(full_scan.match(step) for plan in plans for step in plan), plans
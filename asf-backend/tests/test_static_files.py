@@ -0,0 +1,90 @@
+import gzip
+import os
+import brotli
+import pytest
+from flask import Flask
+from src.services.static_files import StaticFiles
+
+INDEX = b'<!doctype html><div id="root"></div>'
+SCRIPT = b'console.log("asf");\n' * 50
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_bytes(INDEX)
+    (tmp_path / 'favicon.ico').write_bytes(b'\x00' * 10)
+    (tmp_path / 'assets' / 'index-B2xZ3q9a.js').write_bytes(SCRIPT)
+    return tmp_path
+
+def make_client(dist):
+    # A separate app: the application's static_files stays bound to the test app
+    app = Flask(__name__, static_folder=None)
+    # Set after creation so Flask adds no /static route of its own, as the catch-all serves it
+    app.static_folder = str(dist)
+    static_files = StaticFiles(app)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        response = static_files.response(path)
+        return response if response is not None else ('index.html not found', 404)
+
+    return static_files, app.test_client()
+
+def test_manifest_lists_files_without_their_variants(dist):
+    (dist / 'assets' / 'index-B2xZ3q9a.js.gz').write_bytes(gzip.compress(SCRIPT))
+    static_files, _ = make_client(dist)
+
+    assert set(static_files.manifest) == {'index.html', 'favicon.ico', 'assets/index-B2xZ3q9a.js'}
+    assert set(static_files.lookup('assets/index-B2xZ3q9a.js').variants) == {'identity', 'gzip'}
+    assert static_files.lookup('surveys/3/stats') is static_files.manifest['index.html']
+
+def test_precompressed_variant_is_served_to_clients_that_accept_it(dist):
+    static_files, client = make_client(dist)
+    assert static_files.compress() == 2
+
+    response = client.get('/assets/index-B2xZ3q9a.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == SCRIPT
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    response = client.get('/assets/index-B2xZ3q9a.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == SCRIPT
+
+    response = client.get('/assets/index-B2xZ3q9a.js')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == SCRIPT
+
+def test_stale_variant_is_ignored(dist):
+    script = dist / 'assets' / 'index-B2xZ3q9a.js'
+    (dist / 'assets' / 'index-B2xZ3q9a.js.gz').write_bytes(gzip.compress(b'old build'))
+    os.utime(script, (script.stat().st_atime, script.stat().st_mtime + 10))
+    _, client = make_client(dist)
+
+    response = client.get('/assets/index-B2xZ3q9a.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == SCRIPT
+
+def test_hashed_assets_are_immutable_and_other_files_revalidated(dist):
+    _, client = make_client(dist)
+
+    asset = client.get('/assets/index-B2xZ3q9a.js')
+    assert asset.cache_control.immutable
+    assert asset.cache_control.max_age == 365 * 24 * 3600
+
+    index = client.get('/')
+    assert index.cache_control.no_cache and not index.cache_control.immutable
+    assert client.get('/', headers={'If-None-Match': index.headers['ETag']}).status_code == 304
+
+def test_client_side_routes_get_index_html(dist):
+    _, client = make_client(dist)
+
+    response = client.get('/surveys/3/stats')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/html'
+    assert response.data == INDEX
+
+def test_missing_build_is_a_404(tmp_path):
+    _, client = make_client(tmp_path)
+    assert client.get('/forum').status_code == 404
@@ -0,0 +1,63 @@
+import json
+import pytest
+from src.models.user import Survey, SurveyResponse, SurveyStatistics, db
+from src.services.purge import delete_target
+from src.services.survey_schema import MAX_TEXT_LENGTH
+
+QUESTIONS = [
+    {'id': 1, 'type': 'radio', 'question': 'Couleur', 'options': ['Rouge', 'Bleu'], 'required': True},
+    {'id': 2, 'type': 'checkbox', 'question': 'Langues', 'options': ['fr', 'en', 'ar']},
+    {'id': 3, 'type': 'rating', 'question': 'Note', 'min': 1, 'max': 5},
+    {'id': 4, 'type': 'text', 'question': 'Commentaire'},
+]
+
+@pytest.fixture(scope='module')
+def survey_id(app, survey_ids):
+    with app.app_context():
+        survey = Survey(title='Validation', questions_json=json.dumps(QUESTIONS), is_active=True)
+        survey.statistics = SurveyStatistics(responses_count=0)
+        db.session.add(survey)
+        db.session.commit()
+        survey_id = survey.id
+    yield survey_id
+    with app.app_context():
+        delete_target('survey', survey_id)
+
+def submit(app, survey_id, responses):
+    return app.test_client().post(f'/api/surveys/{survey_id}/submit', json={'responses': responses})
+
+@pytest.mark.parametrize('responses, question, message', [
+    ({'3': 4}, '1', 'this question is required'),
+    ({'1': 'Vert'}, '1', "unknown option 'Vert'"),
+    ({'1': ['Rouge']}, '1', 'a single option is expected'),
+    ({'1': 'Rouge', '2': ['fr', 'de']}, '2', "unknown option(s) 'de'"),
+    ({'1': 'Rouge', '3': 6}, '3', 'a whole number between 1 and 5 is expected'),
+    ({'1': 'Rouge', '3': 3.5}, '3', 'a whole number between 1 and 5 is expected'),
+    ({'1': 'Rouge', '3': 'beaucoup'}, '3', 'a number is expected'),
+    ({'1': 'Rouge', '4': 'x' * (MAX_TEXT_LENGTH + 1)}, '4', f'at most {MAX_TEXT_LENGTH} characters are allowed'),
+    (['Rouge'], 'responses', 'an object mapping question ids to answers is expected'),
+])
+def test_invalid_submission_is_rejected(app, survey_id, responses, question, message):
+    with app.app_context():
+        before = SurveyResponse.query.filter_by(survey_id=survey_id).count()
+
+    response = submit(app, survey_id, responses)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid responses', 'details': {question: message}}
+    with app.app_context():
+        assert SurveyResponse.query.filter_by(survey_id=survey_id).count() == before
+
+def test_every_problem_is_reported_at_once(app, survey_id):
+    response = submit(app, survey_id, {'2': ['de'], '3': 9})
+    assert response.status_code == 400
+    assert set(response.get_json()['details']) == {'1', '2', '3'}
+
+def test_submission_is_stored_in_canonical_form(app, survey_id):
+    response = submit(app, survey_id, {'1': 'Bleu', '2': ['fr', 'fr', 'en'], '3': '4', '4': '', '99': 'ignored'})
+
+    assert response.status_code == 201
+    with app.app_context():
+        stored = db.session.get(SurveyResponse, response.get_json()['response_id'])
+        # Unknown keys and unanswered questions are dropped, values typed
+        assert json.loads(stored.responses_json) == {'1': 'Bleu', '2': ['fr', 'en'], '3': 4}
@@ -0,0 +1,79 @@
+import json
+from src.models.user import Survey, SurveyQuestionStatistics, SurveyResponse, SurveyStatistics, db
+from src.services.survey_stats import build_statistics, create_missing_statistics, record_response
+
+def drop_statistics(survey_id):
+    SurveyQuestionStatistics.query.filter_by(survey_id=survey_id).delete()
+    SurveyStatistics.query.filter_by(survey_id=survey_id).delete()
+    db.session.commit()
+
+def test_missing_statistics_are_created_like_a_rebuild(app, survey_ids):
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[0])
+        expected = build_statistics(survey)
+        drop_statistics(survey.id)
+        with db.engine.begin() as connection:
+            assert create_missing_statistics(connection) == 1
+            assert create_missing_statistics(connection) == 0
+        db.session.expire_all()
+        assert build_statistics(survey) == expected
+
+def test_submission_without_statistics_does_not_rebuild_them(app, survey_ids):
+    with app.app_context():
+        survey = db.session.get(Survey, survey_ids[0])
+        drop_statistics(survey.id)
+        responses = {'1': 'Option 1'}
+        db.session.add(SurveyResponse(survey_id=survey.id, responses_json=json.dumps(responses), ip_address='127.0.0.1'))
+        record_response(survey, responses)
+        db.session.commit()
+        assert db.session.get(SurveyStatistics, survey.id) is None
+
+        with db.engine.begin() as connection:
+            create_missing_statistics(connection)
+        db.session.expire_all()
+        count = SurveyResponse.query.filter_by(survey_id=survey.id).count()
+        assert db.session.get(SurveyStatistics, survey.id).responses_count == count
+
+def test_question_edit_is_not_saved_when_its_rebuild_cannot_be_queued(app, admin_client, survey_ids, monkeypatch):
+    monkeypatch.setitem(app.config, 'SURVEY_REBUILD_INLINE_LIMIT', 0)
+    monkeypatch.setitem(app.config, 'JOB_MAX_QUEUED', 0)
+    with app.app_context():
+        before = db.session.get(Survey, survey_ids[1]).questions_json
+    questions = [{'id': 1, 'type': 'text', 'question': 'Renamed'}]
+
+    response = admin_client.put(f'/api/admin/surveys/{survey_ids[1]}', json={'questions': questions})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    with app.app_context():
+        assert db.session.get(Survey, survey_ids[1]).questions_json == before
+
+def test_missing_statistics_of_a_large_survey_are_rebuilt_by_a_job(app, admin_client, survey_ids, wait_for_job,
+                                                                   monkeypatch):
+    monkeypatch.setitem(app.config, 'SURVEY_REBUILD_INLINE_LIMIT', 10)
+    with app.app_context():
+        drop_statistics(survey_ids[1])
+
+    response = admin_client.get(f'/api/admin/surveys/{survey_ids[1]}/statistics')
+
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['total_responses'] == 0 and data['statistics'] == {}
+    assert data['statistics_job']['kind'] == 'rebuild-stats'
+    job = wait_for_job(admin_client, f"/api/admin/jobs/{data['statistics_job']['id']}")
+    assert job['status'] == 'succeeded', job
+    response = admin_client.get(f'/api/admin/surveys/{survey_ids[1]}/statistics')
+    assert response.status_code == 200
+    assert response.get_json()['total_responses'] > 10
+
+def test_missing_statistics_of_a_small_survey_are_rebuilt_inline(app, admin_client, survey_ids):
+    with app.app_context():
+        drop_statistics(survey_ids[1])
+        count = SurveyResponse.query.filter_by(survey_id=survey_ids[1]).count()
+
+    response = admin_client.get(f'/api/admin/surveys/{survey_ids[1]}/statistics')
+
+    assert response.status_code == 200
+    assert response.get_json()['total_responses'] == count
+    with app.app_context():
+        assert db.session.get(SurveyStatistics, survey_ids[1]).responses_count == count
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { API_BASE_URL } from '../../config/api'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
@@ -21,30 +21,81 @@ const AdminPanel = () => {
   const [searchTerm, setSearchTerm] = useState('')
   const [currentPage, setCurrentPage] = useState(1)
   const [totalPages, setTotalPages] = useState(1)
+  // L'annuaire des utilisateurs est paginé et filtré par le serveur
+  const [usersPage, setUsersPage] = useState(1)
+  const [usersPages, setUsersPages] = useState(1)
+  const [userCounts, setUserCounts] = useState({ total: 0, active: 0 })
+  // Recherche envoyée au serveur 300 ms après la dernière frappe
+  const [userSearch, setUserSearch] = useState('')
+  const usersRequest = useRef(null)
 
   useEffect(() => {
-    loadUsers()
     loadQuestions()
     loadComments()
   }, [currentPage])
 
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setUserSearch(searchTerm)
+      setUsersPage(1)
+    }, 300)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
+
+  useEffect(() => {
+    loadUsers()
+  }, [usersPage, userSearch])
+
+  // Annule le chargement en cours en quittant le panneau
+  useEffect(() => () => usersRequest.current?.abort(), [])
+
+  useEffect(() => {
+    loadUserCounts()
+  }, [])
+
   const loadUsers = async () => {
+    // Une réponse plus lente d'une recherche précédente ne doit pas écraser la liste
+    usersRequest.current?.abort()
+    const controller = new AbortController()
+    usersRequest.current = controller
     setLoading(true)
     try {
-      const response = await fetch(`${API_BASE_URL}/api/users`, {
-        credentials: 'include'
+      const params = new URLSearchParams({ page: usersPage, per_page: 20, q: userSearch })
+      const response = await fetch(`${API_BASE_URL}/api/users?${params}`, {
+        credentials: 'include',
+        signal: controller.signal
       })
       
       if (response.ok) {
         const data = await response.json()
-        setUsers(data)
+        setUsers(data.users)
+        setUsersPages(Math.max(data.pages, 1))
       } else {
         setError('Erreur lors du chargement des utilisateurs')
       }
     } catch (error) {
-      setError('Erreur de connexion au serveur')
+      if (error.name !== 'AbortError') {
+        setError('Erreur de connexion au serveur')
+      }
     } finally {
-      setLoading(false)
+      if (usersRequest.current === controller) {
+        setLoading(false)
+      }
+    }
+  }
+
+  // Totaux de l'annuaire, indépendants de la recherche et de la page affichée
+  const loadUserCounts = async () => {
+    try {
+      const [all, active] = await Promise.all([
+        fetch(`${API_BASE_URL}/api/users?per_page=1&fields=id`, { credentials: 'include' }),
+        fetch(`${API_BASE_URL}/api/users?per_page=1&fields=id&is_active=true`, { credentials: 'include' })
+      ])
+      if (all.ok && active.ok) {
+        setUserCounts({ total: (await all.json()).total, active: (await active.json()).total })
+      }
+    } catch (error) {
+      setError('Erreur de connexion au serveur')
     }
   }
 
@@ -97,6 +148,7 @@ const AdminPanel = () => {
       if (response.ok) {
         setSuccess(`Utilisateur ${!currentStatus ? 'activé' : 'désactivé'} avec succès`)
         loadUsers()
+        loadUserCounts()
       } else {
         setError('Erreur lors de la modification de l\'utilisateur')
       }
@@ -155,6 +207,7 @@ const AdminPanel = () => {
       if (response.ok) {
         setSuccess('Utilisateur supprimé avec succès')
         loadUsers()
+        loadUserCounts()
       } else {
         setError('Erreur lors de la suppression de l\'utilisateur')
       }
@@ -173,12 +226,6 @@ const AdminPanel = () => {
     })
   }
 
-  const filteredUsers = users.filter(user =>
-    user.username.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    user.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (user.company && user.company.toLowerCase().includes(searchTerm.toLowerCase()))
-  )
-
   const filteredQuestions = questions.filter(question =>
     question.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
     question.content.toLowerCase().includes(searchTerm.toLowerCase())
@@ -197,7 +244,7 @@ const AdminPanel = () => {
             Gérez les utilisateurs et modérez le contenu
           </p>
         </div>
-        <Button onClick={() => { loadUsers(); loadQuestions(); loadComments(); }}>
+        <Button onClick={() => { loadUsers(); loadUserCounts(); loadQuestions(); loadComments(); }}>
           <RefreshCw className="w-4 h-4 mr-2" />
           Actualiser
         </Button>
@@ -223,9 +270,9 @@ const AdminPanel = () => {
             <Users className="h-4 w-4 text-muted-foreground" />
           </CardHeader>
           <CardContent>
-            <div className="text-2xl font-bold">{users.length}</div>
+            <div className="text-2xl font-bold">{userCounts.total}</div>
             <p className="text-xs text-muted-foreground">
-              {users.filter(u => u.is_active).length} actifs
+              {userCounts.active} actifs
             </p>
           </CardContent>
         </Card>
@@ -301,7 +348,7 @@ const AdminPanel = () => {
                   </TableRow>
                 </TableHeader>
                 <TableBody>
-                  {filteredUsers.map((user) => (
+                  {users.map((user) => (
                     <TableRow key={user.id}>
                       <TableCell className="font-medium">{user.username}</TableCell>
                       <TableCell>{user.email}</TableCell>
@@ -341,6 +388,27 @@ const AdminPanel = () => {
                   ))}
                 </TableBody>
               </Table>
+              {usersPages > 1 && (
+                <div className="flex justify-center space-x-2 mt-4">
+                  <Button
+                    variant="outline"
+                    onClick={() => setUsersPage(prev => Math.max(prev - 1, 1))}
+                    disabled={usersPage === 1}
+                  >
+                    Précédent
+                  </Button>
+                  <span className="flex items-center px-4">
+                    Page {usersPage} sur {usersPages}
+                  </span>
+                  <Button
+                    variant="outline"
+                    onClick={() => setUsersPage(prev => Math.min(prev + 1, usersPages))}
+                    disabled={usersPage === usersPages}
+                  >
+                    Suivant
+                  </Button>
+                </div>
+              )}
             </CardContent>
           </Card>
         </TabsContent>
@@ -41,7 +41,7 @@ const SurveyEdit = () => {
         setSurvey({
           title: data.title,
           description: data.description || '',
-          questions: JSON.parse(data.questions_json || '[]'),
+          questions: data.questions || JSON.parse(data.questions_json || '[]'),
         });
       } catch (err) {
         setError(err.message);
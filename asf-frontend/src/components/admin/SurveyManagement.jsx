@@ -192,7 +192,7 @@ const SurveyManagement = () => {
 
                   {/* Questions Count */}
                   <div className="text-sm text-gray-600">
-                    {JSON.parse(survey.questions_json || '[]').length} question(s)
+                    {survey.questions_count ?? (survey.questions || []).length} question(s)
                   </div>
 
                   {/* Actions */}
@@ -16,6 +16,7 @@ const Forum = () => {
   const [questions, setQuestions] = useState([])
   const [selectedQuestion, setSelectedQuestion] = useState(null)
   const [comments, setComments] = useState([])
+  const [commentsCursor, setCommentsCursor] = useState(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
   const [success, setSuccess] = useState('')
@@ -64,6 +65,7 @@ const Forum = () => {
         const data = await response.json()
         setSelectedQuestion(data)
         setComments(data.comments || [])
+        setCommentsCursor(data.comments_next_cursor)
       } else {
         setError('Erreur lors du chargement de la question')
       }
@@ -74,6 +76,28 @@ const Forum = () => {
     }
   }
 
+  // Next page of the thread (oldest first), or only the replies after the last one shown;
+  // returns the page (null on error), its comments_next_cursor continues either
+  const loadComments = async (params) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/questions/${selectedQuestion.id}/comments?${new URLSearchParams(params)}`, {
+        credentials: 'include'
+      })
+      
+      if (response.ok) {
+        const data = await response.json()
+        setComments(previous => [...previous, ...data.comments])
+        setCommentsCursor(data.comments_next_cursor)
+        return data
+      } else {
+        setError('Erreur lors du chargement des commentaires')
+      }
+    } catch (error) {
+      setError('Erreur de connexion au serveur')
+    }
+    return null
+  }
+
   const createQuestion = async (e) => {
     e.preventDefault()
     setLoading(true)
@@ -128,7 +152,21 @@ const Forum = () => {
 
       if (response.ok) {
         setNewComment('')
-        loadQuestionDetails(selectedQuestion.id)
+        if (commentsCursor) {
+          // Older pages not shown yet: the new reply will come with them
+          setSelectedQuestion(previous => ({ ...previous, comments_count: previous.comments_count + 1 }))
+        } else {
+          // Every reply posted since the last one shown, which may take more than one page
+          const lastComment = comments[comments.length - 1]
+          let params = lastComment ? { after: lastComment.id } : { per_page: 50 }
+          let added = 0
+          while (params) {
+            const page = await loadComments(params)
+            added += page ? page.comments.length : 0
+            params = page?.comments_next_cursor ? { cursor: page.comments_next_cursor } : null
+          }
+          setSelectedQuestion(previous => ({ ...previous, comments_count: previous.comments_count + added }))
+        }
         setSuccess('Commentaire ajouté avec succès')
       } else {
         const data = await response.json()
@@ -196,7 +234,7 @@ const Forum = () => {
                     <span>{formatDate(selectedQuestion.created_at)}</span>
                   </div>
                   <Badge variant="secondary">
-                    {comments.length} commentaire{comments.length !== 1 ? 's' : ''}
+                    {selectedQuestion.comments_count} commentaire{selectedQuestion.comments_count !== 1 ? 's' : ''}
                   </Badge>
                 </div>
               </div>
@@ -212,7 +250,7 @@ const Forum = () => {
         {/* Commentaires */}
         <div className="space-y-4">
           <h3 className="text-xl font-semibold">
-            Commentaires ({comments.length})
+            Commentaires ({selectedQuestion.comments_count})
           </h3>
 
           {comments.map((comment) => (
@@ -231,6 +269,12 @@ const Forum = () => {
             </Card>
           ))}
 
+          {commentsCursor && (
+            <Button variant="outline" onClick={() => loadComments({ cursor: commentsCursor })}>
+              Charger plus de commentaires
+            </Button>
+          )}
+
           {/* Formulaire nouveau commentaire */}
           <Card>
             <CardHeader>
@@ -476,7 +476,7 @@ const Survey = () => {
             <CardContent>
               <div className="space-y-3">
                 <div className="text-sm text-gray-600">
-                  <p>{survey.questions?.length || 0} question(s)</p>
+                  <p>{survey.questions_count ?? survey.questions?.length ?? 0} question(s)</p>
                   <p>{survey.responses_count || 0} réponse(s)</p>
                   <p>Créée le {formatDate(survey.created_at)}</p>
                 </div>
@@ -576,12 +576,12 @@ const Survey = () => {
                   <div className="text-sm text-blue-600">Réponses totales</div>
                 </div>
                 <div className="text-center p-4 bg-green-50 rounded">
-                  <div className="text-2xl font-bold text-green-600">{currentSurvey.questions?.length || 0}</div>
+                  <div className="text-2xl font-bold text-green-600">{currentSurvey.questions_count ?? currentSurvey.questions?.length ?? 0}</div>
                   <div className="text-sm text-green-600">Questions</div>
                 </div>
                 <div className="text-center p-4 bg-purple-50 rounded">
                   <div className="text-2xl font-bold text-purple-600">
-                    {responses.length > 0 ? Math.round((responses.length / (currentSurvey.questions?.length || 1)) * 100) : 0}%
+                    {responses.length > 0 ? Math.round((responses.length / (currentSurvey.questions_count || currentSurvey.questions?.length || 1)) * 100) : 0}%
                   </div>
                   <div className="text-sm text-purple-600">Taux de completion</div>
                 </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
@@ -27,12 +27,70 @@ const SurveyStats = () => {
   const [responses, setResponses] = useState([])
   const [currentPage, setCurrentPage] = useState(1)
   const [totalPages, setTotalPages] = useState(1)
+  const [newResponses, setNewResponses] = useState(0)
+  const totalRef = useRef(null)
 
   useEffect(() => {
     loadSurveyStatistics()
+  }, [surveyId])
+
+  useEffect(() => {
     loadSurveyResponses()
   }, [surveyId, currentPage])
 
+  // Live updates: the server pushes increments as responses arrive instead of us re-fetching
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE_URL}/api/admin/surveys/${surveyId}/statistics/stream`, {
+      withCredentials: true
+    })
+    source.addEventListener('sync', (event) => {
+      const data = JSON.parse(event.data)
+      if (totalRef.current !== null && data.total_responses !== totalRef.current) {
+        loadSurveyStatistics()
+      }
+    })
+    source.addEventListener('stats', (event) => {
+      const delta = JSON.parse(event.data)
+      if (!delta.previous_total || delta.previous_total !== totalRef.current) {
+        // Missed an update, statistics still loading or first responses: start over from the full payload
+        loadSurveyStatistics()
+      } else {
+        setSurveyData(prev => applyStatisticsDelta(prev, delta))
+        totalRef.current = delta.total_responses
+      }
+      setNewResponses(prev => prev + delta.new_responses)
+    })
+    source.addEventListener('reset', () => loadSurveyStatistics())
+
+    // No stream for us (server busy or not serving streams): poll the statistics instead
+    let pollTimer = null
+    const startPolling = (seconds) => {
+      source.close()
+      if (pollTimer === null) {
+        pollTimer = setInterval(pollSurveyStatistics, seconds * 1000)
+      }
+    }
+    source.addEventListener('fallback', (event) => startPolling(JSON.parse(event.data).poll_seconds))
+    source.onerror = () => {
+      // EventSource reconnects by itself unless the server refused the stream
+      if (source.readyState === EventSource.CLOSED) {
+        startPolling(30)
+      }
+    }
+    return () => {
+      source.close()
+      clearInterval(pollTimer)
+    }
+  }, [surveyId])
+
+  const pollSurveyStatistics = async () => {
+    const previousTotal = totalRef.current
+    await loadSurveyStatistics()
+    if (previousTotal !== null && totalRef.current > previousTotal) {
+      setNewResponses(prev => prev + totalRef.current - previousTotal)
+    }
+  }
+
   const loadSurveyStatistics = async () => {
     try {
       const response = await fetch(`${API_BASE_URL}/api/admin/surveys/${surveyId}/statistics`, {
@@ -41,6 +99,7 @@ const SurveyStats = () => {
 
       if (response.ok) {
         const data = await response.json()
+        totalRef.current = data.total_responses
         setSurveyData(data)
       } else {
         setError('Erreur lors du chargement des statistiques')
@@ -70,6 +129,51 @@ const SurveyStats = () => {
     }
   }
 
+  const addCounts = (counts = {}, increments = {}) => {
+    const result = { ...counts }
+    Object.entries(increments).forEach(([value, count]) => {
+      result[value] = (result[value] || 0) + count
+    })
+    return result
+  }
+
+  const applyStatisticsDelta = (data, delta) => {
+    if (!data) return data
+    const statistics = { ...data.statistics }
+    Object.entries(statistics).forEach(([questionKey, questionStats]) => {
+      const change = delta.questions[questionKey] || {}
+      const updated = { ...questionStats, answered_count: questionStats.answered_count + (change.answered_count || 0) }
+      updated.response_rate = delta.total_responses ? (updated.answered_count / delta.total_responses) * 100 : 0
+      if (change.option_counts) {
+        updated.option_counts = addCounts(questionStats.option_counts, change.option_counts)
+      }
+      if (change.rating_counts) {
+        updated.rating_counts = addCounts(questionStats.rating_counts, change.rating_counts)
+        const ratings = Object.entries(updated.rating_counts)
+        const rated = ratings.reduce((sum, [, count]) => sum + count, 0)
+        updated.average_rating = rated ? ratings.reduce((sum, [rating, count]) => sum + rating * count, 0) / rated : undefined
+      }
+      statistics[questionKey] = updated
+    })
+    return {
+      ...data,
+      total_responses: delta.total_responses,
+      completion_percentage: delta.completion_percentage,
+      total_answered_questions: delta.total_answered_questions,
+      total_possible_answers: delta.total_possible_answers,
+      statistics
+    }
+  }
+
+  const showNewResponses = () => {
+    setNewResponses(0)
+    if (currentPage === 1) {
+      loadSurveyResponses()
+    } else {
+      setCurrentPage(1)
+    }
+  }
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('fr-FR', {
       year: 'numeric',
@@ -325,6 +429,11 @@ const SurveyStats = () => {
 
         <TabsContent value="responses" className="mt-6">
           <div className="space-y-4">
+            {newResponses > 0 && (
+              <Button variant="outline" size="sm" onClick={showNewResponses}>
+                Afficher {newResponses} nouvelle(s) réponse(s)
+              </Button>
+            )}
             {responses.length > 0 ? (
               <>
                 {responses.map(renderResponseDetails)}